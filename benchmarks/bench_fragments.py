@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Compare request row and detail rendering with and without the fragment cache
+
+"before" renders every fragment (SHOPPING_CART_FRAGMENT_CACHE_SECONDS = 0),
+"after" serves them from a warm local memory cache.
+
+Usage:
+    python benchmarks/bench_fragments.py [--rows N] [--output results.json]
+"""
+import argparse
+import json
+import random
+import sys
+from unittest import mock
+
+from bench_lifecycle import Recorder, make_items, seed_users
+
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from shopping_cart import app_settings  # noqa: E402
+from shopping_cart.fragments import render_fragments  # noqa: E402
+from shopping_cart.models import ItemRequest  # noqa: E402
+
+ROW_TEMPLATE = 'shopping_cart/partials/request_row.html'
+DETAIL_TEMPLATE = 'shopping_cart/partials/request_detail_body.html'
+
+def run(args):
+    rng = random.Random(1)
+    (requester, character), (fulfiller, _) = seed_users(2)
+    for _ in range(args.rows):
+        ItemRequest.objects.create_with_items(
+            make_items(rng, rng.randint(1, 12)), user=requester, character=character,
+            pickup_location='Jita', delivery_location='Amarr', requester_price=rng.randint(1, 500) * 1_000_000,
+        )
+    rows = list(ItemRequest.objects.for_list()[:args.rows])
+    detail = ItemRequest.objects.select_related('character', 'fulfiller_character').prefetch_related('items').first()
+    client = Client()
+    client.force_login(fulfiller)
+    marketplace = reverse('shopping_cart:marketplace')
+    detail_url = reverse('shopping_cart:request_detail', args=[detail.id])
+
+    recorder = Recorder()
+    with mock.patch.object(app_settings, 'SHOPPING_CART_FRAGMENT_CACHE_SECONDS', 0):
+        recorder.time(f'before_rows_{args.rows}', lambda: render_fragments(ROW_TEMPLATE, rows), repeat=10)
+        recorder.time('before_detail_body', lambda: render_fragments(DETAIL_TEMPLATE, [detail]), repeat=50)
+        recorder.view('before_view_marketplace', client, marketplace)
+        recorder.view('before_view_request_detail', client, detail_url)
+    render_fragments(ROW_TEMPLATE, rows)
+    render_fragments(DETAIL_TEMPLATE, [detail])
+    recorder.time(f'after_rows_{args.rows}', lambda: render_fragments(ROW_TEMPLATE, rows), repeat=10)
+    recorder.time('after_detail_body', lambda: render_fragments(DETAIL_TEMPLATE, [detail]), repeat=50)
+    recorder.view('after_view_marketplace', client, marketplace)
+    recorder.view('after_view_request_detail', client, detail_url)
+    return recorder.results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--output', help='Write JSON results to this file')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+        connection.creation.create_test_db(verbosity=0)
+        results = run(args)
+
+    for name in sorted(name for name in results if name.startswith('before_')):
+        before, after = results[name], results['after_' + name[len('before_'):]]
+        queries = f"  {before['queries']} -> {after['queries']} queries" if 'queries' in before else ''
+        print(f"{name[len('before_'):]:<22} {before['best_ms']:>9.2f} -> {after['best_ms']:>9.2f} ms{queries}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""Time the request lifecycle (parse, create, list, claim, sweep, leaderboard,
+dashboard) against synthetic data and write comparable JSON results
+
+Runs against an in-memory database built from tests/test_settings.py, with a
+local memory cache so no redis is needed.
+
+Usage:
+    python benchmarks/bench_lifecycle.py [--requests N] [--users N] [--seed N] [--output results.json]
+    python benchmarks/bench_lifecycle.py --compare baseline.json [--threshold 1.25]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from shopping_cart.constants import TRADE_HUBS  # noqa: E402
+from shopping_cart import helpers  # noqa: E402
+from shopping_cart.contracts import sweep_active_contracts  # noqa: E402
+from shopping_cart.helpers import parse_eve_items  # noqa: E402
+from shopping_cart.leaderboard import refresh_leaderboards  # noqa: E402
+from shopping_cart.models import ItemRequest  # noqa: E402
+from tests.test_contracts import FakeEsiContractClient  # noqa: E402
+from tests.utils import create_user  # noqa: E402
+
+ITEM_NAMES = [
+    'Tritanium', 'Pyerite', 'Mexallon', 'Isogen', 'Nocxium', 'Zydrine', 'Megacyte', 'Morphite',
+    'Antimatter Charge S', 'Hail S', 'Scourge Light Missile', 'Nanite Repair Paste', 'Cap Booster 800',
+    'Damage Control II', 'Gyrostabilizer II', 'Magnetic Field Stabilizer II', 'Ballistic Control System II',
+    'Multispectrum Shield Hardener II', 'Large Shield Extender II', '10MN Afterburner II',
+    '50MN Microwarpdrive II', 'Warp Scrambler II', 'Stasis Webifier II', 'Drone Damage Amplifier II',
+    'Hobgoblin II', 'Hammerhead II', 'Ogre II', 'Warrior II', 'Caldari Navy Antimatter Charge M',
+    'Republic Fleet EMP M', 'Medium Core Defense Field Extender I', 'Large Trimark Armor Pump I',
+    'Strontium Clathrates', 'Liquid Ozone', 'Heavy Water', 'Helium Fuel Block', 'Nitrogen Fuel Block',
+    'Oxygen Fuel Block', 'Hydrogen Fuel Block', 'Mobile Depot', 'Mobile Tractor Unit',
+]
+
+class Recorder:
+    def __init__(self):
+        self.results = {}
+
+    def time(self, name, func, repeat=5, ops=1, setup=None):
+        """Run func repeat times and keep the best and mean wall time. setup runs
+        untimed before every call"""
+        timings = []
+        value = None
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            value = func()
+            timings.append(time.perf_counter() - start)
+        self.results[name] = {
+            'best_ms': round(min(timings) * 1000, 3),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+            'ops': ops,
+        }
+        return value
+
+    def view(self, name, client, url, repeat=10):
+        response = self.time(name, lambda: client.get(url), repeat)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+        metrics = getattr(response, 'shopping_cart_metrics', None)
+        if metrics is not None:
+            self.results[name]['queries'] = metrics.queries
+        return response
+
+def make_items(rng, count):
+    return [{'name': name, 'quantity': rng.randint(1, 50000)} for name in rng.sample(ITEM_NAMES, count)]
+
+def make_paste(rng, lines):
+    return '\n'.join(f"{rng.choice(ITEM_NAMES)}\t{rng.randint(1, 100000):,}" for _ in range(lines))
+
+def seed_users(count):
+    users = []
+    for i in range(count):
+        user, character = create_user(f'bench{i}', 90000000 + i)
+        user.is_superuser = True
+        user.save()
+        users.append((user, character))
+    return users
+
+def run(args):
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    users = seed_users(args.users)
+    requesters = users[:len(users) // 2]
+    fulfillers = users[len(users) // 2:]
+
+    paste = make_paste(rng, 500)
+    # Parsing itself, comparable with baselines from before the parse cache, then the cache hit
+    recorder.time('parse_eve_items_500_lines', lambda: parse_eve_items(paste), repeat=20, setup=helpers._parse_cache.clear)
+    recorder.time('parse_eve_items_500_lines_cached', lambda: parse_eve_items(paste), repeat=20)
+
+    hubs = [hub for hub, _ in TRADE_HUBS]
+    specs = [
+        dict(
+            items=make_items(rng, rng.randint(1, 12)),
+            pickup_location=rng.choice(hubs), delivery_location=rng.choice(hubs + ['1DQ1-A', 'Perimeter']),
+            requester_price=rng.randint(1, 500) * 1_000_000,
+        )
+        for _ in range(args.requests)
+    ]
+
+    def create_all():
+        created = []
+        for i, spec in enumerate(specs):
+            user, character = requesters[i % len(requesters)]
+            spec = dict(spec)
+            created.append(ItemRequest.objects.create_with_items(spec.pop('items'), user=user, character=character, **spec))
+        return created
+    item_requests = recorder.time('create_request', create_all, repeat=1, ops=len(specs))
+
+    fulfiller, _ = fulfillers[0]
+    client = Client()
+    client.force_login(fulfiller)
+    recorder.view('view_marketplace', client, reverse('shopping_cart:marketplace'))
+    recorder.view('view_marketplace_filtered', client, reverse('shopping_cart:marketplace') + '?pickup_hub=Jita&item=Tritanium')
+    recorder.view('view_my_requests', client, reverse('shopping_cart:my_requests'))
+
+    to_claim = item_requests[:max(len(item_requests) // 4, 1)]
+
+    def claim_all():
+        for i, item_request in enumerate(to_claim):
+            user, character = fulfillers[i % len(fulfillers)]
+            item_request.claim(user, character)
+    recorder.time('claim_request', claim_all, repeat=1, ops=len(to_claim))
+
+    contracts_by_character = {}
+    for i, item_request in enumerate(to_claim):
+        contract_id = 500000000 + item_request.id
+        item_request.set_contract_created(contract_id, ItemRequest.CONTRACT_ISSUER_REQUESTER)
+        if i % 2 == 0:
+            contracts_by_character.setdefault(item_request.character.character_id, []).append(
+                {'contract_id': contract_id, 'status': 'finished', 'date_completed': timezone.now()},
+            )
+    client_esi = FakeEsiContractClient(contracts_by_character)
+    recorder.time('contract_sweep', lambda: sweep_active_contracts(client_esi), repeat=1, ops=len(to_claim))
+
+    recorder.time('refresh_leaderboards', refresh_leaderboards, repeat=3)
+    recorder.view('view_leaderboard', client, reverse('shopping_cart:leaderboard'))
+    recorder.view('view_index', client, reverse('shopping_cart:index'))
+    recorder.view('view_admin_dashboard', client, reverse('shopping_cart:admin_dashboard'))
+    return recorder.results
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline_path, results, threshold):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = result['best_ms'] / max(baseline[name]['best_ms'], 0.001)
+        # Query counts are deterministic, so any increase is a regression
+        more_queries = result.get('queries', 0) > baseline[name].get('queries', result.get('queries', 0))
+        flag = ' REGRESSION' if ratio > threshold or more_queries else ''
+        queries = f"  {baseline[name]['queries']} -> {result['queries']} queries" if 'queries' in result and 'queries' in baseline[name] else ''
+        print(f"{name:<28} {baseline[name]['best_ms']:>10.2f} -> {result['best_ms']:>10.2f} ms  x{ratio:.2f}{queries}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--compare', help='Baseline JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Slowdown ratio reported as a regression')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+        connection.creation.create_test_db(verbosity=0)
+        results = run(args)
+
+    output = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'requests': args.requests,
+            'users': args.users,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+    if args.compare:
+        sys.exit(1 if compare(args.compare, results, args.threshold) else 0)
+    if not args.output:
+        print(json.dumps(output, indent=2, sort_keys=True))
+
+if __name__ == '__main__':
+    main()
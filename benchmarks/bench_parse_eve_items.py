@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""Time parse_eve_items on 10k-line pastes of each supported format
+
+"cold" empties the parse cache before every call and measures parsing, "warm"
+repeats the same paste and measures the cache hit.
+
+Usage: python benchmarks/bench_parse_eve_items.py [lines] [repeat]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shopping_cart import helpers  # noqa: E402
+from shopping_cart.helpers import parse_eve_items  # noqa: E402
+
+ITEM_NAMES = [f"Item Type {i}" for i in range(2000)]
+
+def make_paste(paste_format, lines):
+    rows = []
+    if paste_format == 'eft':
+        rows.append("[Rifter, Benchmark]")
+    for i in range(lines):
+        name = ITEM_NAMES[i % len(ITEM_NAMES)]
+        if paste_format == 'inventory':
+            rows.append(f"{name}\t{i + 1:,}\tGroup\t\t\t{i}.00 m3\t{i * 100:,}.00 ISK")
+        elif paste_format == 'contract':
+            rows.append(f"{name}\t{i + 1:,}\tGroup\tCategory\t")
+        elif paste_format == 'multibuy':
+            rows.append(f"{name} x{i + 1:,}")
+        else:
+            rows.append(f"{name}, Charge {i % 7}" if i % 3 else f"{name} x{i + 1}")
+    return '\n'.join(rows)
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    for paste_format in ('inventory', 'contract', 'multibuy', 'eft'):
+        paste = make_paste(paste_format, lines)
+        cold = min(timeit.repeat(lambda: parse_eve_items(paste), setup=helpers._parse_cache.clear, number=1, repeat=repeat))
+        parse_eve_items(paste)
+        warm = min(timeit.repeat(lambda: parse_eve_items(paste), number=1, repeat=repeat))
+        print(f"{paste_format:<10} {lines} lines: cold {cold * 1000:.2f} ms, warm {warm * 1000:.2f} ms")
+
+if __name__ == '__main__':
+    main()
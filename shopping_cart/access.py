@@ -0,0 +1,118 @@
+"""Per-request access context: a user's Shopping Cart permissions and main character
+
+The context is built once per user object, which Django keeps for the whole
+request, so the view decorator, model checks and the menu hook share it. It is
+also kept in the Django cache for a short time so most requests need no
+permission or profile queries at all. Entries are dropped when a user's groups,
+permissions, state or profile change, and a version bump discards every entry
+when a group or state changes its permissions.
+"""
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from allianceauth.authentication.models import State, UserProfile
+from allianceauth.eveonline.models import EveCharacter
+from . import app_settings
+
+ACCESS_KEY = 'shopping_cart:access:{}'
+VERSION_KEY = 'shopping_cart:access:version'
+APP_LABEL = 'shopping_cart'
+
+class AccessContext:
+    def __init__(self, user_id, is_superuser, perms, main_character_id):
+        self.user_id = user_id
+        self.is_superuser = is_superuser
+        self.perms = frozenset(perms)
+        self.main_character_id = main_character_id
+        self._main_character = None
+
+    def has_perm(self, perm):
+        return self.is_superuser or perm in self.perms
+
+    @property
+    def main_character(self):
+        if self._main_character is None and self.main_character_id is not None:
+            self._main_character = EveCharacter.objects.filter(pk=self.main_character_id).first()
+        return self._main_character
+
+    def __getstate__(self):
+        # The character is cached alongside so warm requests skip that query too
+        state = self.__dict__.copy()
+        state['_main_character'] = self.main_character
+        return state
+
+ANONYMOUS = AccessContext(None, False, (), None)
+
+def _load(user):
+    perms = () if user.is_superuser else [perm for perm in user.get_all_permissions() if perm.startswith(f'{APP_LABEL}.')]
+    profile = UserProfile.objects.filter(user=user).select_related('main_character').first()
+    context = AccessContext(user.pk, user.is_superuser, perms, profile.main_character_id if profile else None)
+    context._main_character = profile.main_character if profile else None
+    return context
+
+def get_access(user):
+    """Return the AccessContext for user, memoized on the user object"""
+    if user is None or not user.is_authenticated or not user.is_active:
+        return ANONYMOUS
+    context = getattr(user, '_shopping_cart_access', None)
+    if context is not None:
+        return context
+    key = ACCESS_KEY.format(user.pk)
+    cached = cache.get_many([key, VERSION_KEY])
+    version = cached.get(VERSION_KEY, 0)
+    entry = cached.get(key)
+    if entry is not None and entry[0] == version:
+        context = entry[1]
+    else:
+        context = _load(user)
+        cache.set(key, (version, context), app_settings.SHOPPING_CART_ACCESS_CACHE_SECONDS)
+    user._shopping_cart_access = context
+    return context
+
+def has_perm(user, perm):
+    return get_access(user).has_perm(perm)
+
+def invalidate_user(user_id):
+    cache.delete(ACCESS_KEY.format(user_id))
+
+def invalidate_all():
+    cache.add(VERSION_KEY, 0, None)
+    cache.incr(VERSION_KEY)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _user_changed(sender, instance, **kwargs):
+    instance.__dict__.pop('_shopping_cart_access', None)
+    invalidate_user(instance.pk)
+
+@receiver(post_save, sender=UserProfile)
+def _profile_changed(sender, instance, **kwargs):
+    # Covers main character and state changes
+    invalidate_user(instance.user_id)
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def _memberships_changed(sender, instance, action, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, User):
+        instance.__dict__.pop('_shopping_cart_access', None)
+        invalidate_user(instance.pk)
+    elif pk_set:
+        # Changed from the group or permission side, so pk_set holds user ids
+        cache.delete_many([ACCESS_KEY.format(user_id) for user_id in pk_set])
+    else:
+        # Clearing a group's members does not say who they were
+        invalidate_all()
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(m2m_changed, sender=State.permissions.through)
+def _role_permissions_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_all()
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=State)
+def _role_deleted(sender, **kwargs):
+    invalidate_all()
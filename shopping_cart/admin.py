@@ -1,12 +1,19 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import ItemRequest, FulfillmentTracking
+from .models import ItemRequest, RequestItem, FulfillmentTracking
+
+class RequestItemInline(admin.TabularInline):
+    model = RequestItem
+    extra = 0
 
 @admin.register(ItemRequest)
 class ItemRequestAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'status', 'request_type', 'created_at')
     list_filter = ('status', 'request_type', 'created_at')
     search_fields = ('user__username', 'character__character_name', 'contract_id')
+    # Status only moves through ItemRequest.transition(), which keeps the log and counters in step
+    readonly_fields = ('status', 'version')
+    inlines = (RequestItemInline,)
 
 @admin.register(FulfillmentTracking)
 class FulfillmentTrackingAdmin(admin.ModelAdmin):
@@ -8,5 +8,23 @@ SHOPPING_CART_NOTIFY_ON_NEW_REQUEST = getattr(settings, "SHOPPING_CART_NOTIFY_ON
 SHOPPING_CART_NOTIFY_ON_CLAIM = getattr(settings, "SHOPPING_CART_NOTIFY_ON_CLAIM", True)
 SHOPPING_CART_FULFILLED_RETENTION_DAYS = getattr(settings, "SHOPPING_CART_FULFILLED_RETENTION_DAYS", 90)
 SHOPPING_CART_ABANDONED_CART_DAYS = getattr(settings, "SHOPPING_CART_ABANDONED_CART_DAYS", 30)
+SHOPPING_CART_ARCHIVE_AFTER_DAYS = getattr(settings, "SHOPPING_CART_ARCHIVE_AFTER_DAYS", 60)
+SHOPPING_CART_RETENTION_BATCH_SIZE = getattr(settings, "SHOPPING_CART_RETENTION_BATCH_SIZE", 1000)
 SHOPPING_CART_PAGINATION_SIZE = getattr(settings, "SHOPPING_CART_PAGINATION_SIZE", 25)
 SHOPPING_CART_DEFAULT_HUBS = getattr(settings, "SHOPPING_CART_DEFAULT_HUBS", ['Jita', 'Amarr', 'Dodixie', 'Rens', 'Hek'])
+SHOPPING_CART_SDE_INDEX_PATH = getattr(settings, "SHOPPING_CART_SDE_INDEX_PATH", "")
+SHOPPING_CART_PRICE_PROVIDER = getattr(settings, "SHOPPING_CART_PRICE_PROVIDER", "shopping_cart.prices.FuzzworkPriceProvider")
+SHOPPING_CART_PRICE_FIXTURE_PATH = getattr(settings, "SHOPPING_CART_PRICE_FIXTURE_PATH", "")
+SHOPPING_CART_PRICE_CACHE_TIMEOUT = getattr(settings, "SHOPPING_CART_PRICE_CACHE_TIMEOUT", 3600)
+SHOPPING_CART_NOTIFY_BATCH_SECONDS = getattr(settings, "SHOPPING_CART_NOTIFY_BATCH_SECONDS", 30)
+SHOPPING_CART_INSTRUMENTATION = getattr(settings, "SHOPPING_CART_INSTRUMENTATION", True)
+SHOPPING_CART_SERVER_TIMING = getattr(settings, "SHOPPING_CART_SERVER_TIMING", False)
+SHOPPING_CART_METRICS_LOG = getattr(settings, "SHOPPING_CART_METRICS_LOG", False)
+SHOPPING_CART_METRICS_TOKEN = getattr(settings, "SHOPPING_CART_METRICS_TOKEN", "")
+SHOPPING_CART_BULK_MAX_REQUESTS = getattr(settings, "SHOPPING_CART_BULK_MAX_REQUESTS", 100)
+SHOPPING_CART_LIVE_UPDATES = getattr(settings, "SHOPPING_CART_LIVE_UPDATES", True)
+SHOPPING_CART_LIVE_POLL_INTERVAL = getattr(settings, "SHOPPING_CART_LIVE_POLL_INTERVAL", 1.0)
+SHOPPING_CART_LIVE_STREAM_SECONDS = getattr(settings, "SHOPPING_CART_LIVE_STREAM_SECONDS", 300)
+SHOPPING_CART_ACCESS_CACHE_SECONDS = getattr(settings, "SHOPPING_CART_ACCESS_CACHE_SECONDS", 60)
+SHOPPING_CART_PLANNER_CARGO_VOLUME = getattr(settings, "SHOPPING_CART_PLANNER_CARGO_VOLUME", 60000)
+SHOPPING_CART_FRAGMENT_CACHE_SECONDS = getattr(settings, "SHOPPING_CART_FRAGMENT_CACHE_SECONDS", 3600)
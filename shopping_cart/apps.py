@@ -5,3 +5,6 @@ class ShoppingCartConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shopping_cart'
     verbose_name = 'Shopping Cart'
+    
+    def ready(self):
+        from . import access, live, notifications  # noqa: F401 connects the signal receivers
@@ -2,13 +2,14 @@ from django.utils.translation import gettext_lazy as _
 from allianceauth import hooks
 from allianceauth.services.hooks import MenuItemHook, UrlHook
 from . import urls
+from .access import has_perm
 
 class ShoppingCartMenuItem(MenuItemHook):
     def __init__(self):
         MenuItemHook.__init__(self, _('Shopping Cart'), 'fas fa-shopping-cart', 'shopping_cart:index', navactive=['shopping_cart:'])
     
     def render(self, request):
-        if request.user.has_perm('shopping_cart.basic_access') or request.user.is_superuser:
+        if has_perm(request.user, 'shopping_cart.basic_access'):
             return MenuItemHook.render(self, request)
         return ''
 
@@ -18,4 +19,4 @@ def register_menu():
 
 @hooks.register('url_hook')
 def register_urls():
-    return UrlHook(urls, 'shopping_cart', r'^shopping-cart/')
+    return UrlHook(urls, 'shopping_cart', r'^shopping-cart/', excluded_views=['shopping_cart.views.metrics'])
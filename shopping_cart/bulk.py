@@ -0,0 +1,149 @@
+"""Parsing and validation for creating many requests in one submission"""
+import csv
+import io
+import re
+from . import app_settings
+from .helpers import ITEM_NAME_MAX_LENGTH, overlong_item_names, parse_eve_items, resolve_item_types
+from .models import ItemRequest
+from .sde import get_type_index
+
+SECTION_HEADER_RE = re.compile(r'^[ \t]*==[ \t]*(.+?)[ \t]*==[ \t]*\r?$', re.M)
+REQUEST_FIELDS = ('request_type', 'pickup_location', 'delivery_location', 'requester_price', 'max_budget', 'description')
+
+class BulkRequestError(ValueError):
+    """Raised with every problem found in a bulk submission"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+def parse_bulk_paste(text, defaults=None):
+    """Split a paste on '== pickup -> delivery | price ==' headers, one request per
+    section. Any part of a header may be left out to use the defaults"""
+    defaults = defaults or {}
+    parts = SECTION_HEADER_RE.split(text)
+    entries = []
+    if parts[0].strip():
+        entries.append({**defaults, 'items_text': parts[0]})
+    for header, body in zip(parts[1::2], parts[2::2]):
+        entry = dict(defaults)
+        route, _, price = header.partition('|')
+        pickup, arrow, delivery = route.partition('->')
+        if pickup.strip():
+            entry['pickup_location'] = pickup.strip()
+        if arrow and delivery.strip():
+            entry['delivery_location'] = delivery.strip()
+        if price.strip():
+            entry['requester_price'] = price.strip()
+        entry['items_text'] = body
+        entries.append(entry)
+    return entries
+
+def parse_bulk_json(data, defaults=None):
+    """Accept [{...}] or {"requests": [{...}]}, each with items [{name, quantity}] or items_text"""
+    defaults = defaults or {}
+    if isinstance(data, dict):
+        data = data.get('requests')
+    if not isinstance(data, list):
+        raise BulkRequestError(['Expected a list of requests'])
+    entries = []
+    for row in data:
+        if not isinstance(row, dict):
+            raise BulkRequestError(['Every request must be an object'])
+        entry = {**defaults, **{field: row[field] for field in REQUEST_FIELDS if field in row}}
+        if 'items' in row:
+            entry['items'] = row['items']
+        else:
+            entry['items_text'] = row.get('items_text') or ''
+        entries.append(entry)
+    return entries
+
+def parse_bulk_csv(text, defaults=None):
+    """One item per row; rows sharing a 'request' value form one request, whose
+    other columns are taken from its first row"""
+    defaults = defaults or {}
+    grouped = {}
+    for row in csv.DictReader(io.StringIO(text)):
+        entry = grouped.get(row.get('request') or '')
+        if entry is None:
+            entry = grouped[row.get('request') or ''] = {
+                **defaults, **{field: row[field] for field in REQUEST_FIELDS if row.get(field)}, 'items': [],
+            }
+        entry['items'].append({'name': row.get('name'), 'quantity': row.get('quantity')})
+    return list(grouped.values())
+
+def _to_amount(value):
+    if value is None or value == '':
+        return None
+    amount = int(str(value).replace(',', '').strip())
+    if amount < 0:
+        raise ValueError(value)
+    return amount
+
+def _clean_items(items, problems):
+    if not isinstance(items, list):
+        problems.append('items must be a list')
+        return []
+    merged = {}
+    for item in items:
+        try:
+            name = str(item['name']).strip()
+            quantity = _to_amount(item.get('quantity', 1))
+        except (KeyError, TypeError, ValueError):
+            problems.append(f"invalid item {item!r}")
+            continue
+        if name and quantity:
+            merged[name] = merged.get(name, 0) + quantity
+    return [{'name': name, 'quantity': quantity} for name, quantity in merged.items()]
+
+def validate_entries(entries):
+    """Turn parsed entries into (fields, items) pairs, checking all of them in one
+    pass. Raises BulkRequestError listing every invalid request"""
+    limit = app_settings.SHOPPING_CART_BULK_MAX_REQUESTS
+    if not entries:
+        raise BulkRequestError(['No requests found'])
+    if len(entries) > limit:
+        raise BulkRequestError([f"At most {limit} requests can be created at once"])
+    type_index = get_type_index()
+    request_types = dict(ItemRequest.REQUEST_TYPE_CHOICES)
+    valid = []
+    errors = []
+    for number, entry in enumerate(entries, 1):
+        problems = []
+        items_text = entry.get('items_text') or ''
+        if 'items' in entry:
+            items = _clean_items(entry['items'], problems)
+        elif not isinstance(items_text, str):
+            problems.append('items_text must be text')
+            items = None
+        else:
+            items = parse_eve_items(items_text)
+        overlong = overlong_item_names(items or [])
+        if items is not None and not items:
+            problems.append('no items')
+        elif overlong:
+            problems.append(f"item names longer than {ITEM_NAME_MAX_LENGTH} characters: {', '.join(overlong[:10])}")
+        elif items and type_index is not None:
+            items, unknown = resolve_item_types(items, type_index)
+            if unknown:
+                problems.append(f"unknown items: {', '.join(unknown[:10])}")
+        fields = {'request_type': entry.get('request_type') or ItemRequest.REQUEST_TYPE_REQUESTER_HAS_ITEMS}
+        if not isinstance(fields['request_type'], str) or fields['request_type'] not in request_types:
+            problems.append(f"invalid request type {fields['request_type']!r}")
+        for field in ('pickup_location', 'delivery_location'):
+            fields[field] = str(entry.get(field) or '').strip()
+            if not fields[field] or len(fields[field]) > 255:
+                problems.append(f"invalid {field.replace('_', ' ')}")
+        for field in ('requester_price', 'max_budget'):
+            try:
+                fields[field] = _to_amount(entry.get(field))
+            except (TypeError, ValueError):
+                problems.append(f"invalid {field.replace('_', ' ')}")
+        fields['description'] = str(entry.get('description') or '')
+        if problems:
+            errors.append(f"Request {number}: {', '.join(problems)}")
+        else:
+            valid.append((fields, items))
+    if errors:
+        raise BulkRequestError(errors)
+    return valid
@@ -8,6 +8,14 @@ TRADE_HUBS = [
     ('Hek', 'Hek VIII - Moon 12 - Boundless Creation Factory'),
 ]
 
+TRADE_HUB_STATION_IDS = {
+    'Jita': 60003760,
+    'Amarr': 60008494,
+    'Dodixie': 60011866,
+    'Rens': 60004588,
+    'Hek': 60005686,
+}
+
 STATUS_ICONS = {
     'pending': 'fa-clock',
     'claimed': 'fa-hand-rock',
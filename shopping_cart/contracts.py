@@ -0,0 +1,108 @@
+import logging
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from .models import FulfillmentTracking, ItemRequest, StatusTransition
+from .providers import EsiContractClient
+
+logger = logging.getLogger(__name__)
+
+CONTRACTS_CACHE_KEY = 'shopping_cart:esi_contracts:{}'
+CONTRACTS_CACHE_TIMEOUT = 60 * 60 * 24
+
+MONITORED_STATUSES = [ItemRequest.STATUS_CONTRACT_CREATED, ItemRequest.STATUS_CONTRACT_ACCEPTED]
+
+ESI_ACCEPTED_STATUSES = ('in_progress',)
+ESI_COMPLETED_STATUSES = ('finished', 'finished_issuer', 'finished_contractee')
+
+def get_character_contracts(client, character_id):
+    """Return a character's contracts keyed by contract_id, reusing the cached
+    copy while ESI's Expires has not passed or the ETag is unchanged"""
+    key = CONTRACTS_CACHE_KEY.format(character_id)
+    cached = cache.get(key)
+    now = timezone.now()
+    if cached and cached['expires'] and cached['expires'] > now:
+        return cached['contracts']
+
+    response = client.get_character_contracts(character_id, etag=cached['etag'] if cached else None)
+    if response is None:
+        return cached['contracts'] if cached else {}
+
+    if response.not_modified and cached:
+        contracts = cached['contracts']
+    else:
+        contracts = {contract['contract_id']: contract for contract in response.contracts or []}
+    cache.set(key, {
+        'etag': response.etag,
+        'expires': response.expires,
+        'contracts': contracts,
+    }, CONTRACTS_CACHE_TIMEOUT)
+    return contracts
+
+def _contract_changes(item_request, contract):
+    """The status and fields an ESI contract moves item_request to, or None"""
+    esi_status = contract.get('status')
+    if esi_status in ESI_COMPLETED_STATUSES:
+        new_status = ItemRequest.STATUS_COMPLETED
+    elif esi_status in ESI_ACCEPTED_STATUSES:
+        new_status = ItemRequest.STATUS_CONTRACT_ACCEPTED
+    else:
+        return None
+    if not ItemRequest.can_transition(item_request.status, new_status):
+        return None
+
+    now = timezone.now()
+    changes = {}
+    if not item_request.contract_accepted_at:
+        changes['contract_accepted_at'] = contract.get('date_accepted') or contract.get('date_completed') or now
+    if new_status == ItemRequest.STATUS_COMPLETED:
+        changes['contract_completed_at'] = contract.get('date_completed') or now
+    return new_status, changes
+
+def sweep_active_contracts(client=None):
+    """Check every monitored request against ESI with one contract fetch per character"""
+    client = client or EsiContractClient()
+    monitored = (
+        ItemRequest.objects
+        .filter(status__in=MONITORED_STATUSES, contract_id__isnull=False, esi_monitor_character__isnull=False)
+        .only(
+            'id', 'user_id', 'status', 'version', 'contract_id', 'contract_accepted_at', 'contract_completed_at',
+            'fulfiller_id', 'fulfiller_price', 'requester_price', 'appraised_value', 'esi_monitor_character__character_id',
+        )
+        .select_related('esi_monitor_character')
+        .order_by('esi_monitor_character_id')
+    )
+
+    by_character = {}
+    for item_request in monitored:
+        by_character.setdefault(item_request.esi_monitor_character.character_id, []).append(item_request)
+
+    moves = []
+    for character_id, item_requests in by_character.items():
+        try:
+            contracts = get_character_contracts(client, character_id)
+        except Exception:
+            logger.exception(f"Failed to fetch contracts for character {character_id}")
+            continue
+        for item_request in item_requests:
+            contract = contracts.get(item_request.contract_id)
+            move = contract and _contract_changes(item_request, contract)
+            if move:
+                moves.append((item_request, move))
+
+    changed = []
+    if moves:
+        with transaction.atomic():
+            entries = []
+            for item_request, (new_status, changes) in moves:
+                old_status = item_request.versioned_update(new_status, changes)
+                if old_status is not None:
+                    changed.append(item_request)
+                    entries.append(item_request.transition_entry(old_status))
+            StatusTransition.objects.record(entries)
+            FulfillmentTracking.objects.record_completions(
+                (item_request.fulfiller_id, item_request.isk_value, item_request.contract_completed_at)
+                for item_request in changed if item_request.status == ItemRequest.STATUS_COMPLETED
+            )
+    logger.info(f"Contract sweep: {len(by_character)} characters, {len(changed)} requests updated")
+    return len(changed)
@@ -3,15 +3,17 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.utils.translation import gettext as _
+from .access import has_perm
+from .instrumentation import instrument
 
 def permission_required_or_superuser(perm):
     def decorator(view_func):
         @wraps(view_func)
         @login_required
         def wrapped_view(request, *args, **kwargs):
-            if request.user.is_superuser or request.user.has_perm(perm):
+            if has_perm(request.user, perm):
                 return view_func(request, *args, **kwargs)
             messages.error(request, _('You do not have permission to access this page.'))
             return redirect('authentication:dashboard')
-        return wrapped_view
+        return instrument(wrapped_view)
     return decorator
@@ -0,0 +1,152 @@
+"""Demand aggregation: how much of each item was requested, per hub, period and status
+
+Live requests are summed in SQL over RequestItem and streamed with iterator(),
+so a report holds one chunk of result rows at a time. Archived requests only
+keep their items as JSON. Those are reduced batch by batch into per-group
+totals, bounded by the number of groups rather than by history, and merged
+into the SQL stream as it passes.
+"""
+import csv
+import json
+from datetime import timedelta
+from django.core.cache import cache
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from .models import ArchivedRequest, RequestItem
+
+DIMENSIONS = ('bucket', 'hub', 'status', 'item')
+BUCKETS = ('day', 'week', 'month')
+HUB_FIELDS = {'pickup': 'pickup_hub', 'delivery': 'delivery_hub'}
+CHUNK_SIZE = 2000
+TOP_ITEMS_CACHE_KEY = 'shopping_cart:top_items:{}:{}'
+TOP_ITEMS_CACHE_TIMEOUT = 300
+
+def columns_for(group_by):
+    columns = []
+    for dimension in DIMENSIONS:
+        if dimension in group_by:
+            columns.extend(['type_id', 'item'] if dimension == 'item' else [dimension])
+    return columns + ['quantity', 'requests']
+
+def _key(row, group_by):
+    return tuple(row[column] for column in columns_for(group_by)[:-2])
+
+def truncate_date(value, bucket):
+    """Start of the bucket containing value, matching Trunc in the current time zone"""
+    day = timezone.localtime(value).date()
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+def _live_rows(since, until, bucket, hub, group_by):
+    queryset = RequestItem.objects.all()
+    if since is not None:
+        queryset = queryset.filter(request__created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(request__created_at__lt=until)
+    fields = []
+    if 'bucket' in group_by:
+        queryset = queryset.annotate(bucket=Trunc('request__created_at', bucket, output_field=DateField()))
+        fields.append('bucket')
+    if 'hub' in group_by:
+        queryset = queryset.annotate(hub=F(f'request__{HUB_FIELDS[hub]}'))
+        fields.append('hub')
+    if 'status' in group_by:
+        queryset = queryset.annotate(status=F('request__status'))
+        fields.append('status')
+    if 'item' in group_by:
+        queryset = queryset.annotate(item=F('name'))
+        fields.extend(['type_id', 'item'])
+    rows = (
+        queryset.values(*fields)
+        .annotate(total_quantity=Sum('quantity'), request_count=Count('request', distinct=True))
+        .order_by(*fields)
+    )
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        row['quantity'] = row.pop('total_quantity')
+        row['requests'] = row.pop('request_count')
+        yield row
+
+def _archived_totals(since, until, bucket, hub, group_by):
+    queryset = ArchivedRequest.objects.order_by('id').only('id', 'status', 'created_at', 'data')
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    totals = {}
+    for archived in queryset.iterator(chunk_size=CHUNK_SIZE):
+        base = {
+            'bucket': truncate_date(archived.created_at, bucket) if 'bucket' in group_by else None,
+            'hub': archived.data['request'].get(HUB_FIELDS[hub]) or '',
+            'status': archived.status,
+        }
+        seen = set()
+        for item in archived.data.get('items', []):
+            key = _key(dict(base, type_id=item.get('type_id'), item=item['name']), group_by)
+            entry = totals.setdefault(key, [0, 0])
+            entry[0] += item['quantity']
+            if key not in seen:
+                seen.add(key)
+                entry[1] += 1
+    return totals
+
+def demand_rows(since=None, until=None, bucket='month', hub='pickup', group_by=DIMENSIONS, include_archived=True):
+    """Yield one dict per group with the requested quantity and the number of
+    requests asking for it. Live groups come in group order; groups only found
+    in the archive follow at the end"""
+    group_by = [dimension for dimension in DIMENSIONS if dimension in group_by]
+    archived = _archived_totals(since, until, bucket, hub, group_by) if include_archived else {}
+    for row in _live_rows(since, until, bucket, hub, group_by):
+        extra = archived.pop(_key(row, group_by), None)
+        if extra:
+            row['quantity'] += extra[0]
+            row['requests'] += extra[1]
+        yield row
+    key_columns = columns_for(group_by)[:-2]
+    for key in sorted(archived, key=lambda key: tuple('' if value is None else str(value) for value in key)):
+        quantity, requests = archived[key]
+        yield dict(zip(key_columns, key), quantity=quantity, requests=requests)
+
+def top_items(since=None, limit=20):
+    """Most requested items of live requests, largest quantity first"""
+    queryset = RequestItem.objects.all()
+    if since is not None:
+        queryset = queryset.filter(request__created_at__gte=since)
+    return list(
+        queryset.values('type_id', 'name')
+        .annotate(total_quantity=Sum('quantity'), request_count=Count('request', distinct=True))
+        .order_by('-total_quantity', 'name')[:limit]
+    )
+
+def recent_top_items(days, limit=20):
+    """top_items over the last days, cached for a few minutes so dashboard loads
+    do not each run the aggregation"""
+    key = TOP_ITEMS_CACHE_KEY.format(days, limit)
+    items = cache.get(key)
+    if items is None:
+        items = top_items(timezone.now() - timedelta(days=days), limit)
+        cache.set(key, items, TOP_ITEMS_CACHE_TIMEOUT)
+    return items
+
+def _serializable(row):
+    bucket = row.get('bucket')
+    return dict(row, bucket=bucket.isoformat()) if bucket is not None else row
+
+class _Echo:
+    def write(self, value):
+        return value
+
+def iter_csv(rows, group_by=DIMENSIONS):
+    """Yield CSV lines, header first, for rows"""
+    columns = columns_for([dimension for dimension in DIMENSIONS if dimension in group_by])
+    writer = csv.DictWriter(_Echo(), fieldnames=columns, extrasaction='ignore')
+    yield writer.writerow(dict(zip(columns, columns)))
+    for row in rows:
+        yield writer.writerow(_serializable(row))
+
+def iter_jsonl(rows):
+    for row in rows:
+        yield json.dumps(_serializable(row), separators=(',', ':')) + '\n'
@@ -1,8 +1,15 @@
+import json
+from datetime import datetime, time, timedelta
 from django import forms
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from .bulk import parse_bulk_csv, parse_bulk_json, parse_bulk_paste, validate_entries
+from .constants import TRADE_HUBS
+from .demand import BUCKETS, DIMENSIONS, HUB_FIELDS
 from .models import ItemRequest
-from .helpers import parse_eve_items
+from .helpers import ITEM_NAME_MAX_LENGTH, overlong_item_names, parse_eve_items, resolve_item_types
+from .sde import get_type_index
 
 class CreateRequestForm(forms.Form):
     request_type = forms.ChoiceField(
@@ -32,6 +39,16 @@ class CreateRequestForm(forms.Form):
         items_list = parse_eve_items(items_text)
         if not items_list:
             raise ValidationError(_('Could not parse any items'))
+        overlong = overlong_item_names(items_list)
+        if overlong:
+            raise ValidationError(_('Item names can be at most %(max)d characters: %(names)s') % {
+                'max': ITEM_NAME_MAX_LENGTH, 'names': ', '.join(overlong[:10]),
+            })
+        type_index = get_type_index()
+        if type_index is not None:
+            items_list, unknown = resolve_item_types(items_list, type_index)
+            if unknown:
+                raise ValidationError(_('Unknown items: %(names)s') % {'names': ', '.join(unknown[:10])})
         self.parsed_items = items_list
         return items_text
 
@@ -44,3 +61,120 @@ class FulfillerContractForm(forms.Form):
     collateral = forms.IntegerField(initial=0, widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}))
     expiration_days = forms.IntegerField(initial=7, widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '1', 'max': '14'}))
     notes = forms.CharField(required=False, widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 3}))
+
+class MarketplaceFilterForm(forms.Form):
+    HUB_CHOICES = [('', _('Any hub'))] + [(hub, hub) for hub, station in TRADE_HUBS]
+    
+    pickup_hub = forms.ChoiceField(required=False, choices=HUB_CHOICES, widget=forms.Select(attrs={'class': 'form-select'}))
+    delivery_hub = forms.ChoiceField(required=False, choices=HUB_CHOICES, widget=forms.Select(attrs={'class': 'form-select'}))
+    request_type = forms.ChoiceField(
+        required=False, choices=[('', _('Any type'))] + ItemRequest.REQUEST_TYPE_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    min_budget = forms.IntegerField(required=False, min_value=0, widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}))
+    max_budget = forms.IntegerField(required=False, min_value=0, widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}))
+    item = forms.CharField(required=False, max_length=255, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    
+    def filter(self, queryset):
+        """Narrow queryset by the cleaned filters. Call only after is_valid()"""
+        data = self.cleaned_data
+        for field in ('pickup_hub', 'delivery_hub', 'request_type'):
+            if data.get(field):
+                queryset = queryset.filter(**{field: data[field]})
+        if data.get('min_budget') is not None or data.get('max_budget') is not None:
+            queryset = queryset.with_budget(data.get('min_budget'), data.get('max_budget'))
+        item = (data.get('item') or '').strip()
+        if item:
+            type_index = get_type_index()
+            type_info = type_index.get(item) if type_index is not None else None
+            if type_info:
+                queryset = queryset.wanting_item(type_id=type_info.type_id)
+            else:
+                queryset = queryset.wanting_item(name=item)
+        return queryset
+
+class BulkCreateRequestForm(forms.Form):
+    request_type = forms.ChoiceField(
+        choices=ItemRequest.REQUEST_TYPE_CHOICES,
+        widget=forms.RadioSelect(attrs={'class': 'form-check-input'}),
+        label=_('Request Type'),
+        initial=ItemRequest.REQUEST_TYPE_REQUESTER_HAS_ITEMS,
+    )
+    pickup_location = forms.CharField(required=False, max_length=255, widget=forms.TextInput(attrs={'class': 'form-control'}),
+                                      help_text=_('Used for sections that do not name one'))
+    delivery_location = forms.CharField(required=False, max_length=255, widget=forms.TextInput(attrs={'class': 'form-control'}),
+                                        help_text=_('Used for sections that do not name one'))
+    requests_text = forms.CharField(
+        required=False, label=_('Requests'),
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 16, 'placeholder': '== Jita -> Amarr | 150000000 ==\nTritanium x1000'}),
+    )
+    upload = forms.FileField(required=False, label=_('Or upload a .json or .csv file'))
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        defaults = {
+            field: cleaned_data.get(field)
+            for field in ('request_type', 'pickup_location', 'delivery_location') if cleaned_data.get(field)
+        }
+        upload = cleaned_data.get('upload')
+        try:
+            if upload:
+                text = upload.read().decode('utf-8-sig')
+                if upload.name.lower().endswith('.json'):
+                    entries = parse_bulk_json(json.loads(text), defaults)
+                else:
+                    entries = parse_bulk_csv(text, defaults)
+            elif cleaned_data.get('requests_text'):
+                entries = parse_bulk_paste(cleaned_data['requests_text'], defaults)
+            else:
+                raise ValidationError(_('Paste your requests or upload a file'))
+            self.entries = validate_entries(entries)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise ValidationError(getattr(e, 'errors', None) or [_('Could not read the upload')])
+        return cleaned_data
+
+class RoutePlannerForm(forms.Form):
+    cargo = forms.FloatField(
+        required=False, min_value=1, label=_('Cargo capacity (m³)'),
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '1', 'step': 'any'}),
+    )
+
+class DemandReportForm(forms.Form):
+    FORMAT_CHOICES = [('csv', 'CSV'), ('jsonl', 'JSON Lines')]
+    
+    since = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    until = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    bucket = forms.ChoiceField(
+        required=False, choices=[(bucket, bucket.title()) for bucket in BUCKETS],
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    hub = forms.ChoiceField(
+        required=False, choices=[(hub, hub.title()) for hub in HUB_FIELDS],
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    group_by = forms.MultipleChoiceField(
+        required=False, choices=[(dimension, dimension.title()) for dimension in DIMENSIONS],
+        widget=forms.CheckboxSelectMultiple,
+    )
+    format = forms.ChoiceField(required=False, choices=FORMAT_CHOICES, widget=forms.Select(attrs={'class': 'form-select'}))
+    archived = forms.BooleanField(required=False, label=_('Include archived requests'))
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        since, until = cleaned_data.get('since'), cleaned_data.get('until')
+        if since and until and until < since:
+            raise ValidationError(_('The end date must not be before the start date'))
+        return cleaned_data
+    
+    def report_kwargs(self):
+        """Keyword arguments for demand_rows; until is inclusive of the whole day"""
+        data = self.cleaned_data
+        since, until = data.get('since'), data.get('until')
+        return {
+            'since': timezone.make_aware(datetime.combine(since, time.min)) if since else None,
+            'until': timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min)) if until else None,
+            'bucket': data.get('bucket') or 'month',
+            'hub': data.get('hub') or 'pickup',
+            'group_by': data.get('group_by') or DIMENSIONS,
+            'include_archived': data.get('archived', False),
+        }
@@ -0,0 +1,50 @@
+"""Per-object HTML fragment cache
+
+Fragments are stored under the object's id and updated_at, so every save that
+moves updated_at retires the old entry without explicit deletes. A page fetches
+all its fragments in one cache round trip and only renders the objects that
+changed since they were last cached.
+"""
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.safestring import mark_safe
+from . import app_settings
+
+FRAGMENT_KEY = 'shopping_cart:fragment:{}:{}:{}:{}'
+
+def fragment_key(template_name, obj):
+    """Cache key for obj rendered with template_name, or None if obj has no version"""
+    if obj.pk is None or obj.updated_at is None:
+        return None
+    return FRAGMENT_KEY.format(template_name, translation.get_language(), obj.pk, obj.updated_at.timestamp())
+
+def render_fragments(template_name, objects, context_name='item_request', prefetch=(), context=None):
+    """Render template_name once per object, reusing cached HTML for unchanged ones.
+    Fragments must not depend on the viewer, they are shared by everyone.
+    prefetch lookups are only run for the objects that have to be rendered.
+    context, if given, builds the template context for an object instead of
+    {context_name: obj}, and is likewise only called on a cache miss"""
+    objects = list(objects)
+    timeout = app_settings.SHOPPING_CART_FRAGMENT_CACHE_SECONDS
+    keys = [fragment_key(template_name, obj) if timeout else None for obj in objects]
+    cached = cache.get_many([key for key in keys if key]) if timeout else {}
+    stale = [obj for obj, key in zip(objects, keys) if key not in cached]
+    if stale and prefetch:
+        prefetch_related_objects(stale, *prefetch)
+    fragments = []
+    rendered = {}
+    for obj, key in zip(objects, keys):
+        html = cached.get(key) if key else None
+        if html is None:
+            html = render_to_string(template_name, context(obj) if context else {context_name: obj})
+            if key:
+                rendered[key] = html
+        fragments.append(mark_safe(html))
+    if rendered:
+        cache.set_many(rendered, timeout)
+    return fragments
+
+def render_fragment(template_name, obj, context_name='item_request', prefetch=(), context=None):
+    return render_fragments(template_name, [obj], context_name, prefetch, context)[0]
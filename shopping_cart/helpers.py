@@ -1,43 +1,175 @@
+import hashlib
 import re
+import threading
+from collections import OrderedDict
+from .constants import TRADE_HUBS
+
+PASTE_FORMAT_INVENTORY = 'inventory'
+PASTE_FORMAT_CONTRACT = 'contract'
+PASTE_FORMAT_MULTIBUY = 'multibuy'
+PASTE_FORMAT_EFT = 'eft'
+
+LINE_RE = re.compile(r'[^\r\n]+')
+QUANTITY_SUFFIX_RE = re.compile(r'(.+?)\s+x([\d,]+)\s*$')
+TRAILING_NUMBER_RE = re.compile(r'(.+?)\s+([\d,]+)\s*$')
+EFT_HEADER_RE = re.compile(r'\[([^,\]]+),[^\]]*\]\s*$')
+EFT_EMPTY_SLOT_RE = re.compile(r'\[Empty [^\]]+\]\s*$')
+ITEM_NAME_MAX_LENGTH = 255  # RequestItem.name
+
+def _iter_lines(text):
+    for match in LINE_RE.finditer(text):
+        line = match.group().strip()
+        if line:
+            yield line
+
+def _to_int(value):
+    try:
+        return int(value.replace(',', ''))
+    except ValueError:
+        return None
+
+def detect_paste_format(text):
+    """Guess the paste format from the first non-empty line"""
+    for line in _iter_lines(text):
+        if EFT_HEADER_RE.match(line):
+            return PASTE_FORMAT_EFT
+        if '\t' in line:
+            # Contract windows export at most name, quantity, group, category and details
+            return PASTE_FORMAT_CONTRACT if line.count('\t') <= 4 else PASTE_FORMAT_INVENTORY
+        return PASTE_FORMAT_MULTIBUY
+    return None
+
+def _parse_generic_line(line):
+    match = QUANTITY_SUFFIX_RE.match(line)
+    if match:
+        return match.group(1).strip(), _to_int(match.group(2))
+    if '\t' in line:
+        parts = line.split('\t', 2)
+        quantity = _to_int(parts[1])
+        if quantity is not None:
+            return parts[0].strip(), quantity
+    match = TRAILING_NUMBER_RE.match(line)
+    if match:
+        return match.group(1).strip(), _to_int(match.group(2))
+    return None
+
+def _parse_tab_line(line):
+    parts = line.split('\t', 2)
+    if len(parts) < 2:
+        return _parse_generic_line(line)
+    quantity = parts[1].strip()
+    if not quantity:
+        # Assembled ships and other singletons have an empty quantity column
+        return parts[0].strip(), 1
+    quantity = _to_int(quantity)
+    if quantity is None:
+        return _parse_generic_line(line)
+    return parts[0].strip(), quantity
+
+def _parse_multibuy_line(line):
+    name, _, quantity = line.rpartition(' ')
+    if name:
+        quantity = _to_int(quantity[1:] if quantity[:1] == 'x' else quantity)
+        if quantity is not None:
+            return name.strip(), quantity
+    return _parse_generic_line(line)
+
+def _parse_eft_line(line):
+    if EFT_EMPTY_SLOT_RE.match(line):
+        return None
+    match = EFT_HEADER_RE.match(line)
+    if match:
+        return match.group(1).strip(), 1
+    name, _, quantity = line.rpartition(' x')
+    if name and quantity.isdigit():
+        return name.strip(), int(quantity)
+    # Loaded charges follow the module after a comma and are not counted
+    return line.split(',', 1)[0].strip(), 1
+
+LINE_PARSERS = {
+    PASTE_FORMAT_INVENTORY: _parse_tab_line,
+    PASTE_FORMAT_CONTRACT: _parse_tab_line,
+    PASTE_FORMAT_MULTIBUY: _parse_multibuy_line,
+    PASTE_FORMAT_EFT: _parse_eft_line,
+}
+
+def iter_eve_items(text, paste_format=None):
+    """Yield (name, quantity) for each parsable line of an EVE paste"""
+    paste_format = paste_format or detect_paste_format(text)
+    if paste_format is None:
+        return
+    parse_line = LINE_PARSERS[paste_format]
+    for line in _iter_lines(text):
+        parsed = parse_line(line)
+        if parsed and parsed[0] and parsed[1]:
+            yield parsed
+
+PARSE_CACHE_SIZE = 256
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
 
 def parse_eve_items(text):
-    """Parse items from EVE copy format"""
-    items = []
-    lines = text.strip().split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        match = re.match(r'(.+?)\s+x([\d,]+)', line)
-        if match:
-            name = match.group(1).strip()
-            quantity = int(match.group(2).replace(',', ''))
-            items.append({"name": name, "quantity": quantity})
+    """Parse items from EVE copy format, merging duplicate names. Doctrine pastes
+    repeat a lot, so recent results are kept in an LRU keyed by the paste's hash"""
+    key = hashlib.sha1(text.encode('utf-8', 'surrogatepass')).digest()
+    with _parse_cache_lock:
+        parsed = _parse_cache.get(key)
+        if parsed is not None:
+            _parse_cache.move_to_end(key)
+    if parsed is None:
+        merged = {}
+        for name, quantity in iter_eve_items(text):
+            merged[name] = merged.get(name, 0) + quantity
+        parsed = tuple(merged.items())
+        with _parse_cache_lock:
+            _parse_cache[key] = parsed
+            if len(_parse_cache) > PARSE_CACHE_SIZE:
+                _parse_cache.popitem(last=False)
+    return [{"name": name, "quantity": quantity} for name, quantity in parsed]
+
+def overlong_item_names(items):
+    """Names in items that do not fit RequestItem.name, shortened for error messages"""
+    return [f"{item['name'][:40]}..." for item in items if len(item['name']) > ITEM_NAME_MAX_LENGTH]
+
+def resolve_item_types(items, type_index):
+    """Attach type_ids and canonical names from type_index, merging items that
+    resolve to the same type. Returns (resolved_items, unknown_names)"""
+    resolved = {}
+    unknown = []
+    for item in items:
+        type_info = type_index.get(item["name"])
+        if type_info is None:
+            unknown.append(item["name"])
             continue
-        
-        if '\t' in line:
-            parts = line.split('\t')
-            if len(parts) >= 2:
-                name = parts[0].strip()
-                try:
-                    quantity = int(parts[1].replace(',', ''))
-                    items.append({"name": name, "quantity": quantity})
-                    continue
-                except ValueError:
-                    pass
-        
-        parts = line.rsplit(' ', 1)
-        if len(parts) == 2:
-            name = parts[0].strip()
-            try:
-                quantity = int(parts[1].replace(',', ''))
-                items.append({"name": name, "quantity": quantity})
-            except ValueError:
-                pass
-    
-    return items
+        if type_info.type_id in resolved:
+            resolved[type_info.type_id]["quantity"] += item["quantity"]
+        else:
+            resolved[type_info.type_id] = {"name": type_info.name, "quantity": item["quantity"], "type_id": type_info.type_id}
+    return list(resolved.values()), unknown
+
+def trade_hub_for(location, hubs=None):
+    """Return the hub a free-text location starts with, or '' if none. hubs
+    defaults to the TRADE_HUBS names"""
+    location = (location or '').strip().lower()
+    for hub in hubs if hubs is not None else (hub for hub, station in TRADE_HUBS):
+        if location.startswith(hub.lower()):
+            return hub
+    return ''
+
+def item_content_hash(items):
+    """Hash (key, quantity) pairs independent of order and of how stacks are split"""
+    totals = {}
+    for key, quantity in items:
+        totals[key] = totals.get(key, 0) + quantity
+    raw = ';'.join(sorted(f"{key}:{quantity}" for key, quantity in totals.items()))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def items_hash(items):
+    """Content hash of item dicts, by type_id where resolved and lower-cased name otherwise"""
+    return item_content_hash(
+        (item['type_id'] if item.get('type_id') is not None else f"name={item['name'].strip().lower()}", item['quantity'])
+        for item in items
+    )
 
 def format_isk(amount):
     if amount is None:
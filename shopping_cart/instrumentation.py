@@ -0,0 +1,120 @@
+"""Per-view query count and timing for the shopping cart views
+
+Totals are kept per process, so with several web workers each one reports its
+own counters, as prometheus_client does outside multiprocess mode.
+"""
+import logging
+import threading
+import time
+from functools import wraps
+from django import shortcuts
+from django.db import connection
+from . import app_settings
+
+logger = logging.getLogger(__name__)
+
+class ViewMetrics:
+    """Measurements for one request. Installed as a connection execute_wrapper
+    so every query the view (or its template) runs is counted and timed"""
+    __slots__ = ('view', 'queries', 'db_time', 'render_time', 'total_time')
+    
+    def __init__(self, view):
+        self.view = view
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.total_time = 0.0
+    
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+    
+    def as_log_line(self):
+        return (
+            f"view={self.view} queries={self.queries} db_ms={self.db_time * 1000:.1f} "
+            f"render_ms={self.render_time * 1000:.1f} total_ms={self.total_time * 1000:.1f}"
+        )
+    
+    def server_timing(self):
+        return (
+            f"db;dur={self.db_time * 1000:.1f}, render;dur={self.render_time * 1000:.1f}, "
+            f"total;dur={self.total_time * 1000:.1f}"
+        )
+
+class MetricsRegistry:
+    """Thread-safe running totals per view"""
+    COUNTERS = [
+        ('requests', 'Requests handled'),
+        ('queries', 'SQL queries executed'),
+        ('db_seconds', 'Time spent in SQL queries'),
+        ('render_seconds', 'Time spent rendering templates'),
+        ('seconds', 'Total time spent in the view'),
+    ]
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+    
+    def record(self, metrics):
+        with self._lock:
+            totals = self._totals.setdefault(metrics.view, dict.fromkeys((name for name, _ in self.COUNTERS), 0))
+            totals['requests'] += 1
+            totals['queries'] += metrics.queries
+            totals['db_seconds'] += metrics.db_time
+            totals['render_seconds'] += metrics.render_time
+            totals['seconds'] += metrics.total_time
+    
+    def snapshot(self):
+        with self._lock:
+            return {view: dict(totals) for view, totals in self._totals.items()}
+    
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+    
+    def render_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, help_text in self.COUNTERS:
+            metric = f"shopping_cart_view_{name}_total"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for view in sorted(snapshot):
+                lines.append(f'{metric}{{view="{view}"}} {snapshot[view][name]:g}')
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+def instrument(view_func):
+    """Record query count, DB time, render time and total time for view_func"""
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        if not app_settings.SHOPPING_CART_INSTRUMENTATION:
+            return view_func(request, *args, **kwargs)
+        metrics = ViewMetrics(view_func.__name__)
+        request.shopping_cart_metrics = metrics
+        start = time.perf_counter()
+        with connection.execute_wrapper(metrics):
+            response = view_func(request, *args, **kwargs)
+        metrics.total_time = time.perf_counter() - start
+        registry.record(metrics)
+        response.shopping_cart_metrics = metrics
+        if app_settings.SHOPPING_CART_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        if app_settings.SHOPPING_CART_METRICS_LOG:
+            logger.info(metrics.as_log_line())
+        return response
+    return wrapped_view
+
+def render(request, *args, **kwargs):
+    """django.shortcuts.render that adds its time to the request's metrics"""
+    start = time.perf_counter()
+    response = shortcuts.render(request, *args, **kwargs)
+    metrics = getattr(request, 'shopping_cart_metrics', None)
+    if metrics is not None:
+        metrics.render_time += time.perf_counter() - start
+    return response
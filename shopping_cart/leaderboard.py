@@ -0,0 +1,56 @@
+"""Precomputed fulfiller rankings"""
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import BigIntegerField, Count, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import FulfillmentTracking, ItemRequest, LeaderboardEntry
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_SIZE = 25
+
+WINDOW_DAYS = {
+    LeaderboardEntry.WINDOW_ALL_TIME: None,
+    LeaderboardEntry.WINDOW_30_DAYS: 30,
+    LeaderboardEntry.WINDOW_7_DAYS: 7,
+}
+
+ISK_VALUE = Coalesce('fulfiller_price', 'requester_price', 'appraised_value', Value(0), output_field=BigIntegerField())
+
+def _window_totals(days, now):
+    """Queryset of fulfiller_id/total_fulfilled/total_volume rows for a window"""
+    if days is None:
+        return FulfillmentTracking.objects.filter(total_fulfilled__gt=0).values(
+            'total_fulfilled', 'total_volume', fulfiller_id=F('user_id'),
+        )
+    return (
+        ItemRequest.objects
+        .filter(status=ItemRequest.STATUS_COMPLETED, fulfiller__isnull=False,
+                contract_completed_at__gte=now - timedelta(days=days))
+        .order_by()
+        .values('fulfiller_id')
+        .annotate(total_fulfilled=Count('id'), total_volume=Sum(ISK_VALUE))
+    )
+
+def refresh_leaderboards(size=LEADERBOARD_SIZE):
+    """Rebuild the top `size` rankings for every window and metric. Returns the number of entries"""
+    now = timezone.now()
+    entries = []
+    for window, days in WINDOW_DAYS.items():
+        totals = _window_totals(days, now)
+        for metric, ordering in (
+            (LeaderboardEntry.METRIC_COUNT, ('-total_fulfilled', '-total_volume', 'fulfiller_id')),
+            (LeaderboardEntry.METRIC_ISK, ('-total_volume', '-total_fulfilled', 'fulfiller_id')),
+        ):
+            for rank, row in enumerate(totals.order_by(*ordering)[:size], start=1):
+                entries.append(LeaderboardEntry(
+                    window=window, metric=metric, rank=rank, user_id=row['fulfiller_id'],
+                    total_fulfilled=row['total_fulfilled'], total_volume=row['total_volume'] or 0, computed_at=now,
+                ))
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardEntry.objects.bulk_create(entries)
+    logger.info(f"Refreshed leaderboards with {len(entries)} entries")
+    return len(entries)
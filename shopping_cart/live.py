@@ -0,0 +1,136 @@
+"""Per-process change feed for live marketplace updates
+
+Events are published to the Django cache under an increasing sequence number,
+so every web process sees changes made by other processes and Celery workers.
+Each process keeps one ChangeFeed: whichever waiting client is due polls the
+cache for everyone, at most once per poll interval, and the rest are woken from
+the shared buffer. Connections therefore never query the database.
+"""
+import threading
+import time
+from collections import deque
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import receiver
+from . import app_settings
+from .signals import request_status_changed
+
+SEQUENCE_KEY = 'shopping_cart:live:sequence'
+EVENT_KEY = 'shopping_cart:live:event:{}'
+EVENT_TIMEOUT = 60 * 10
+# How long a sequence number without its event is waited for before it is skipped
+GAP_TIMEOUT = 10
+
+EVENT_NEW = 'new'
+EVENT_REMOVED = 'removed'
+
+def publish(event):
+    """Append event to the shared feed. Returns its sequence number. The number
+    is visible a moment before the event is stored; readers wait for it"""
+    cache.add(SEQUENCE_KEY, 0, None)
+    sequence = cache.incr(SEQUENCE_KEY)
+    cache.set(EVENT_KEY.format(sequence), event, EVENT_TIMEOUT)
+    return sequence
+
+class ChangeFeed:
+    def __init__(self, poll_interval=1.0, size=500):
+        self.poll_interval = poll_interval
+        self.size = size
+        self._condition = threading.Condition()
+        self._sync_lock = threading.Lock()
+        self._events = deque(maxlen=size)
+        self._last_sequence = None
+        self._last_poll = 0.0
+        self._polling = False
+        self._gap = None
+        self._gap_since = 0.0
+    
+    def _gap_expired(self, number):
+        if self._gap != number:
+            self._gap, self._gap_since = number, time.monotonic()
+        return time.monotonic() - self._gap_since >= GAP_TIMEOUT
+    
+    def _sync(self):
+        with self._sync_lock:
+            sequence = cache.get(SEQUENCE_KEY) or 0
+            events = []
+            reached = sequence
+            if self._last_sequence is not None and sequence > self._last_sequence:
+                first = max(self._last_sequence + 1, sequence - self.size + 1)
+                found = cache.get_many([EVENT_KEY.format(number) for number in range(first, sequence + 1)])
+                reached = first - 1
+                for number in range(first, sequence + 1):
+                    event = found.get(EVENT_KEY.format(number))
+                    if event is None and not self._gap_expired(number):
+                        # Published but not stored yet: stop here and retry on the next poll
+                        break
+                    if event is not None:
+                        events.append((number, event))
+                    reached = number
+            with self._condition:
+                if self._last_sequence is not None and sequence < self._last_sequence:
+                    # The cache was flushed; start over from its new sequence
+                    self._events.clear()
+                self._events.extend(events)
+                self._last_sequence = reached
+                self._last_poll = time.monotonic()
+                self._polling = False
+                self._condition.notify_all()
+    
+    def latest(self):
+        """Sequence number of the newest event, for clients that start listening now"""
+        if self._last_sequence is None or time.monotonic() - self._last_poll >= self.poll_interval:
+            self._sync()
+        return self._last_sequence
+    
+    def events_after(self, sequence, timeout):
+        """Wait up to timeout seconds for events newer than sequence and return
+        them as (sequence, event) pairs, oldest first"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._condition:
+                if self._last_sequence is not None and sequence > self._last_sequence:
+                    sequence = 0
+                events = [(number, event) for number, event in self._events if number > sequence]
+                if events:
+                    return events
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                due = not self._polling and time.monotonic() - self._last_poll >= self.poll_interval
+                if due:
+                    self._polling = True
+                else:
+                    self._condition.wait(min(remaining, self.poll_interval))
+                    continue
+            try:
+                self._sync()
+            except Exception:
+                with self._condition:
+                    self._polling = False
+                raise
+
+_feed = None
+_feed_lock = threading.Lock()
+
+def get_feed():
+    global _feed
+    if _feed is None:
+        with _feed_lock:
+            if _feed is None:
+                _feed = ChangeFeed(app_settings.SHOPPING_CART_LIVE_POLL_INTERVAL)
+    return _feed
+
+@receiver(request_status_changed)
+def publish_marketplace_change(sender, request_id, user_id, old_status, new_status, **kwargs):
+    """Publish requests entering or leaving the marketplace once the change is committed"""
+    if not app_settings.SHOPPING_CART_LIVE_UPDATES:
+        return
+    pending = sender.STATUS_PENDING
+    if new_status == pending and old_status != pending:
+        event = {'type': EVENT_NEW, 'id': request_id, 'user_id': user_id}
+    elif old_status == pending and new_status != pending:
+        event = {'type': EVENT_REMOVED, 'id': request_id, 'user_id': user_id, 'status': new_status}
+    else:
+        return
+    transaction.on_commit(lambda: publish(event))
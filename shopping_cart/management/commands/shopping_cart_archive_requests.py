@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from shopping_cart import app_settings
+from shopping_cart.retention import archive_closed_requests, export_archive
+
+class Command(BaseCommand):
+    help = "Move old closed requests into the archive table and optionally export the archive as gzip JSON lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=app_settings.SHOPPING_CART_ARCHIVE_AFTER_DAYS,
+                            help='Archive requests closed more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=app_settings.SHOPPING_CART_RETENTION_BATCH_SIZE)
+        parser.add_argument('--export', help='Write every archived request to this .jsonl.gz file')
+
+    def handle(self, *args, **options):
+        archived = archive_closed_requests(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} requests"))
+        if options['export']:
+            written = export_archive(options['export'])
+            self.stdout.write(self.style.SUCCESS(f"Exported {written} archived requests to {options['export']}"))
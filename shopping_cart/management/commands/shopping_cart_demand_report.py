@@ -0,0 +1,44 @@
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from shopping_cart.demand import BUCKETS, DIMENSIONS, HUB_FIELDS, demand_rows, iter_csv, iter_jsonl
+
+def _day(value):
+    try:
+        return timezone.make_aware(datetime.combine(datetime.strptime(value, '%Y-%m-%d').date(), time.min))
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+class Command(BaseCommand):
+    help = "Write item demand aggregated by period, hub, status and item as CSV or JSON lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--bucket', choices=BUCKETS, default='month')
+        parser.add_argument('--hub', choices=list(HUB_FIELDS), default='pickup', help='Which hub of a request to group by')
+        parser.add_argument('--group-by', default=','.join(DIMENSIONS),
+                            help=f"Comma separated dimensions out of {', '.join(DIMENSIONS)}")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--include-archived', action='store_true', help='Also count archived requests')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        group_by = [dimension.strip() for dimension in options['group_by'].split(',') if dimension.strip()]
+        unknown = set(group_by) - set(DIMENSIONS)
+        if unknown or not group_by:
+            raise CommandError(f"--group-by takes {', '.join(DIMENSIONS)}")
+        rows = demand_rows(
+            since=_day(options['since']) if options['since'] else None,
+            until=_day(options['until']) + timedelta(days=1) if options['until'] else None,
+            bucket=options['bucket'], hub=options['hub'], group_by=group_by,
+            include_archived=options['include_archived'],
+        )
+        lines = iter_jsonl(rows) if options['format'] == 'jsonl' else iter_csv(rows, group_by)
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            f.writelines(lines)
+        self.stdout.write(self.style.SUCCESS(f"Wrote demand report to {options['output']}"))
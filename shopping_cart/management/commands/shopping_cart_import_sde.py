@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from shopping_cart import app_settings
+from shopping_cart.sde import TypeIndex, read_sde_types, read_sde_volumes
+
+class Command(BaseCommand):
+    help = "Build the item type index from an SDE invTypes CSV (optionally .bz2/.gz compressed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('types_csv', help='Path to invTypes.csv')
+        parser.add_argument('--volumes', help='Path to invVolumes.csv with packaged volumes')
+        parser.add_argument('--output', default=app_settings.SHOPPING_CART_SDE_INDEX_PATH,
+                            help='Index file to write (defaults to SHOPPING_CART_SDE_INDEX_PATH)')
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError('No output path given and SHOPPING_CART_SDE_INDEX_PATH is not set')
+        packaged_volumes = read_sde_volumes(options['volumes']) if options['volumes'] else None
+        type_index = TypeIndex.from_rows(read_sde_types(options['types_csv'], packaged_volumes))
+        type_index.write(options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(type_index)} types to {options['output']}"))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from shopping_cart.models import RequestCounter
+
+class Command(BaseCommand):
+    help = "Recompute the per-user and global request counters from the request table"
+
+    def handle(self, *args, **options):
+        rows = RequestCounter.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} request counters"))
@@ -1,6 +1,12 @@
-from django.db import models
+from django.apps import apps
+from django.db import connections, models, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from .helpers import items_hash, trade_hub_for
+from .signals import request_status_changed
 
-class ItemRequestManager(models.Manager):
+class ItemRequestQuerySet(models.QuerySet):
     def pending(self):
         return self.filter(status='pending')
     
@@ -21,3 +27,186 @@ class ItemRequestManager(models.Manager):
     
     def active(self):
         return self.exclude(status__in=['completed', 'cancelled', 'expired'])
+    
+    def for_list(self):
+        """Load only the columns list pages render, with related rows joined. Items are
+        not prefetched here, rows whose fragment is cached never look at them"""
+        return self.select_related('character', 'fulfiller', 'fulfiller_character').only(
+            'id', 'user_id', 'status', 'request_type', 'pickup_location', 'delivery_location',
+            'pickup_hub', 'delivery_hub', 'requester_price', 'max_budget', 'fulfiller_price', 'appraised_value',
+            'claimed_at', 'contract_id',
+            'created_at', 'updated_at',
+            'character__character_id', 'character__character_name',
+            'fulfiller__username',
+            'fulfiller_character__character_id', 'fulfiller_character__character_name',
+        )
+    
+    def with_item_totals(self):
+        return self.annotate(items_count=Count('items'), items_total_quantity=Sum('items__quantity'))
+    
+    def with_budget(self, min_budget=None, max_budget=None):
+        """Filter on what the request pays: max_budget when buying for the requester, else requester_price"""
+        queryset = self.alias(budget=Coalesce('max_budget', 'requester_price'))
+        if min_budget is not None:
+            queryset = queryset.filter(budget__gte=min_budget)
+        if max_budget is not None:
+            queryset = queryset.filter(budget__lte=max_budget)
+        return queryset
+    
+    def with_same_items(self, item_request):
+        return self.filter(items_hash=item_request.items_hash).exclude(pk=item_request.pk)
+    
+    def wanting_item(self, name=None, type_id=None):
+        if type_id is not None:
+            return self.filter(id__in=self._item_model().objects.filter(type_id=type_id).values('request_id'))
+        return self.filter(id__in=self._item_model().objects.filter(name=name).values('request_id'))
+    
+    def _item_model(self):
+        return self.model._meta.get_field('items').related_model
+
+class ItemRequestManager(models.Manager.from_queryset(ItemRequestQuerySet)):
+    def _with_hubs(self, fields):
+        fields.setdefault('pickup_hub', trade_hub_for(fields.get('pickup_location')))
+        fields.setdefault('delivery_hub', trade_hub_for(fields.get('delivery_location')))
+        return fields
+    
+    def create_with_items(self, items, **fields):
+        """Create a request and bulk insert its item lines in one transaction"""
+        item_model = self.model._meta.get_field('items').related_model
+        self._with_hubs(fields)
+        fields.setdefault('items_hash', items_hash(items))
+        with transaction.atomic():
+            item_request = self.create(**fields)
+            apps.get_model('shopping_cart', 'RequestCounter').objects.record_created(item_request.user_id, item_request.status)
+            item_model.objects.bulk_create([
+                item_model(request=item_request, type_id=item.get('type_id'), name=item['name'], quantity=item['quantity'])
+                for item in items
+            ])
+            # Sent once the items exist, receivers render or summarise the request
+            request_status_changed.send(
+                sender=self.model, request_id=item_request.id, user_id=item_request.user_id,
+                old_status=None, new_status=item_request.status, version=item_request.version, item_request=item_request,
+            )
+        return item_request
+    
+    def bulk_create_with_items(self, entries, **common):
+        """Create a request per (fields, items) entry, sharing common fields, with
+        bulk inserts for requests, items and counters in one transaction"""
+        item_model = self.model._meta.get_field('items').related_model
+        item_requests = [
+            self.model(items_hash=items_hash(items), **self._with_hubs({**common, **fields})) for fields, items in entries
+        ]
+        with transaction.atomic():
+            if connections[self.db].features.can_return_rows_from_bulk_insert:
+                self.bulk_create(item_requests)
+            else:
+                # MySQL does not report the ids of bulk inserted rows, which the items need
+                for item_request in item_requests:
+                    item_request.save(force_insert=True)
+            deltas = {}
+            for item_request in item_requests:
+                deltas[(item_request.user_id, item_request.status)] = deltas.get((item_request.user_id, item_request.status), 0) + 1
+            apps.get_model('shopping_cart', 'RequestCounter').objects.apply(deltas)
+            item_model.objects.bulk_create([
+                item_model(request=item_request, type_id=item.get('type_id'), name=item['name'], quantity=item['quantity'])
+                for item_request, (_, items) in zip(item_requests, entries)
+                for item in items
+            ], batch_size=1000)
+            for item_request in item_requests:
+                request_status_changed.send(
+                    sender=self.model, request_id=item_request.id, user_id=item_request.user_id,
+                    old_status=None, new_status=item_request.status, version=item_request.version, item_request=item_request,
+                )
+        return item_requests
+
+class RequestCounterManager(models.Manager):
+    def _add(self, user_id, status, delta):
+        counters = self.filter(user_id=user_id, status=status)
+        if not counters.update(count=models.F('count') + delta):
+            with transaction.atomic():
+                counter, created = self.select_for_update().get_or_create(user_id=user_id, status=status, defaults={'count': delta})
+                if not created:
+                    self.filter(pk=counter.pk).update(count=models.F('count') + delta)
+    
+    def apply(self, deltas):
+        """Apply {(user_id, status): delta} to the per-user and global counters"""
+        totals = {}
+        for (user_id, status), delta in deltas.items():
+            totals[(user_id, status)] = totals.get((user_id, status), 0) + delta
+            totals[(None, status)] = totals.get((None, status), 0) + delta
+        with transaction.atomic():
+            for (user_id, status), delta in sorted(totals.items(), key=lambda kv: (kv[0][0] or 0, kv[0][1])):
+                if delta:
+                    self._add(user_id, status, delta)
+    
+    def record_created(self, user_id, status, count=1):
+        self.apply({(user_id, status): count})
+    
+    def record_status_change(self, user_id, old_status, new_status):
+        if old_status != new_status:
+            self.apply({(user_id, old_status): -1, (user_id, new_status): 1})
+    
+    def counts_for(self, user=None):
+        """Return {status: count} for one user, or the global counters when user is None"""
+        counters = self.filter(user__isnull=True) if user is None else self.filter(user=user)
+        return dict(counters.values_list('status', 'count'))
+    
+    def rebuild(self):
+        """Recompute every counter from the live and archived request tables"""
+        item_request_model = apps.get_model('shopping_cart', 'ItemRequest')
+        archived_request_model = apps.get_model('shopping_cart', 'ArchivedRequest')
+        rows = {}
+        for model in (item_request_model, archived_request_model):
+            for user_id, status, total in model.objects.order_by().values_list('user_id', 'status').annotate(total=Count('id')):
+                rows[(user_id, status)] = rows.get((user_id, status), 0) + total
+                rows[(None, status)] = rows.get((None, status), 0) + total
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create([self.model(user_id=user_id, status=status, count=count) for (user_id, status), count in rows.items()])
+        return len(rows)
+
+class StatusTransitionManager(models.Manager):
+    def record(self, entries):
+        """Log applied transitions, update the counters once for all of them and send
+        request_status_changed per request. entries are (request_id, user_id,
+        old_status, new_status, version, item_request or None) tuples, see
+        ItemRequest.transition_entry. Must run in the transaction of the UPDATEs"""
+        entries = list(entries)
+        if not entries:
+            return
+        now = timezone.now()
+        self.bulk_create([
+            self.model(request_id=request_id, version=version, old_status=old_status, new_status=new_status, created_at=now)
+            for request_id, user_id, old_status, new_status, version, _ in entries
+        ])
+        deltas = {}
+        for _, user_id, old_status, new_status, _, _ in entries:
+            deltas[(user_id, old_status)] = deltas.get((user_id, old_status), 0) - 1
+            deltas[(user_id, new_status)] = deltas.get((user_id, new_status), 0) + 1
+        apps.get_model('shopping_cart', 'RequestCounter').objects.apply(deltas)
+        item_request_model = apps.get_model('shopping_cart', 'ItemRequest')
+        for request_id, user_id, old_status, new_status, version, item_request in entries:
+            request_status_changed.send(
+                sender=item_request_model, request_id=request_id, user_id=user_id, old_status=old_status,
+                new_status=new_status, version=version, item_request=item_request,
+            )
+
+class FulfillmentTrackingManager(models.Manager):
+    def record_completions(self, completions):
+        """Add completed requests to their fulfillers' stats.
+        completions is an iterable of (fulfiller_id, isk_value, completed_at)"""
+        totals = {}
+        for user_id, value, completed_at in completions:
+            if not user_id:
+                continue
+            count, volume, last = totals.get(user_id, (0, 0, completed_at))
+            totals[user_id] = (count + 1, volume + (value or 0), max(last, completed_at))
+        with transaction.atomic():
+            existing = set(self.filter(user_id__in=totals).values_list('user_id', flat=True))
+            self.bulk_create([self.model(user_id=user_id) for user_id in totals if user_id not in existing], ignore_conflicts=True)
+            for user_id, (count, volume, last) in sorted(totals.items()):
+                self.filter(user_id=user_id).update(
+                    total_fulfilled=models.F('total_fulfilled') + count,
+                    total_volume=models.F('total_volume') + volume,
+                    last_fulfilled=Greatest(Coalesce('last_fulfilled', models.Value(last)), models.Value(last)),
+                )
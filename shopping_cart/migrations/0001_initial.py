@@ -1,12 +1,81 @@
-# Generated migration - placeholder
-from django.db import migrations
+# Generated by Django 4.2.30 on 2026-10-18 14:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
 
 class Migration(migrations.Migration):
+
     initial = True
+
     dependencies = [
-        ('auth', '0012_alter_user_first_name_max_length'),
-        ('eveonline', '0017_character_alliance_and_corp_update_get_or_create'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('eveonline', '0017_alliance_and_corp_names_are_not_unique'),
     ]
+
     operations = [
-        # Migration operations will be generated by Django
+        migrations.CreateModel(
+            name='General',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'permissions': (('basic_access', 'Can access this app'), ('request_items', 'Can request items'), ('fulfill_requests', 'Can claim and fulfill item requests'), ('manage_requests', 'Can manage all item requests')),
+                'managed': False,
+                'default_permissions': (),
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_type', models.CharField(choices=[('requester_has_items', 'I have the items'), ('fulfiller_buys', 'Please buy items for me')], default='requester_has_items', max_length=30)),
+                ('items_list', models.JSONField()),
+                ('pickup_location', models.CharField(max_length=255)),
+                ('delivery_location', models.CharField(max_length=255)),
+                ('requester_price', models.BigIntegerField(blank=True, null=True)),
+                ('requester_collateral', models.BigIntegerField(default=0)),
+                ('requester_expiration_days', models.IntegerField(default=7)),
+                ('max_budget', models.BigIntegerField(blank=True, null=True)),
+                ('description', models.TextField(blank=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('fulfiller_price', models.BigIntegerField(blank=True, null=True)),
+                ('fulfiller_collateral', models.BigIntegerField(blank=True, null=True)),
+                ('fulfiller_expiration_days', models.IntegerField(blank=True, null=True)),
+                ('fulfiller_notes', models.TextField(blank=True)),
+                ('contract_id', models.BigIntegerField(blank=True, null=True, unique=True)),
+                ('contract_issuer', models.CharField(blank=True, choices=[('requester', 'Requester Created Contract'), ('fulfiller', 'Fulfiller Created Contract')], max_length=20, null=True)),
+                ('contract_created_at', models.DateTimeField(blank=True, null=True)),
+                ('contract_accepted_at', models.DateTimeField(blank=True, null=True)),
+                ('contract_completed_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('claimed', 'Claimed'), ('contract_created', 'Contract Created'), ('contract_accepted', 'Contract Accepted'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('expired', 'Expired')], db_index=True, default='pending', max_length=30)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_requests', to='eveonline.evecharacter')),
+                ('esi_monitor_character', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shopping_cart_monitored_contracts', to='eveonline.evecharacter')),
+                ('fulfiller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shopping_cart_fulfilled_requests', to=settings.AUTH_USER_MODEL)),
+                ('fulfiller_character', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shopping_cart_fulfilled_requests', to='eveonline.evecharacter')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_requests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'default_permissions': (),
+            },
+        ),
+        migrations.CreateModel(
+            name='FulfillmentTracking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_fulfilled', models.IntegerField(default=0)),
+                ('total_volume', models.BigIntegerField(default=0)),
+                ('last_fulfilled', models.DateTimeField(blank=True, null=True)),
+                ('rating', models.DecimalField(decimal_places=2, default=5.0, max_digits=3)),
+                ('total_ratings', models.IntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_fulfillment_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'default_permissions': (),
+            },
+        ),
     ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_id', models.IntegerField(blank=True, null=True)),
+                ('name', models.CharField(max_length=255)),
+                ('quantity', models.BigIntegerField()),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='shopping_cart.itemrequest')),
+            ],
+            options={
+                'ordering': ['id'],
+                'default_permissions': (),
+                'indexes': [
+                    models.Index(fields=['name', 'request'], name='shopping_ca_item_name_idx'),
+                    models.Index(fields=['type_id', 'request'], name='shopping_ca_item_type_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_request_items(apps, schema_editor):
+    ItemRequest = apps.get_model('shopping_cart', 'ItemRequest')
+    RequestItem = apps.get_model('shopping_cart', 'RequestItem')
+    batch = []
+    for request_id, items_list in ItemRequest.objects.values_list('id', 'items_list').iterator(chunk_size=BATCH_SIZE):
+        for item in items_list or []:
+            if not item.get('name') or not item.get('quantity'):
+                continue
+            batch.append(RequestItem(
+                request_id=request_id,
+                type_id=item.get('type_id'),
+                name=item['name'],
+                quantity=item['quantity'],
+            ))
+        if len(batch) >= BATCH_SIZE:
+            RequestItem.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        RequestItem.objects.bulk_create(batch)
+
+
+def restore_items_list(apps, schema_editor):
+    ItemRequest = apps.get_model('shopping_cart', 'ItemRequest')
+    RequestItem = apps.get_model('shopping_cart', 'RequestItem')
+    items_by_request = {}
+    for request_id, type_id, name, quantity in RequestItem.objects.order_by('id').values_list(
+        'request_id', 'type_id', 'name', 'quantity'
+    ).iterator(chunk_size=BATCH_SIZE):
+        item = {'name': name, 'quantity': quantity}
+        if type_id is not None:
+            item['type_id'] = type_id
+        items_by_request.setdefault(request_id, []).append(item)
+    for request_id, items_list in items_by_request.items():
+        ItemRequest.objects.filter(id=request_id).update(items_list=items_list)
+    RequestItem.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_cart', '0002_requestitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_request_items, restore_items_list),
+    ]
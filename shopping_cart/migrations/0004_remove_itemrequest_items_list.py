@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_cart', '0003_backfill_request_items'),
+    ]
+
+    operations = [
+        # A default keeps the removal reversible on tables that already have rows
+        migrations.AlterField(
+            model_name='itemrequest',
+            name='items_list',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RemoveField(
+            model_name='itemrequest',
+            name='items_list',
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_cart', '0004_remove_itemrequest_items_list'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_id', models.IntegerField()),
+                ('hub', models.CharField(max_length=50)),
+                ('buy', models.FloatField(default=0)),
+                ('sell', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'default_permissions': (),
+            },
+        ),
+        migrations.AddField(
+            model_name='itemrequest',
+            name='appraised_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='itemrequest',
+            name='appraised_value',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='itemrequest',
+            name='appraised_volume',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='marketprice',
+            constraint=models.UniqueConstraint(fields=('hub', 'type_id'), name='shopping_cart_unique_hub_type_price'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_counters(apps, schema_editor):
+    ItemRequest = apps.get_model('shopping_cart', 'ItemRequest')
+    RequestCounter = apps.get_model('shopping_cart', 'RequestCounter')
+    rows = {}
+    for user_id, status, total in ItemRequest.objects.order_by().values_list('user_id', 'status').annotate(
+        total=models.Count('id')
+    ):
+        rows[(user_id, status)] = total
+        rows[(None, status)] = rows.get((None, status), 0) + total
+    RequestCounter.objects.bulk_create([
+        RequestCounter(user_id=user_id, status=status, count=count) for (user_id, status), count in rows.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shopping_cart', '0005_market_prices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('claimed', 'Claimed'), ('contract_created', 'Contract Created'), ('contract_accepted', 'Contract Accepted'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('expired', 'Expired')], max_length=30)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'default_permissions': (),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='requestcounter',
+            constraint=models.UniqueConstraint(fields=('user', 'status'), name='shopping_cart_unique_user_status_counter'),
+        ),
+        migrations.AddConstraint(
+            model_name='requestcounter',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('status',), name='shopping_cart_unique_global_status_counter'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_cart', '0006_request_counters'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='itemrequest',
+            options={'default_permissions': (), 'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='itemrequest',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='shopping_ca_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemrequest',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='shopping_ca_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemrequest',
+            index=models.Index(fields=['fulfiller', 'status', '-created_at', '-id'], name='shopping_ca_fulfiller_idx'),
+        ),
+    ]
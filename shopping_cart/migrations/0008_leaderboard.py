@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shopping_cart', '0007_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('all', 'All time'), ('30d', 'Last 30 days'), ('7d', 'Last 7 days')], max_length=10)),
+                ('metric', models.CharField(choices=[('count', 'Requests fulfilled'), ('isk', 'ISK volume')], max_length=10)),
+                ('rank', models.IntegerField()),
+                ('total_fulfilled', models.IntegerField(default=0)),
+                ('total_volume', models.BigIntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['window', 'metric', 'rank'],
+                'default_permissions': (),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='itemrequest',
+            index=models.Index(fields=['status', 'contract_completed_at'], name='shopping_ca_status_completed_idx'),
+        ),
+        migrations.AddField(
+            model_name='leaderboardentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('window', 'metric', 'rank'), name='shopping_cart_unique_leaderboard_rank'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations, models
+
+
+HUBS = ['Jita', 'Amarr', 'Dodixie', 'Rens', 'Hek']
+
+
+def trade_hub_for(location, hubs=HUBS):
+    # Frozen copy of shopping_cart.helpers.trade_hub_for
+    location = (location or '').strip().lower()
+    for hub in hubs:
+        if location.startswith(hub.lower()):
+            return hub
+    return ''
+
+
+def populate_hubs(apps, schema_editor):
+    ItemRequest = apps.get_model('shopping_cart', 'ItemRequest')
+    ids_by_hubs = {}
+    for request_id, pickup, delivery in ItemRequest.objects.values_list('id', 'pickup_location', 'delivery_location').iterator():
+        hubs = (trade_hub_for(pickup), trade_hub_for(delivery))
+        if hubs != ('', ''):
+            ids_by_hubs.setdefault(hubs, []).append(request_id)
+    for (pickup_hub, delivery_hub), ids in ids_by_hubs.items():
+        for start in range(0, len(ids), 1000):
+            ItemRequest.objects.filter(id__in=ids[start:start + 1000]).update(pickup_hub=pickup_hub, delivery_hub=delivery_hub)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_cart', '0010_archived_request'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemrequest',
+            name='delivery_hub',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='itemrequest',
+            name='pickup_hub',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.RunPython(populate_hubs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='itemrequest',
+            index=models.Index(fields=['status', 'pickup_hub', '-created_at', '-id'], name='shopping_ca_pickup_hub_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemrequest',
+            index=models.Index(fields=['status', 'delivery_hub', '-created_at', '-id'], name='shopping_ca_delivery_hub_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+import hashlib
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def _items_hash(items):
+    # Frozen copy of shopping_cart.helpers.items_hash
+    totals = {}
+    for type_id, name, quantity in items:
+        key = type_id if type_id is not None else f"name={name.strip().lower()}"
+        totals[key] = totals.get(key, 0) + quantity
+    raw = ';'.join(sorted(f"{key}:{quantity}" for key, quantity in totals.items()))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def populate_items_hash(apps, schema_editor):
+    ItemRequest = apps.get_model('shopping_cart', 'ItemRequest')
+    RequestItem = apps.get_model('shopping_cart', 'RequestItem')
+    last_id = 0
+    while True:
+        ids = list(ItemRequest.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        items = {request_id: [] for request_id in ids}
+        for request_id, type_id, name, quantity in RequestItem.objects.filter(request_id__in=ids).values_list(
+            'request_id', 'type_id', 'name', 'quantity',
+        ):
+            items[request_id].append((type_id, name, quantity))
+        rows = [ItemRequest(id=request_id, items_hash=_items_hash(request_items)) for request_id, request_items in items.items()]
+        ItemRequest.objects.bulk_update(rows, ['items_hash'])
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_cart', '0011_request_hubs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemrequest',
+            name='items_hash',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.RunPython(populate_items_hash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='itemrequest',
+            index=models.Index(fields=['items_hash'], name='shopping_ca_items_hash_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_cart', '0012_request_items_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_id', models.BigIntegerField()),
+                ('version', models.PositiveIntegerField()),
+                ('old_status', models.CharField(choices=[('pending', 'Pending'), ('claimed', 'Claimed'), ('contract_created', 'Contract Created'), ('contract_accepted', 'Contract Accepted'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('expired', 'Expired')], max_length=30)),
+                ('new_status', models.CharField(choices=[('pending', 'Pending'), ('claimed', 'Claimed'), ('contract_created', 'Contract Created'), ('contract_accepted', 'Contract Accepted'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('expired', 'Expired')], max_length=30)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['request_id', 'version'],
+                'default_permissions': (),
+            },
+        ),
+        migrations.AddField(
+            model_name='itemrequest',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='statustransition',
+            constraint=models.UniqueConstraint(fields=('request_id', 'version'), name='shopping_cart_unique_request_version'),
+        ),
+    ]
@@ -1,9 +1,12 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Sum
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from allianceauth.eveonline.models import EveCharacter
-from .managers import ItemRequestManager
+from .constants import STATUS_COLORS, STATUS_ICONS
+from .managers import FulfillmentTrackingManager, ItemRequestManager, RequestCounterManager, StatusTransitionManager
 
 class General(models.Model):
     class Meta:
@@ -35,6 +38,17 @@ class ItemRequest(models.Model):
         (STATUS_EXPIRED, _('Expired')),
     ]
     
+    # Legal moves between statuses; everything else is rejected by transition()
+    TRANSITIONS = {
+        STATUS_PENDING: (STATUS_CLAIMED, STATUS_CANCELLED, STATUS_EXPIRED),
+        STATUS_CLAIMED: (STATUS_CONTRACT_CREATED, STATUS_CANCELLED),
+        STATUS_CONTRACT_CREATED: (STATUS_CONTRACT_ACCEPTED, STATUS_COMPLETED),
+        STATUS_CONTRACT_ACCEPTED: (STATUS_COMPLETED,),
+        STATUS_COMPLETED: (),
+        STATUS_CANCELLED: (),
+        STATUS_EXPIRED: (),
+    }
+    
     REQUEST_TYPE_REQUESTER_HAS_ITEMS = 'requester_has_items'
     REQUEST_TYPE_FULFILLER_BUYS = 'fulfiller_buys'
     
@@ -54,9 +68,11 @@ class ItemRequest(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='shopping_cart_requests')
     character = models.ForeignKey(EveCharacter, on_delete=models.CASCADE, related_name='shopping_cart_requests')
     request_type = models.CharField(max_length=30, choices=REQUEST_TYPE_CHOICES, default=REQUEST_TYPE_REQUESTER_HAS_ITEMS)
-    items_list = models.JSONField()
     pickup_location = models.CharField(max_length=255)
     delivery_location = models.CharField(max_length=255)
+    pickup_hub = models.CharField(max_length=50, blank=True, default='')
+    delivery_hub = models.CharField(max_length=50, blank=True, default='')
+    items_hash = models.CharField(max_length=40, blank=True, default='')
     requester_price = models.BigIntegerField(null=True, blank=True)
     requester_collateral = models.BigIntegerField(default=0)
     requester_expiration_days = models.IntegerField(default=7)
@@ -75,7 +91,11 @@ class ItemRequest(models.Model):
     contract_accepted_at = models.DateTimeField(null=True, blank=True)
     contract_completed_at = models.DateTimeField(null=True, blank=True)
     esi_monitor_character = models.ForeignKey(EveCharacter, null=True, blank=True, related_name='shopping_cart_monitored_contracts', on_delete=models.SET_NULL)
+    appraised_value = models.BigIntegerField(null=True, blank=True)
+    appraised_volume = models.FloatField(null=True, blank=True)
+    appraised_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -83,11 +103,25 @@ class ItemRequest(models.Model):
     
     class Meta:
         default_permissions = ()
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['status', '-created_at', '-id'], name='shopping_ca_status_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='shopping_ca_user_created_idx'),
+            models.Index(fields=['fulfiller', 'status', '-created_at', '-id'], name='shopping_ca_fulfiller_idx'),
+            models.Index(fields=['status', 'contract_completed_at'], name='shopping_ca_status_completed_idx'),
+            models.Index(fields=['status', 'pickup_hub', '-created_at', '-id'], name='shopping_ca_pickup_hub_idx'),
+            models.Index(fields=['status', 'delivery_hub', '-created_at', '-id'], name='shopping_ca_delivery_hub_idx'),
+            models.Index(fields=['items_hash'], name='shopping_ca_items_hash_idx'),
+        ]
     
     def __str__(self):
-        items_summary = ', '.join([f"{item['name']} x{item['quantity']}" for item in self.items_list[:3]])
-        if len(self.items_list) > 3:
+        return self.summary(self.items.all()[:4])
+    
+    def summary(self, items):
+        """The #id - name xN, ... line for items, which need not be saved rows of this request"""
+        items = list(items)
+        items_summary = ', '.join([f"{item.name} x{item.quantity}" for item in items[:3]])
+        if len(items) > 3:
             items_summary += '...'
         return f"#{self.id} - {items_summary}"
     
@@ -95,52 +129,203 @@ class ItemRequest(models.Model):
     def is_claimable(self):
         return self.status == self.STATUS_PENDING and not self.fulfiller
     
+    @property
+    def items_list(self):
+        return [item.as_dict() for item in self.items.all()]
+    
+    @property
+    def _items_prefetched(self):
+        return 'items' in getattr(self, '_prefetched_objects_cache', {})
+    
     @property
     def total_items_count(self):
-        return len(self.items_list)
+        if hasattr(self, 'items_count'):
+            return self.items_count
+        if self._items_prefetched:
+            return len(self.items.all())
+        return self.items.count()
     
     @property
     def total_quantity(self):
-        return sum(item.get('quantity', 0) for item in self.items_list)
+        if hasattr(self, 'items_total_quantity'):
+            return self.items_total_quantity or 0
+        if self._items_prefetched:
+            return sum(item.quantity for item in self.items.all())
+        return self.items.aggregate(total=Sum('quantity'))['total'] or 0
+    
+    @property
+    def isk_value(self):
+        """What the request is worth to its fulfiller, used for leaderboard volume"""
+        for value in (self.fulfiller_price, self.requester_price, self.appraised_value):
+            if value is not None:
+                return value
+        return 0
     
     @property
     def status_badge_class(self):
-        from .constants import STATUS_COLORS
         return STATUS_COLORS.get(self.status, 'default')
     
     @property
     def status_icon(self):
-        from .constants import STATUS_ICONS
         return STATUS_ICONS.get(self.status, 'fa-question')
     
     def can_be_claimed_by(self, user):
         if not self.is_claimable:
             return False
-        if user.is_superuser:
+        from .access import get_access
+        access = get_access(user)
+        if access.is_superuser:
             return True
-        if not user.has_perm('shopping_cart.fulfill_requests'):
+        if not access.has_perm('shopping_cart.fulfill_requests'):
             return False
-        if self.user == user:
+        if self.user_id == user.id:
             return False
         return True
     
+    @classmethod
+    def can_transition(cls, old_status, new_status):
+        return new_status in cls.TRANSITIONS.get(old_status, ())
+    
+    def versioned_update(self, new_status, changes=None, **conditions):
+        """Move to new_status with an UPDATE of only the changed fields, guarded by
+        the version this instance last saw (and conditions). A lost race reloads
+        status, version and the contested fields and retries while the table still
+        allows the move. Returns the status replaced, or None. Callers record the
+        transition, see transition()"""
+        changes = dict(changes or {}, status=new_status, updated_at=timezone.now())
+        while self.can_transition(self.status, new_status):
+            old_status, old_version = self.status, self.version
+            if ItemRequest.objects.filter(pk=self.pk, version=old_version, **conditions).update(version=old_version + 1, **changes):
+                for field, value in changes.items():
+                    setattr(self, field, value)
+                self.version = old_version + 1
+                return old_status
+            self.refresh_from_db(fields=['status', 'version', *changes])
+            if self.version == old_version:
+                # Nobody else moved the row, so conditions do not hold
+                return None
+        return None
+    
+    def transition(self, new_status, changes=None, **conditions):
+        """Apply a status change allowed by TRANSITIONS, log it and send
+        request_status_changed. Returns False if the move is not (or no longer) legal"""
+        with transaction.atomic():
+            old_status = self.versioned_update(new_status, changes, **conditions)
+            if old_status is None:
+                return False
+            StatusTransition.objects.record([self.transition_entry(old_status)])
+        return True
+    
+    def transition_entry(self, old_status):
+        return (self.pk, self.user_id, old_status, self.status, self.version, self)
+    
     def claim(self, user, character):
         if not self.can_be_claimed_by(user):
             raise ValueError("This request cannot be claimed by this user")
-        self.fulfiller = user
-        self.fulfiller_character = character
-        self.claimed_at = timezone.now()
-        self.status = self.STATUS_CLAIMED
+        changes = {
+            'fulfiller': user,
+            'fulfiller_character': character,
+            'claimed_at': timezone.now(),
+        }
         if self.request_type == self.REQUEST_TYPE_REQUESTER_HAS_ITEMS:
-            self.esi_monitor_character = self.character
-        self.save()
-    
-    def set_contract_created(self, contract_id, issuer):
-        self.contract_id = contract_id
-        self.contract_issuer = issuer
-        self.contract_created_at = timezone.now()
-        self.status = self.STATUS_CONTRACT_CREATED
-        self.save()
+            changes['esi_monitor_character'] = self.character
+        if not self.transition(self.STATUS_CLAIMED, changes, fulfiller__isnull=True):
+            raise ValueError("This request has already been claimed")
+    
+    def set_contract_created(self, contract_id, issuer, monitor_character=None):
+        changes = {
+            'contract_id': contract_id,
+            'contract_issuer': issuer,
+            'contract_created_at': timezone.now(),
+        }
+        if monitor_character is not None:
+            changes['esi_monitor_character'] = monitor_character
+        if not self.transition(self.STATUS_CONTRACT_CREATED, changes):
+            raise ValueError("A contract can only be recorded for a claimed request")
+    
+    def cancel(self):
+        if not self.transition(self.STATUS_CANCELLED):
+            raise ValueError("This request can no longer be cancelled")
+
+class RequestItem(models.Model):
+    request = models.ForeignKey(ItemRequest, on_delete=models.CASCADE, related_name='items')
+    type_id = models.IntegerField(null=True, blank=True)
+    name = models.CharField(max_length=255)
+    quantity = models.BigIntegerField()
+    
+    class Meta:
+        default_permissions = ()
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['name', 'request'], name='shopping_ca_item_name_idx'),
+            models.Index(fields=['type_id', 'request'], name='shopping_ca_item_type_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} x{self.quantity}"
+    
+    def as_dict(self):
+        item = {"name": self.name, "quantity": self.quantity}
+        if self.type_id is not None:
+            item["type_id"] = self.type_id
+        return item
+
+class MarketPrice(models.Model):
+    type_id = models.IntegerField()
+    hub = models.CharField(max_length=50)
+    buy = models.FloatField(default=0)
+    sell = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        default_permissions = ()
+        constraints = [
+            models.UniqueConstraint(fields=['hub', 'type_id'], name='shopping_cart_unique_hub_type_price'),
+        ]
+    
+    def __str__(self):
+        return f"{self.hub} {self.type_id}: {self.sell:,.2f}"
+
+class RequestCounter(models.Model):
+    """Request counts by status, per user and globally (user is NULL)"""
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name='shopping_cart_counters')
+    status = models.CharField(max_length=30, choices=ItemRequest.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+    
+    objects = RequestCounterManager()
+    
+    class Meta:
+        default_permissions = ()
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'status'], name='shopping_cart_unique_user_status_counter'),
+            models.UniqueConstraint(
+                fields=['status'], condition=models.Q(user__isnull=True), name='shopping_cart_unique_global_status_counter',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user or 'all'} {self.status}: {self.count}"
+
+class StatusTransition(models.Model):
+    """Append-only log of status changes, one row per version of a request. It is
+    not a foreign key so the history outlives archiving"""
+    request_id = models.BigIntegerField()
+    version = models.PositiveIntegerField()
+    old_status = models.CharField(max_length=30, choices=ItemRequest.STATUS_CHOICES)
+    new_status = models.CharField(max_length=30, choices=ItemRequest.STATUS_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    objects = StatusTransitionManager()
+    
+    class Meta:
+        default_permissions = ()
+        ordering = ['request_id', 'version']
+        constraints = [
+            models.UniqueConstraint(fields=['request_id', 'version'], name='shopping_cart_unique_request_version'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.request_id} v{self.version}: {self.old_status} -> {self.new_status}"
 
 class FulfillmentTracking(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='shopping_cart_fulfillment_stats')
@@ -150,8 +335,105 @@ class FulfillmentTracking(models.Model):
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=5.0)
     total_ratings = models.IntegerField(default=0)
     
+    objects = FulfillmentTrackingManager()
+    
     class Meta:
         default_permissions = ()
     
     def __str__(self):
         return f"{self.user.username} - {self.total_fulfilled} fulfilled"
+
+class LeaderboardEntry(models.Model):
+    WINDOW_ALL_TIME = 'all'
+    WINDOW_30_DAYS = '30d'
+    WINDOW_7_DAYS = '7d'
+    
+    WINDOW_CHOICES = [
+        (WINDOW_ALL_TIME, _('All time')),
+        (WINDOW_30_DAYS, _('Last 30 days')),
+        (WINDOW_7_DAYS, _('Last 7 days')),
+    ]
+    
+    METRIC_COUNT = 'count'
+    METRIC_ISK = 'isk'
+    
+    METRIC_CHOICES = [
+        (METRIC_COUNT, _('Requests fulfilled')),
+        (METRIC_ISK, _('ISK volume')),
+    ]
+    
+    window = models.CharField(max_length=10, choices=WINDOW_CHOICES)
+    metric = models.CharField(max_length=10, choices=METRIC_CHOICES)
+    rank = models.IntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    total_fulfilled = models.IntegerField(default=0)
+    total_volume = models.BigIntegerField(default=0)
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        default_permissions = ()
+        ordering = ['window', 'metric', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['window', 'metric', 'rank'], name='shopping_cart_unique_leaderboard_rank'),
+        ]
+    
+    def __str__(self):
+        return f"{self.window}/{self.metric} #{self.rank} {self.user_id}"
+
+class NotificationOutbox(models.Model):
+    EVENT_NEW_REQUEST = 'new_request'
+    EVENT_CLAIMED = 'claimed'
+    
+    EVENT_CHOICES = [
+        (EVENT_NEW_REQUEST, _('New request')),
+        (EVENT_CLAIMED, _('Request claimed')),
+    ]
+    
+    event = models.CharField(max_length=30, choices=EVENT_CHOICES)
+    request_id = models.BigIntegerField(null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    attempts = models.IntegerField(default=0)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        default_permissions = ()
+        indexes = [
+            models.Index(fields=['sent_at', 'next_attempt_at'], name='shopping_ca_outbox_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event} #{self.request_id}"
+
+class ArchivedRequest(models.Model):
+    """A closed request moved out of the live table. data holds the request's column
+    values plus its items, so it can be rebuilt for read-only display"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=30, choices=ItemRequest.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    
+    class Meta:
+        default_permissions = ()
+        indexes = [
+            models.Index(fields=['created_at'], name='shopping_ca_archive_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.id} ({self.status}, archived)"
+    
+    def to_request(self):
+        """Rebuild an unsaved ItemRequest from the archived data. It has no items,
+        use to_items for those"""
+        fields = {}
+        for field in ItemRequest._meta.concrete_fields:
+            if field.attname in self.data['request']:
+                fields[field.attname] = field.to_python(self.data['request'][field.attname])
+        return ItemRequest(**fields)
+    
+    def to_items(self):
+        """Unsaved RequestItems rebuilt from the archived data, in their original order"""
+        return [RequestItem(**item) for item in self.data['items']]
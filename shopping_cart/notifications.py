@@ -0,0 +1,173 @@
+"""Discord webhook notifications, delivered in batches from an outbox table"""
+import logging
+from datetime import timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+from . import app_settings
+from .models import NotificationOutbox
+from .signals import request_status_changed
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_SCHEDULED_KEY = 'shopping_cart:notifications:scheduled'
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EVENTS_PER_EMBED = 20
+MAX_EVENTS_PER_RUN = 500
+MAX_ATTEMPTS = 5
+MAX_BACKOFF_SECONDS = 3600
+# Rows being posted are hidden from other runs this long, then retried if the run died
+LEASE_SECONDS = 120
+
+EVENT_TITLES = {
+    NotificationOutbox.EVENT_NEW_REQUEST: 'New shopping cart requests',
+    NotificationOutbox.EVENT_CLAIMED: 'Requests claimed',
+}
+
+EVENT_COLORS = {
+    NotificationOutbox.EVENT_NEW_REQUEST: 0xF0AD4E,
+    NotificationOutbox.EVENT_CLAIMED: 0x5BC0DE,
+}
+
+EVENT_SETTINGS = {
+    NotificationOutbox.EVENT_NEW_REQUEST: 'SHOPPING_CART_NOTIFY_ON_NEW_REQUEST',
+    NotificationOutbox.EVENT_CLAIMED: 'SHOPPING_CART_NOTIFY_ON_CLAIM',
+}
+
+_session = None
+
+def get_session():
+    """Return the process-wide HTTP session so webhook posts reuse connections"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount('https://', HTTPAdapter(pool_maxsize=4))
+        _session.mount('http://', HTTPAdapter(pool_maxsize=4))
+    return _session
+
+def _schedule_dispatch():
+    # One dispatch per batch window no matter how many events arrive inside it
+    if cache.add(DISPATCH_SCHEDULED_KEY, True, app_settings.SHOPPING_CART_NOTIFY_BATCH_SECONDS):
+        from .tasks import dispatch_notifications
+        dispatch_notifications.apply_async(countdown=app_settings.SHOPPING_CART_NOTIFY_BATCH_SECONDS)
+
+def queue_notifications(event, item_requests):
+    """Write outbox rows for item_requests and schedule delivery after commit"""
+    if not app_settings.SHOPPING_CART_DISCORD_WEBHOOK_URL or not getattr(app_settings, EVENT_SETTINGS[event]):
+        return 0
+    rows = [
+        NotificationOutbox(event=event, request_id=item_request.id, payload={
+            'summary': str(item_request),
+            'pickup_location': item_request.pickup_location,
+            'delivery_location': item_request.delivery_location,
+        })
+        for item_request in item_requests
+    ]
+    NotificationOutbox.objects.bulk_create(rows)
+    transaction.on_commit(_schedule_dispatch)
+    return len(rows)
+
+def queue_notification(event, item_request):
+    return queue_notifications(event, [item_request])
+
+@receiver(request_status_changed)
+def queue_claimed_notification(sender, old_status, new_status, item_request=None, **kwargs):
+    if new_status == sender.STATUS_CLAIMED and old_status != new_status and item_request is not None:
+        queue_notification(NotificationOutbox.EVENT_CLAIMED, item_request)
+
+def build_embeds(events):
+    """Group outbox rows into at most one embed per event type chunk"""
+    by_event = {}
+    for outbox in events:
+        by_event.setdefault(outbox.event, []).append(outbox)
+    embeds = []
+    for event, rows in by_event.items():
+        for start in range(0, len(rows), MAX_EVENTS_PER_EMBED):
+            chunk = rows[start:start + MAX_EVENTS_PER_EMBED]
+            lines = [
+                f"**{row.payload.get('summary', f'#{row.request_id}')}** "
+                f"({row.payload.get('pickup_location', '?')} → {row.payload.get('delivery_location', '?')})"
+                for row in chunk
+            ]
+            embeds.append(({
+                'title': EVENT_TITLES.get(event, event),
+                'description': '\n'.join(lines)[:4096],
+                'color': EVENT_COLORS.get(event, 0),
+            }, [row.id for row in chunk]))
+    return embeds
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After')
+    if value is None:
+        try:
+            value = response.json().get('retry_after')
+        except ValueError:
+            value = None
+    try:
+        return max(float(value), 1.0)
+    except (TypeError, ValueError):
+        return 5.0
+
+def _claim_due(now):
+    """Lease due rows to this run, so overlapping dispatches never post them twice"""
+    with transaction.atomic():
+        due = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(sent_at__isnull=True, next_attempt_at__lte=now, attempts__lt=MAX_ATTEMPTS)
+            .order_by('id')[:MAX_EVENTS_PER_RUN]
+        )
+        if due:
+            NotificationOutbox.objects.filter(id__in=[row.id for row in due]).update(
+                next_attempt_at=now + timedelta(seconds=LEASE_SECONDS),
+            )
+    return due
+
+def send_pending_notifications(session=None):
+    """Post due outbox rows to the webhook. Returns seconds until the next run
+    is needed, or None when the outbox is drained"""
+    url = app_settings.SHOPPING_CART_DISCORD_WEBHOOK_URL
+    if not url:
+        return None
+    session = session or get_session()
+    now = timezone.now()
+    due = _claim_due(now)
+    embeds = build_embeds(due)
+    for start in range(0, len(embeds), MAX_EMBEDS_PER_MESSAGE):
+        message = embeds[start:start + MAX_EMBEDS_PER_MESSAGE]
+        ids = {row_id for _, row_ids in message for row_id in row_ids}
+        try:
+            response = session.post(url, json={'embeds': [embed for embed, _ in message]}, timeout=10)
+        except requests.RequestException:
+            logger.exception("Discord webhook request failed")
+            response = None
+        if response is not None and response.status_code == 429:
+            delay = _retry_after(response)
+            remaining = [row_id for _, row_ids in embeds[start:] for row_id in row_ids]
+            NotificationOutbox.objects.filter(id__in=remaining).update(next_attempt_at=now + timedelta(seconds=delay))
+            logger.info(f"Discord rate limited, retrying {len(remaining)} notifications in {delay}s")
+            return delay
+        if response is not None and response.ok:
+            NotificationOutbox.objects.filter(id__in=ids).update(sent_at=timezone.now())
+            continue
+        if response is not None:
+            logger.warning(f"Discord webhook returned {response.status_code}")
+        attempts = max(row.attempts for row in due if row.id in ids) + 1
+        NotificationOutbox.objects.filter(id__in=ids).update(
+            attempts=F('attempts') + 1,
+            next_attempt_at=now + timedelta(seconds=min(2 ** attempts * 5, MAX_BACKOFF_SECONDS)),
+        )
+
+    next_due = (
+        NotificationOutbox.objects
+        .filter(sent_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+        .order_by('next_attempt_at')
+        .values_list('next_attempt_at', flat=True)
+        .first()
+    )
+    if next_due is None:
+        return None
+    return max((next_due - timezone.now()).total_seconds(), 0)
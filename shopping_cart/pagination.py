@@ -0,0 +1,36 @@
+"""Keyset pagination over (created_at, id), newest first"""
+import base64
+from collections import namedtuple
+from datetime import datetime
+from django.db.models import Q
+from . import app_settings
+
+KeysetPage = namedtuple('KeysetPage', ['object_list', 'next_cursor', 'has_next'])
+
+def encode_cursor(obj):
+    raw = f"{obj.created_at.isoformat()}|{obj.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (created_at, id) for a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, obj_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(obj_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def keyset_paginate(queryset, cursor=None, page_size=None):
+    """Return the page of queryset that follows cursor, ordered by -created_at, -id"""
+    page_size = page_size or app_settings.SHOPPING_CART_PAGINATION_SIZE
+    queryset = queryset.order_by('-created_at', '-id')
+    position = decode_cursor(cursor)
+    if position:
+        created_at, obj_id = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=obj_id))
+    rows = list(queryset[:page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    return KeysetPage(rows, encode_cursor(rows[-1]) if has_next else None, has_next)
@@ -0,0 +1,199 @@
+"""Trip planning for fulfillers
+
+A fulfiller's claims are grouped by (pickup, delivery) hub route and packed
+into cargo-sized trips with a 0/1 knapsack over packaged volumes. Space left in
+a trip is offered to open marketplace requests on the same route, and the items
+still to be bought are combined into one shopping list per pickup hub. Volumes
+come from the appraisal precomputed by the price refresh, falling back to the
+SDE index, and finished plans are cached until a request involved changes.
+"""
+import hashlib
+import math
+from collections import namedtuple
+from django.core.cache import cache
+from .models import ItemRequest, RequestItem
+from .sde import get_type_index
+
+PLAN_CACHE_KEY = 'shopping_cart:plan:{}:{}'
+PLAN_CACHE_TIMEOUT = 60 * 10
+KNAPSACK_RESOLUTION = 500
+MARKETPLACE_LIMIT = 500
+
+PLAN_FIELDS = (
+    'id', 'user_id', 'status', 'request_type', 'pickup_location', 'delivery_location', 'pickup_hub', 'delivery_hub',
+    'requester_price', 'fulfiller_price', 'appraised_value', 'appraised_volume', 'updated_at',
+)
+
+Trip = namedtuple('Trip', ['requests', 'suggestions', 'volume', 'value'])
+Route = namedtuple('Route', ['pickup', 'delivery', 'trips', 'oversized', 'volume', 'value'])
+ShoppingItem = namedtuple('ShoppingItem', ['name', 'type_id', 'quantity', 'volume'])
+Plan = namedtuple('Plan', ['capacity', 'routes', 'shopping_lists', 'unknown_volume'])
+
+def knapsack(volumes, values, capacity, resolution=KNAPSACK_RESOLUTION):
+    """Return the indexes of the most valuable subset that fits capacity. Volumes
+    are rounded up to steps of capacity / resolution, so the subset always fits"""
+    if capacity <= 0:
+        return []
+    # Anything that fits gets at most the full grid, whatever float rounding says
+    weights = [
+        max(min(math.ceil(volume / capacity * resolution), resolution) if volume <= capacity else resolution + 1, 0)
+        for volume in volumes
+    ]
+    best = [0] * (resolution + 1)
+    taken = []
+    for weight, value in zip(weights, values):
+        if weight > resolution:
+            taken.append(None)
+            continue
+        # Whole-row list operations instead of a per-capacity Python loop
+        with_item = [previous + value for previous in best[:resolution + 1 - weight]]
+        taken.append(bytearray(weight) + bytearray(new > old for new, old in zip(with_item, best[weight:])))
+        best = best[:weight] + [max(new, old) for new, old in zip(with_item, best[weight:])]
+    chosen = []
+    remaining = resolution
+    for index in range(len(weights) - 1, -1, -1):
+        if taken[index] is not None and taken[index][remaining]:
+            chosen.append(index)
+            remaining -= weights[index]
+    return chosen[::-1]
+
+def pack_trips(requests, volumes, capacity):
+    """Split requests into trips of at most capacity, most valuable first.
+    Returns (trips, requests too large for any trip)"""
+    oversized = [item_request for item_request in requests if volumes[item_request.id] > capacity]
+    remaining = [item_request for item_request in requests if volumes[item_request.id] <= capacity]
+    trips = []
+    while remaining:
+        trip_volumes = [volumes[item_request.id] for item_request in remaining]
+        if sum(trip_volumes) <= capacity:
+            chosen = list(range(len(remaining)))
+        else:
+            # Every request counts for at least 1 ISK so unpriced ones still get packed
+            chosen = knapsack(trip_volumes, [item_request.isk_value + 1 for item_request in remaining], capacity)
+        if not chosen:
+            # Cannot happen for volumes <= capacity, but never loop on an empty trip
+            oversized.extend(remaining)
+            break
+        selected = [remaining[index] for index in chosen]
+        trips.append(Trip(
+            selected, [], sum(trip_volumes[index] for index in chosen), sum(item_request.isk_value for item_request in selected),
+        ))
+        chosen = set(chosen)
+        remaining = [item_request for index, item_request in enumerate(remaining) if index not in chosen]
+    return trips, oversized
+
+def fill_trips(trips, candidates, volumes, capacity):
+    """Offer the space left in each trip to candidates, each used at most once"""
+    available = [item_request for item_request in candidates if volumes.get(item_request.id) is not None]
+    for trip in trips:
+        free = capacity - trip.volume
+        fitting = [item_request for item_request in available if volumes[item_request.id] <= free]
+        if not fitting:
+            continue
+        chosen = knapsack(
+            [volumes[item_request.id] for item_request in fitting], [item_request.isk_value + 1 for item_request in fitting], free,
+        )
+        trip.suggestions.extend(fitting[index] for index in chosen)
+        used = {fitting[index].id for index in chosen}
+        available = [item_request for item_request in available if item_request.id not in used]
+
+def route_of(item_request):
+    return (item_request.pickup_hub or item_request.pickup_location, item_request.delivery_hub or item_request.delivery_location)
+
+def _request_volumes(item_requests, items_by_request):
+    """Packaged volume per request id, None where it cannot be worked out"""
+    type_index = get_type_index()
+    volumes = {}
+    for item_request in item_requests:
+        if item_request.appraised_volume is not None:
+            volumes[item_request.id] = item_request.appraised_volume
+            continue
+        volume = 0.0
+        for type_id, _, quantity in items_by_request.get(item_request.id, []):
+            type_info = type_index.get_by_type_id(type_id) if type_index is not None and type_id is not None else None
+            if type_info is None:
+                volume = None
+                break
+            volume += type_info.volume * quantity
+        volumes[item_request.id] = volume
+    return volumes
+
+def shopping_lists(item_requests, items_by_request):
+    """Combine the items of requests the fulfiller still has to buy into one list per pickup hub"""
+    type_index = get_type_index()
+    lists = {}
+    for item_request in item_requests:
+        if item_request.request_type != ItemRequest.REQUEST_TYPE_FULFILLER_BUYS or item_request.status != ItemRequest.STATUS_CLAIMED:
+            continue
+        totals = lists.setdefault(route_of(item_request)[0], {})
+        for type_id, name, quantity in items_by_request.get(item_request.id, []):
+            key = type_id if type_id is not None else name.lower()
+            if key in totals:
+                totals[key][2] += quantity
+            else:
+                totals[key] = [name, type_id, quantity]
+    result = {}
+    for hub, totals in sorted(lists.items()):
+        entries = []
+        for name, type_id, quantity in totals.values():
+            type_info = type_index.get_by_type_id(type_id) if type_index is not None and type_id is not None else None
+            entries.append(ShoppingItem(name, type_id, quantity, type_info.volume * quantity if type_info else None))
+        result[hub] = sorted(entries, key=lambda entry: entry.name.lower())
+    return result
+
+def _fingerprint(capacity, claims, candidates):
+    raw = f"{capacity}|" + ';'.join(
+        f"{item_request.id}:{item_request.updated_at.isoformat()}" for item_request in claims + candidates
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+def build_plan(claims, candidates, capacity):
+    # Items are needed for the shopping lists and wherever no appraised volume exists yet
+    needs_items = [
+        item_request.id for item_request in claims
+        if item_request.appraised_volume is None or item_request.request_type == ItemRequest.REQUEST_TYPE_FULFILLER_BUYS
+    ] + [item_request.id for item_request in candidates if item_request.appraised_volume is None]
+    items_by_request = {}
+    if needs_items:
+        for request_id, type_id, name, quantity in RequestItem.objects.filter(
+            request_id__in=needs_items,
+        ).values_list('request_id', 'type_id', 'name', 'quantity'):
+            items_by_request.setdefault(request_id, []).append((type_id, name, quantity))
+    volumes = _request_volumes(claims + candidates, items_by_request)
+    unknown_volume = [item_request for item_request in claims if volumes[item_request.id] is None]
+    claim_volumes = {request_id: volume or 0.0 for request_id, volume in volumes.items()}
+
+    claims_by_route = {}
+    for item_request in claims:
+        claims_by_route.setdefault(route_of(item_request), []).append(item_request)
+    candidates_by_route = {}
+    for item_request in candidates:
+        candidates_by_route.setdefault(route_of(item_request), []).append(item_request)
+
+    routes = []
+    for (pickup, delivery), route_claims in claims_by_route.items():
+        trips, oversized = pack_trips(route_claims, claim_volumes, capacity)
+        fill_trips(trips, candidates_by_route.get((pickup, delivery), []), volumes, capacity)
+        routes.append(Route(
+            pickup, delivery, trips, oversized,
+            sum(claim_volumes[item_request.id] for item_request in route_claims),
+            sum(item_request.isk_value for item_request in route_claims),
+        ))
+    routes.sort(key=lambda route: (-route.value, route.pickup, route.delivery))
+    return Plan(capacity, routes, shopping_lists(claims, items_by_request), unknown_volume)
+
+def plan_trips(user, capacity):
+    """Plan user's claims, with marketplace requests on the same routes as fillers"""
+    claims = list(ItemRequest.objects.user_claims(user).only(*PLAN_FIELDS).order_by('id'))
+    routes = {route_of(item_request) for item_request in claims}
+    candidates = [
+        item_request for item_request in
+        ItemRequest.objects.claimable_for_user(user).only(*PLAN_FIELDS).order_by('-created_at', '-id')[:MARKETPLACE_LIMIT]
+        if route_of(item_request) in routes
+    ] if routes else []
+    key = PLAN_CACHE_KEY.format(user.id, _fingerprint(capacity, claims, candidates))
+    plan = cache.get(key)
+    if plan is None:
+        plan = build_plan(claims, candidates, capacity)
+        cache.set(key, plan, PLAN_CACHE_TIMEOUT)
+    return plan
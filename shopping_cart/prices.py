@@ -0,0 +1,157 @@
+"""Hub market prices and request appraisals"""
+import json
+import logging
+import requests
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from . import app_settings
+from .constants import TRADE_HUB_STATION_IDS
+from .helpers import trade_hub_for
+from .models import ItemRequest, MarketPrice, RequestItem
+from .sde import get_type_index
+
+logger = logging.getLogger(__name__)
+
+PRICE_CACHE_KEY = 'shopping_cart:price:{}:{}'
+PROVIDER_BATCH_SIZE = 200
+
+class FuzzworkPriceProvider:
+    """Aggregated station prices from market.fuzzwork.co.uk"""
+    url = 'https://market.fuzzwork.co.uk/aggregates/'
+
+    def __init__(self):
+        self.session = requests.Session()
+
+    def get_prices(self, hub, type_ids):
+        response = self.session.get(self.url, params={
+            'station': TRADE_HUB_STATION_IDS[hub],
+            'types': ','.join(str(type_id) for type_id in type_ids),
+        }, timeout=30)
+        response.raise_for_status()
+        return {
+            int(type_id): (float(data['buy']['max']), float(data['sell']['min']))
+            for type_id, data in response.json().items()
+        }
+
+class FixturePriceProvider:
+    """Prices from a local JSON file shaped {hub: {type_id: {"buy": x, "sell": y}}}"""
+
+    def __init__(self, path=None):
+        with open(path or app_settings.SHOPPING_CART_PRICE_FIXTURE_PATH, encoding='utf-8') as f:
+            self.prices = json.load(f)
+
+    def get_prices(self, hub, type_ids):
+        hub_prices = self.prices.get(hub, {})
+        return {
+            type_id: (float(hub_prices[str(type_id)]['buy']), float(hub_prices[str(type_id)]['sell']))
+            for type_id in type_ids if str(type_id) in hub_prices
+        }
+
+def get_price_provider():
+    return import_string(app_settings.SHOPPING_CART_PRICE_PROVIDER)()
+
+def pricing_hub_for(location):
+    """The configured hub to price a location at, falling back to the first one"""
+    hubs = app_settings.SHOPPING_CART_DEFAULT_HUBS
+    return trade_hub_for(location, hubs) or (hubs[0] if hubs else None)
+
+def _tracked_type_ids():
+    requested = RequestItem.objects.filter(
+        type_id__isnull=False, request__in=ItemRequest.objects.active(),
+    ).values_list('type_id', flat=True).distinct()
+    known = MarketPrice.objects.values_list('type_id', flat=True).distinct()
+    return sorted(set(requested) | set(known))
+
+def refresh_prices(provider=None, type_ids=None):
+    """Fetch prices for every configured hub and upsert them. Returns the number of rows written"""
+    provider = provider or get_price_provider()
+    type_ids = list(type_ids) if type_ids is not None else _tracked_type_ids()
+    written = 0
+    for hub in app_settings.SHOPPING_CART_DEFAULT_HUBS:
+        if hub not in TRADE_HUB_STATION_IDS:
+            logger.warning(f"No station known for hub {hub}, skipping price refresh")
+            continue
+        for start in range(0, len(type_ids), PROVIDER_BATCH_SIZE):
+            batch = type_ids[start:start + PROVIDER_BATCH_SIZE]
+            try:
+                prices = provider.get_prices(hub, batch)
+            except Exception:
+                logger.exception(f"Failed to fetch {hub} prices")
+                continue
+            rows = [MarketPrice(type_id=type_id, hub=hub, buy=buy, sell=sell) for type_id, (buy, sell) in prices.items()]
+            MarketPrice.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['hub', 'type_id'], update_fields=['buy', 'sell', 'updated_at'],
+            )
+            cache.set_many(
+                {PRICE_CACHE_KEY.format(hub, row.type_id): (row.buy, row.sell) for row in rows},
+                app_settings.SHOPPING_CART_PRICE_CACHE_TIMEOUT,
+            )
+            written += len(rows)
+    logger.info(f"Refreshed {written} market prices for {len(type_ids)} types")
+    return written
+
+def get_prices(hub, type_ids):
+    """Return {type_id: (buy, sell)} from the cache, falling back to one DB query for misses"""
+    type_ids = set(type_ids)
+    keys = {PRICE_CACHE_KEY.format(hub, type_id): type_id for type_id in type_ids}
+    prices = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+    missing = type_ids - prices.keys()
+    if missing:
+        from_db = {
+            type_id: (buy, sell)
+            for type_id, buy, sell in MarketPrice.objects.filter(hub=hub, type_id__in=missing).values_list('type_id', 'buy', 'sell')
+        }
+        cache.set_many(
+            {PRICE_CACHE_KEY.format(hub, type_id): value for type_id, value in from_db.items()},
+            app_settings.SHOPPING_CART_PRICE_CACHE_TIMEOUT,
+        )
+        prices.update(from_db)
+    return prices
+
+def appraise_requests(item_requests):
+    """Compute appraised_value/appraised_volume for item_requests with one item
+    query and one price lookup per hub, then save the ones whose appraisal changed.
+    The requests must have their current appraised_* fields loaded"""
+    item_requests = list(item_requests)
+    if not item_requests:
+        return []
+    items_by_request = {}
+    for request_id, type_id, quantity in RequestItem.objects.filter(
+        request__in=item_requests, type_id__isnull=False,
+    ).values_list('request_id', 'type_id', 'quantity'):
+        items_by_request.setdefault(request_id, []).append((type_id, quantity))
+
+    hubs = {item_request.id: pricing_hub_for(item_request.pickup_location) for item_request in item_requests}
+    type_ids_by_hub = {}
+    for request_id, items in items_by_request.items():
+        type_ids_by_hub.setdefault(hubs[request_id], set()).update(type_id for type_id, _ in items)
+    prices_by_hub = {hub: get_prices(hub, type_ids) for hub, type_ids in type_ids_by_hub.items()}
+
+    type_index = get_type_index()
+    now = timezone.now()
+    changed = []
+    for item_request in item_requests:
+        items = items_by_request.get(item_request.id, [])
+        prices = prices_by_hub.get(hubs[item_request.id], {})
+        priced = [(type_id, quantity) for type_id, quantity in items if type_id in prices]
+        value = int(sum(quantity * prices[type_id][1] for type_id, quantity in priced)) if priced else None
+        volume = item_request.appraised_volume
+        if type_index is not None:
+            volume = 0.0
+            for type_id, quantity in items:
+                type_info = type_index.get_by_type_id(type_id)
+                if type_info:
+                    volume += type_info.volume * quantity
+        if item_request.appraised_at is not None and (value, volume) == (item_request.appraised_value, item_request.appraised_volume):
+            continue
+        item_request.appraised_value = value
+        item_request.appraised_volume = volume
+        item_request.appraised_at = now
+        # The value shows in cached fragments, list ETags and trip plans, which
+        # follow updated_at, so only requests whose appraisal moved are touched
+        item_request.updated_at = now
+        changed.append(item_request)
+    if changed:
+        ItemRequest.objects.bulk_update(changed, ['appraised_value', 'appraised_volume', 'appraised_at', 'updated_at'], batch_size=500)
+    return item_requests
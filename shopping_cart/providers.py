@@ -0,0 +1,75 @@
+import logging
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CONTRACTS_SCOPE = 'esi-contracts.read_character_contracts.v1'
+
+ContractsResponse = namedtuple('ContractsResponse', ['contracts', 'etag', 'expires', 'not_modified'])
+
+_esi = None
+
+def get_esi():
+    global _esi
+    if _esi is None:
+        from esi.clients import EsiClientProvider
+        _esi = EsiClientProvider(app_info_text='allianceauth-shopping-cart')
+    return _esi
+
+def _parse_expires(headers):
+    value = headers.get('Expires')
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+class EsiContractClient:
+    """Fetches a character's contracts from ESI, honoring ETag/Expires"""
+
+    def get_token(self, character_id):
+        from esi.models import Token
+        return Token.objects.filter(character_id=character_id).require_scopes(CONTRACTS_SCOPE).require_valid().first()
+
+    def get_character_contracts(self, character_id, etag=None):
+        from bravado.exception import HTTPNotModified
+        token = self.get_token(character_id)
+        if token is None:
+            logger.warning(f"No valid contracts token for character {character_id}")
+            return None
+        access_token = token.valid_access_token()
+        contracts = []
+        first_etag = None
+        expires = None
+        page = 1
+        pages = 1
+        while page <= pages:
+            operation = get_esi().client.Contracts.get_characters_character_id_contracts(
+                character_id=character_id, token=access_token, page=page,
+            )
+            operation.request_config.also_return_response = True
+            if page == 1 and etag:
+                operation.future.request.headers['If-None-Match'] = etag
+            try:
+                result, response = operation.result()
+            except HTTPNotModified as ex:
+                return ContractsResponse(None, etag, _parse_expires(ex.response.headers), True)
+            if page == 1:
+                first_etag = response.headers.get('ETag')
+                expires = _parse_expires(response.headers)
+                pages = int(response.headers.get('X-Pages', 1))
+            contracts.extend(result)
+            page += 1
+        return ContractsResponse(contracts, first_etag, expires or timezone.now(), False)
+    
+    def get_contract_items(self, character_id, contract_id):
+        token = self.get_token(character_id)
+        if token is None:
+            logger.warning(f"No valid contracts token for character {character_id}")
+            return None
+        return get_esi().client.Contracts.get_characters_character_id_contracts_contract_id_items(
+            character_id=character_id, contract_id=contract_id, token=token.valid_access_token(),
+        ).result()
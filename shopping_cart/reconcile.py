@@ -0,0 +1,185 @@
+"""Link claimed requests to the ESI contracts made for them
+
+Claimed requests without a contract are indexed on (issuer, assignee, hub,
+price), so each ESI contract costs one dict lookup instead of a comparison with
+every request. Contract items are only fetched for contracts that already match
+on all of those, and are then compared with the request by item content hash.
+A request or contract with more than one plausible partner is left to be linked
+by hand.
+"""
+import logging
+from collections import namedtuple
+from datetime import datetime
+from django.core.cache import cache
+from django.db import transaction
+from .constants import TRADE_HUB_STATION_IDS
+from .contracts import get_character_contracts
+from .helpers import item_content_hash
+from .models import ItemRequest, RequestItem
+from .providers import EsiContractClient
+
+logger = logging.getLogger(__name__)
+
+CONTRACT_ITEMS_CACHE_KEY = 'shopping_cart:esi_contract_items:{}'
+CONTRACT_ITEMS_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+CANDIDATE_STATUSES = ('outstanding', 'in_progress', 'finished', 'finished_issuer', 'finished_contractee')
+
+HUBS_BY_STATION = {station: hub for hub, station in TRADE_HUB_STATION_IDS.items()}
+
+Match = namedtuple('Match', ['item_request', 'contract', 'issuer', 'character'])
+
+def expected_contract(item_request):
+    """Return (contract_issuer, issuing character, assignee character, hub) for item_request.
+    Requesters hand their items over at pickup, fulfillers deliver what they bought"""
+    if item_request.request_type == ItemRequest.REQUEST_TYPE_REQUESTER_HAS_ITEMS:
+        return ItemRequest.CONTRACT_ISSUER_REQUESTER, item_request.character, item_request.fulfiller_character, item_request.pickup_hub
+    return ItemRequest.CONTRACT_ISSUER_FULFILLER, item_request.fulfiller_character, item_request.character, item_request.delivery_hub
+
+def contract_amount(contract):
+    amount = contract.get('reward') if contract.get('type') == 'courier' else contract.get('price')
+    return int(round(amount or 0))
+
+def contract_key(contract):
+    return (
+        contract.get('issuer_id'), contract.get('assignee_id'),
+        HUBS_BY_STATION.get(contract.get('start_location_id'), ''), contract_amount(contract),
+    )
+
+def build_index(item_requests):
+    index = {}
+    for item_request in item_requests:
+        _, issuer, assignee, hub = expected_contract(item_request)
+        for amount in {item_request.fulfiller_price, item_request.requester_price} - {None}:
+            index.setdefault((issuer.character_id, assignee.character_id, hub, amount), []).append(item_request)
+    return index
+
+def _parse_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value
+
+def _issued_after_claim(item_request, contract):
+    issued = _parse_datetime(contract.get('date_issued'))
+    return issued is None or item_request.claimed_at is None or issued >= item_request.claimed_at
+
+def match_contracts(item_requests, contracts, request_items, contract_items):
+    """Pair item_requests with contracts. request_items maps request ids to
+    (type_id, quantity) pairs and contract_items(contract) returns a contract's
+    ESI items, or None if they cannot be fetched. Requests with items that never
+    resolved to a type are matched without the content check"""
+    index = build_index(item_requests)
+    request_hashes = {
+        request_id: item_content_hash(items)
+        for request_id, items in request_items.items()
+        if all(type_id is not None for type_id, _ in items)
+    }
+    candidates_by_contract = []
+    claims = {}
+    for contract in contracts:
+        if contract.get('status') not in CANDIDATE_STATUSES:
+            continue
+        candidates = [
+            item_request for item_request in index.get(contract_key(contract), [])
+            if _issued_after_claim(item_request, contract)
+        ]
+        if candidates and contract.get('type') != 'courier':
+            items = contract_items(contract)
+            if items is None:
+                continue
+            contract_hash = item_content_hash(
+                (item['type_id'], item['quantity']) for item in items if item.get('is_included', True)
+            )
+            candidates = [
+                item_request for item_request in candidates
+                if request_hashes.get(item_request.id, contract_hash) == contract_hash
+            ]
+        for item_request in candidates:
+            claims[item_request.id] = claims.get(item_request.id, 0) + 1
+        if candidates:
+            candidates_by_contract.append((contract, candidates))
+
+    matches = []
+    for contract, candidates in candidates_by_contract:
+        if len(candidates) == 1 and claims[candidates[0].id] == 1:
+            issuer, character, _, _ = expected_contract(candidates[0])
+            matches.append(Match(candidates[0], contract, issuer, character))
+        else:
+            logger.info(
+                f"Contract {contract['contract_id']} matches requests "
+                f"{', '.join(str(item_request.id) for item_request in candidates)} ambiguously, leaving it unlinked"
+            )
+    return matches
+
+def apply_matches(matches):
+    """Record every match in one transaction. Requests that left the claimed
+    state in the meantime are skipped. Returns the matches applied"""
+    applied = []
+    with transaction.atomic():
+        for match in matches:
+            try:
+                match.item_request.set_contract_created(match.contract['contract_id'], match.issuer, monitor_character=match.character)
+            except ValueError:
+                logger.info(f"Request {match.item_request.id} is no longer claimed, not linking contract {match.contract['contract_id']}")
+                continue
+            applied.append(match)
+    return applied
+
+def get_contract_items(client, character_id, contract_id):
+    """Return a contract's items, cached for long since they never change"""
+    key = CONTRACT_ITEMS_CACHE_KEY.format(contract_id)
+    items = cache.get(key)
+    if items is None:
+        try:
+            items = client.get_contract_items(character_id, contract_id)
+        except Exception:
+            logger.exception(f"Failed to fetch items of contract {contract_id}")
+            return None
+        if items is None:
+            return None
+        items = [
+            {'type_id': item['type_id'], 'quantity': item['quantity'], 'is_included': item.get('is_included', True)}
+            for item in items
+        ]
+        cache.set(key, items, CONTRACT_ITEMS_CACHE_TIMEOUT)
+    return items
+
+def reconcile_claimed_requests(client=None):
+    """Link claimed requests to matching contracts of their issuing characters.
+    Returns the number of requests linked"""
+    client = client or EsiContractClient()
+    item_requests = list(
+        ItemRequest.objects
+        .filter(status=ItemRequest.STATUS_CLAIMED, contract_id__isnull=True, fulfiller_character__isnull=False)
+        .select_related('character', 'fulfiller_character')
+    )
+    if not item_requests:
+        return 0
+    request_items = {}
+    for request_id, type_id, quantity in RequestItem.objects.filter(
+        request__in=item_requests,
+    ).values_list('request_id', 'type_id', 'quantity'):
+        request_items.setdefault(request_id, []).append((type_id, quantity))
+
+    # A contract shows up for both parties, the issuer's list is enough
+    seen_by = {}
+    for character_id in {expected_contract(item_request)[1].character_id for item_request in item_requests}:
+        try:
+            contracts = get_character_contracts(client, character_id)
+        except Exception:
+            logger.exception(f"Failed to fetch contracts for character {character_id}")
+            continue
+        for contract_id in contracts:
+            seen_by.setdefault(contract_id, (character_id, contracts[contract_id]))
+    linked = set(
+        ItemRequest.objects.filter(contract_id__in=list(seen_by)).values_list('contract_id', flat=True)
+    ) if seen_by else set()
+    contracts = [contract for contract_id, (_, contract) in seen_by.items() if contract_id not in linked]
+
+    matches = match_contracts(
+        item_requests, contracts, request_items,
+        lambda contract: get_contract_items(client, seen_by[contract['contract_id']][0], contract['contract_id']),
+    )
+    applied = apply_matches(matches)
+    logger.info(f"Contract reconciliation: {len(contracts)} unlinked contracts, {len(applied)} requests linked")
+    return len(applied)
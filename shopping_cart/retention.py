@@ -0,0 +1,129 @@
+"""Batched retention, archiving and expiry of old requests"""
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from . import app_settings
+from .models import ArchivedRequest, ItemRequest, RequestCounter, RequestItem, StatusTransition
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUSES = (ItemRequest.STATUS_COMPLETED, ItemRequest.STATUS_CANCELLED, ItemRequest.STATUS_EXPIRED)
+
+def _in_batches(queryset, batch_size, action, *extra):
+    """Call action with lists of (id, user_id, status, *extra) in primary key order,
+    each batch locked and handled in its own transaction. Every batch is re-read
+    through queryset, so rows already handled by an interrupted run simply no
+    longer match and a restart picks up where it stopped. Returns the number of rows"""
+    last_id = 0
+    total = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                queryset.select_for_update().filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'user_id', 'status', *extra)[:batch_size]
+            )
+            if not rows:
+                return total
+            action(rows)
+        total += len(rows)
+        last_id = rows[-1][0]
+
+def _deltas(rows, sign):
+    deltas = {}
+    for _, user_id, status in rows:
+        deltas[(user_id, status)] = deltas.get((user_id, status), 0) + sign
+    return deltas
+
+def cleanup_old_requests(days=None, batch_size=None):
+    """Delete closed requests, live or archived, created more than days ago. Returns the number deleted"""
+    days = days if days is not None else app_settings.SHOPPING_CART_FULFILLED_RETENTION_DAYS
+    batch_size = batch_size or app_settings.SHOPPING_CART_RETENTION_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=days)
+    total = 0
+    for model in (ItemRequest, ArchivedRequest):
+        def delete(rows, model=model):
+            ids = [row[0] for row in rows]
+            model.objects.filter(id__in=ids).delete()
+            StatusTransition.objects.filter(request_id__in=ids).delete()
+            RequestCounter.objects.apply(_deltas(rows, -1))
+            logger.info(f"Deleted {len(rows)} closed {model._meta.verbose_name_plural} up to #{rows[-1][0]}")
+        
+        queryset = model.objects.filter(status__in=CLOSED_STATUSES, created_at__lt=cutoff)
+        total += _in_batches(queryset, batch_size, delete)
+    logger.info(f"Retention cleanup deleted {total} requests older than {days} days")
+    return total
+
+def expire_abandoned_requests(days=None, batch_size=None):
+    """Mark pending requests created more than days ago as expired. Returns the number expired"""
+    days = days if days is not None else app_settings.SHOPPING_CART_ABANDONED_CART_DAYS
+    batch_size = batch_size or app_settings.SHOPPING_CART_RETENTION_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=days)
+    queryset = ItemRequest.objects.filter(status=ItemRequest.STATUS_PENDING, created_at__lt=cutoff)
+    expired = ItemRequest.STATUS_EXPIRED
+    
+    def expire(rows):
+        # The batch is locked, so one UPDATE can bump every row's version safely
+        ItemRequest.objects.filter(id__in=[row[0] for row in rows]).update(
+            status=expired, version=F('version') + 1, updated_at=timezone.now(),
+        )
+        StatusTransition.objects.record(
+            (request_id, user_id, status, expired, version + 1, None) for request_id, user_id, status, version in rows
+        )
+        logger.info(f"Expired {len(rows)} abandoned requests up to #{rows[-1][0]}")
+    
+    total = _in_batches(queryset, batch_size, expire, 'version')
+    logger.info(f"Expired {total} requests pending for more than {days} days")
+    return total
+
+def _full_precision(values):
+    # DjangoJSONEncoder drops microseconds, which keyset cursors and ordering rely on
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in values.items()}
+
+def archive_closed_requests(days=None, batch_size=None):
+    """Move closed requests created (and completed) more than days ago into
+    ArchivedRequest. Returns the number archived"""
+    days = days if days is not None else app_settings.SHOPPING_CART_ARCHIVE_AFTER_DAYS
+    batch_size = batch_size or app_settings.SHOPPING_CART_RETENTION_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=days)
+    queryset = ItemRequest.objects.filter(status__in=CLOSED_STATUSES, created_at__lt=cutoff).filter(
+        Q(contract_completed_at__isnull=True) | Q(contract_completed_at__lt=cutoff),
+    )
+    
+    def archive(rows):
+        ids = [row[0] for row in rows]
+        items = {}
+        for request_id, type_id, name, quantity in RequestItem.objects.filter(request_id__in=ids).order_by('id').values_list(
+            'request_id', 'type_id', 'name', 'quantity',
+        ):
+            items.setdefault(request_id, []).append({'type_id': type_id, 'name': name, 'quantity': quantity})
+        ArchivedRequest.objects.bulk_create([
+            ArchivedRequest(
+                id=values['id'], user_id=values['user_id'], status=values['status'], created_at=values['created_at'],
+                data={'request': _full_precision(values), 'items': items.get(values['id'], [])},
+            )
+            for values in ItemRequest.objects.filter(id__in=ids).values()
+        ])
+        ItemRequest.objects.filter(id__in=ids).delete()
+        logger.info(f"Archived {len(rows)} closed requests up to #{rows[-1][0]}")
+    
+    total = _in_batches(queryset, batch_size, archive)
+    logger.info(f"Archived {total} requests closed more than {days} days ago")
+    return total
+
+def export_archive(path, since=None):
+    """Stream archived requests to gzip compressed JSON lines. Returns the number written"""
+    queryset = ArchivedRequest.objects.order_by('id')
+    if since is not None:
+        queryset = queryset.filter(archived_at__gte=since)
+    written = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for archived in queryset.iterator(chunk_size=1000):
+            f.write(json.dumps(archived.data, cls=DjangoJSONEncoder, separators=(',', ':')))
+            f.write('\n')
+            written += 1
+    return written
@@ -0,0 +1,155 @@
+"""Offline EVE type lookups backed by a compact index built from the SDE"""
+import bz2
+import csv
+import gzip
+import io
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from collections import namedtuple
+from . import app_settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b'SCSDE1\0\0'
+HEADER = struct.Struct('<8sI4x')
+
+TypeInfo = namedtuple('TypeInfo', ['type_id', 'name', 'volume', 'market_group_id'])
+
+def _open_text(path):
+    if path.endswith('.bz2'):
+        return io.TextIOWrapper(bz2.open(path), encoding='utf-8', newline='')
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path), encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def read_sde_volumes(path):
+    """Read packaged volumes from an invVolumes-style CSV (typeID, volume)"""
+    with _open_text(path) as f:
+        return {int(row['typeID']): _to_float(row['volume']) for row in csv.DictReader(f)}
+
+def read_sde_types(path, packaged_volumes=None):
+    """Yield TypeInfo rows from an invTypes-style CSV, skipping unpublished types"""
+    packaged_volumes = packaged_volumes or {}
+    with _open_text(path) as f:
+        for row in csv.DictReader(f):
+            if row.get('published', '1') not in ('1', 'True', 'true'):
+                continue
+            name = (row.get('typeName') or '').strip()
+            if not name:
+                continue
+            type_id = int(row['typeID'])
+            volume = packaged_volumes.get(type_id)
+            if volume is None:
+                volume = _to_float(row.get('packagedVolume') or row.get('volume'))
+            yield TypeInfo(type_id, name, volume, _to_int(row.get('marketGroupID')))
+
+class TypeIndex:
+    """Array-backed type table with O(1) lookups by name, lower-cased name and type_id"""
+
+    def __init__(self, type_ids, volumes, market_group_ids, names):
+        self.type_ids = type_ids
+        self.volumes = volumes
+        self.market_group_ids = market_group_ids
+        self.names = names
+        self._by_name = {}
+        self._by_type_id = {}
+        for position, name in enumerate(names):
+            self._by_name.setdefault(name.lower(), position)
+            self._by_type_id.setdefault(type_ids[position], position)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _info(self, position):
+        return TypeInfo(self.type_ids[position], self.names[position], self.volumes[position], self.market_group_ids[position])
+
+    def get(self, name, case_sensitive=False):
+        position = self._by_name.get(name.strip().lower())
+        if position is None or (case_sensitive and self.names[position] != name.strip()):
+            return None
+        return self._info(position)
+
+    def get_by_type_id(self, type_id):
+        position = self._by_type_id.get(type_id)
+        return None if position is None else self._info(position)
+
+    @classmethod
+    def from_rows(cls, rows):
+        type_ids, volumes, market_group_ids, names = array('l'), array('d'), array('l'), []
+        for row in rows:
+            type_ids.append(row.type_id)
+            volumes.append(row.volume)
+            market_group_ids.append(row.market_group_id)
+            names.append(row.name)
+        return cls(type_ids, volumes, market_group_ids, names)
+
+    def write(self, path):
+        """Write the index as fixed-width columns followed by a newline separated name blob"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(INDEX_MAGIC, len(self)))
+            f.write(array('q', self.type_ids).tobytes())
+            f.write(array('d', self.volumes).tobytes())
+            f.write(array('q', self.market_group_ids).tobytes())
+            f.write('\n'.join(self.names).encode('utf-8'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(buffer, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a shopping cart SDE index")
+        view = memoryview(buffer)
+        offset = HEADER.size
+        columns = []
+        for code in ('q', 'd', 'q'):
+            end = offset + count * 8
+            columns.append(view[offset:end].cast(code))
+            offset = end
+        names = bytes(view[offset:]).decode('utf-8').split('\n') if count else []
+        return cls(columns[0], columns[1], columns[2], names)
+
+_type_index = None
+_type_index_loaded = False
+_type_index_lock = threading.Lock()
+
+def get_type_index():
+    """Return the process-wide TypeIndex, loading it on first use. None when not configured"""
+    global _type_index, _type_index_loaded
+    if not _type_index_loaded:
+        with _type_index_lock:
+            if not _type_index_loaded:
+                path = app_settings.SHOPPING_CART_SDE_INDEX_PATH
+                if path and os.path.exists(path):
+                    try:
+                        _type_index = TypeIndex.load(path)
+                    except (OSError, ValueError):
+                        logger.exception(f"Failed to load SDE index from {path}")
+                elif path:
+                    logger.warning(f"SDE index {path} does not exist, type resolution disabled")
+                _type_index_loaded = True
+    return _type_index
+
+def reset_type_index():
+    global _type_index, _type_index_loaded
+    with _type_index_lock:
+        _type_index = None
+        _type_index_loaded = False
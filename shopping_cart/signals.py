@@ -0,0 +1,9 @@
+"""Signals sent by Shopping Cart"""
+from django.dispatch import Signal
+
+# Sent once per request whose status changed, including creation (old_status is
+# None then), inside the transaction that made the change. Arguments:
+# request_id, user_id, old_status, new_status, version (the row version after
+# the change) and item_request, the updated instance, or None for bulk changes
+# that never load one
+request_status_changed = Signal()
@@ -1,7 +1,7 @@
 // Shopping Cart JavaScript
 document.addEventListener('DOMContentLoaded', function() {
     console.log('Shopping Cart JS loaded');
-    
+
     // Add any interactive functionality here
     const requestForms = document.querySelectorAll('.request-form');
     requestForms.forEach(function(form) {
@@ -9,4 +9,101 @@ document.addEventListener('DOMContentLoaded', function() {
             // Add form validation or processing here
         });
     });
+
+    document.querySelectorAll('[data-shopping-cart-refresh]').forEach(startRefresh);
 });
+
+const REFRESH_INTERVAL = 30000;
+
+// Rows come pre-rendered by the server (?include=html), from the same
+// template and fragment cache as the initial page
+function renderRow(item) {
+    const template = document.createElement('template');
+    template.innerHTML = item.html.trim();
+    return template.content.firstElementChild;
+}
+
+// Patch the table body to match results: only new or changed rows are rebuilt,
+// rows that left the list are removed and the server's order is kept
+function applyResults(tbody, results) {
+    const existing = new Map();
+    tbody.querySelectorAll('tr[data-request-id]').forEach(function(row) {
+        existing.set(row.dataset.requestId, row);
+    });
+    let previous = null;
+    results.forEach(function(item) {
+        let row = existing.get(String(item.id));
+        existing.delete(String(item.id));
+        if (!row || row.dataset.updatedAt !== item.updated_at) {
+            const fresh = renderRow(item);
+            if (row) {
+                row.replaceWith(fresh);
+            }
+            row = fresh;
+        }
+        const expected = previous ? previous.nextSibling : tbody.firstChild;
+        if (row !== expected) {
+            tbody.insertBefore(row, expected);
+        }
+        previous = row;
+    });
+    existing.forEach(function(row) {
+        row.remove();
+    });
+}
+
+function startRefresh(table) {
+    const url = new URL(table.dataset.shoppingCartRefresh, window.location.href);
+    new URLSearchParams(window.location.search).forEach(function(value, key) {
+        url.searchParams.append(key, value);
+    });
+    url.searchParams.set('include', 'html');
+    const tbody = table.tBodies[0];
+    let etag = null;
+
+    function refresh() {
+        if (document.hidden) {
+            return;
+        }
+        const headers = {'Accept': 'application/json'};
+        if (etag) {
+            headers['If-None-Match'] = etag;
+        }
+        fetch(url, {headers: headers, credentials: 'same-origin', cache: 'no-store'})
+            .then(function(response) {
+                // 304 means nothing changed since the last poll
+                if (response.status !== 200) {
+                    return null;
+                }
+                etag = response.headers.get('ETag');
+                return response.json();
+            })
+            .then(function(data) {
+                if (data) {
+                    applyResults(tbody, data.results);
+                }
+            })
+            .catch(function(error) {
+                console.warn('Shopping Cart refresh failed', error);
+            });
+    }
+
+    setInterval(refresh, REFRESH_INTERVAL);
+
+    // With a live feed, refresh as soon as a request enters or leaves the list.
+    // The conditional GET keeps this cheap and the timer remains as a fallback
+    if (table.dataset.shoppingCartLive && window.EventSource) {
+        const source = new EventSource(table.dataset.shoppingCartLive);
+        let pending = null;
+        const schedule = function() {
+            if (!pending) {
+                pending = setTimeout(function() {
+                    pending = null;
+                    refresh();
+                }, 500);
+            }
+        };
+        source.addEventListener('new', schedule);
+        source.addEventListener('removed', schedule);
+    }
+}
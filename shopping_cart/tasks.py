@@ -1,12 +1,57 @@
 import logging
 from celery import shared_task
+from . import retention
+from .contracts import sweep_active_contracts
+from .leaderboard import refresh_leaderboards as _refresh_leaderboards
+from .models import ItemRequest
+from .notifications import send_pending_notifications
+from .prices import appraise_requests, refresh_prices
+from .reconcile import reconcile_claimed_requests
 
 logger = logging.getLogger(__name__)
 
 @shared_task
-def notify_new_request(request_id):
-    logger.info(f"New request notification: {request_id}")
+def dispatch_notifications():
+    delay = send_pending_notifications()
+    if delay is not None:
+        dispatch_notifications.apply_async(countdown=delay)
 
 @shared_task
 def monitor_contract_status(request_id):
     logger.info(f"Monitoring contract for request: {request_id}")
+
+@shared_task
+def monitor_all_active_contracts():
+    # Link new contracts first so they are swept in the same run
+    reconcile_claimed_requests()
+    return sweep_active_contracts()
+
+@shared_task
+def refresh_market_prices():
+    refresh_prices()
+    active = ItemRequest.objects.active().order_by('id').only(
+        'id', 'pickup_location', 'appraised_value', 'appraised_volume', 'appraised_at',
+    )
+    last_id = 0
+    while True:
+        batch = list(active.filter(id__gt=last_id)[:500])
+        if not batch:
+            break
+        appraise_requests(batch)
+        last_id = batch[-1].id
+
+@shared_task
+def refresh_leaderboards():
+    return _refresh_leaderboards()
+
+@shared_task
+def cleanup_old_requests():
+    return retention.cleanup_old_requests()
+
+@shared_task
+def expire_abandoned_requests():
+    return retention.expire_abandoned_requests()
+
+@shared_task
+def archive_closed_requests():
+    return retention.archive_closed_requests()
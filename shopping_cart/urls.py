@@ -6,12 +6,22 @@ app_name = 'shopping_cart'
 urlpatterns = [
     path('', views.index, name='index'),
     path('create/', views.create_request, name='create_request'),
+    path('create/bulk/', views.bulk_create_request, name='bulk_create_request'),
+    path('api/requests/bulk/', views.api_bulk_create_requests, name='api_bulk_create_requests'),
+    path('api/marketplace/', views.api_marketplace, name='api_marketplace'),
+    path('api/my-claimed/', views.api_my_claimed_orders, name='api_my_claimed_orders'),
+    path('api/my-requests/', views.api_my_requests, name='api_my_requests'),
+    path('live/marketplace/', views.live_marketplace, name='live_marketplace'),
+    path('live/marketplace/poll/', views.live_marketplace_poll, name='live_marketplace_poll'),
     path('my-requests/', views.my_requests, name='my_requests'),
     path('request/<int:request_id>/', views.request_detail, name='request_detail'),
     path('marketplace/', views.marketplace, name='marketplace'),
     path('my-claimed/', views.my_claimed_orders, name='my_claimed_orders'),
+    path('my-claimed/planner/', views.route_planner, name='route_planner'),
     path('claim/<int:request_id>/', views.claim_request, name='claim_request'),
     path('cancel/<int:request_id>/', views.cancel_request, name='cancel_request'),
     path('leaderboard/', views.leaderboard, name='leaderboard'),
     path('admin/', views.admin_dashboard, name='admin_dashboard'),
+    path('admin/demand/export/', views.demand_export, name='demand_export'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -1,16 +1,44 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import hashlib
+import hmac
+import json
+import time
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Count, Max, prefetch_related_objects
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET, require_POST
+from django.shortcuts import redirect, get_object_or_404
 from django.contrib import messages
 from django.utils.translation import gettext as _
+from . import app_settings
+from .access import get_access
 from .decorators import permission_required_or_superuser
-from .models import ItemRequest, FulfillmentTracking
-from .forms import CreateRequestForm
+from .demand import demand_rows, iter_csv, iter_jsonl, recent_top_items
+from .instrumentation import registry, render
+from .live import EVENT_NEW, get_feed
+from .models import ArchivedRequest, ItemRequest, LeaderboardEntry, NotificationOutbox, RequestCounter
+from .bulk import BulkRequestError, parse_bulk_json, validate_entries
+from .notifications import queue_notification, queue_notifications
+from .fragments import render_fragment, render_fragments
+from .forms import BulkCreateRequestForm, CreateRequestForm, DemandReportForm, MarketplaceFilterForm, RoutePlannerForm
+from .pagination import keyset_paginate
+from .planner import plan_trips
+from .prices import appraise_requests
+
+ROW_TEMPLATE = 'shopping_cart/partials/request_row.html'
+DETAIL_TEMPLATE = 'shopping_cart/partials/request_detail_body.html'
+DASHBOARD_DEMAND_DAYS = 30
+
+INACTIVE_STATUSES = (ItemRequest.STATUS_COMPLETED, ItemRequest.STATUS_CANCELLED, ItemRequest.STATUS_EXPIRED)
 
 @permission_required_or_superuser('shopping_cart.basic_access')
 def index(request):
+    counts = RequestCounter.objects.counts_for(request.user)
     context = {
-        'total_requests': ItemRequest.objects.filter(user=request.user).count(),
-        'active_requests': ItemRequest.objects.filter(user=request.user).active().count(),
-        'completed_requests': ItemRequest.objects.filter(user=request.user, status='completed').count(),
+        'total_requests': sum(counts.values()),
+        'active_requests': sum(count for status, count in counts.items() if status not in INACTIVE_STATUSES),
+        'completed_requests': counts.get(ItemRequest.STATUS_COMPLETED, 0),
     }
     return render(request, 'shopping_cart/index.html', context)
 
@@ -19,68 +47,328 @@ def create_request(request):
     if request.method == 'POST':
         form = CreateRequestForm(request.POST)
         if form.is_valid():
-            ItemRequest.objects.create(
+            item_request = ItemRequest.objects.create_with_items(
+                form.parsed_items,
                 user=request.user,
-                character=request.user.profile.main_character,
+                character=get_access(request.user).main_character,
                 request_type=form.cleaned_data['request_type'],
-                items_list=form.parsed_items,
                 pickup_location=form.cleaned_data['pickup_location'],
                 delivery_location=form.cleaned_data['delivery_location'],
                 description=form.cleaned_data['description'],
                 requester_price=form.cleaned_data.get('requester_price'),
                 max_budget=form.cleaned_data.get('max_budget'),
             )
+            appraise_requests([item_request])
+            queue_notification(NotificationOutbox.EVENT_NEW_REQUEST, item_request)
             messages.success(request, _('Request created successfully!'))
+            duplicates = list(
+                ItemRequest.objects.active().filter(user=request.user).with_same_items(item_request).values_list('id', flat=True)[:5]
+            )
+            if duplicates:
+                messages.info(request, _('You already have open requests with the same items: %(ids)s') % {
+                    'ids': ', '.join(f'#{request_id}' for request_id in duplicates),
+                })
             return redirect('shopping_cart:my_requests')
     else:
         form = CreateRequestForm()
     return render(request, 'shopping_cart/create_request.html', {'form': form})
 
+def _create_requests(request, entries):
+    item_requests = ItemRequest.objects.bulk_create_with_items(
+        entries, user=request.user, character=get_access(request.user).main_character,
+    )
+    appraise_requests(item_requests)
+    queue_notifications(NotificationOutbox.EVENT_NEW_REQUEST, item_requests)
+    return item_requests
+
+@permission_required_or_superuser('shopping_cart.request_items')
+def bulk_create_request(request):
+    if request.method == 'POST':
+        form = BulkCreateRequestForm(request.POST, request.FILES)
+        if form.is_valid():
+            item_requests = _create_requests(request, form.entries)
+            messages.success(request, _('%(count)d requests created successfully!') % {'count': len(item_requests)})
+            return redirect('shopping_cart:my_requests')
+    else:
+        form = BulkCreateRequestForm()
+    return render(request, 'shopping_cart/bulk_create_request.html', {'form': form})
+
+@require_POST
+@permission_required_or_superuser('shopping_cart.request_items')
+def api_bulk_create_requests(request):
+    try:
+        entries = validate_entries(parse_bulk_json(json.loads(request.body)))
+    except BulkRequestError as e:
+        return JsonResponse({'errors': e.errors}, status=400)
+    except ValueError:
+        # JSONDecodeError and UnicodeDecodeError for bodies that are not UTF-8 JSON
+        return JsonResponse({'errors': ['Invalid JSON']}, status=400)
+    item_requests = _create_requests(request, entries)
+    return JsonResponse({'created': [item_request.id for item_request in item_requests]}, status=201)
+
 @permission_required_or_superuser('shopping_cart.request_items')
 def my_requests(request):
-    requests = ItemRequest.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'shopping_cart/my_requests.html', {'requests': requests})
+    page = keyset_paginate(ItemRequest.objects.filter(user=request.user).for_list(), request.GET.get('cursor'))
+    return render(request, 'shopping_cart/my_requests.html', {
+        'requests': page.object_list, 'page': page,
+        'rows': render_fragments(ROW_TEMPLATE, page.object_list, prefetch=['items']),
+    })
+
+def _detail_context(item_request, items):
+    items = list(items)
+    return {
+        'item_request': item_request, 'items': items, 'summary': item_request.summary(items),
+        'total_quantity': sum(item.quantity for item in items),
+    }
 
 @permission_required_or_superuser('shopping_cart.basic_access')
 def request_detail(request, request_id):
-    item_request = get_object_or_404(ItemRequest, id=request_id)
-    return render(request, 'shopping_cart/request_detail.html', {'request': item_request})
+    item_request = ItemRequest.objects.select_related('character', 'fulfiller_character').filter(id=request_id).first()
+    if item_request is not None:
+        detail_body = render_fragment(DETAIL_TEMPLATE, item_request, prefetch=['items'],
+                                      context=lambda obj: _detail_context(obj, obj.items.all()))
+    else:
+        archived = get_object_or_404(ArchivedRequest, id=request_id)
+        item_request = archived.to_request()
+        detail_body = render_fragment(DETAIL_TEMPLATE, item_request,
+                                      context=lambda obj: _detail_context(obj, archived.to_items()))
+    return render(request, 'shopping_cart/request_detail.html', {'item_request': item_request, 'detail_body': detail_body})
 
 @permission_required_or_superuser('shopping_cart.fulfill_requests')
 def marketplace(request):
     requests = ItemRequest.objects.claimable_for_user(request.user)
-    return render(request, 'shopping_cart/marketplace.html', {'requests': requests})
+    filter_form = MarketplaceFilterForm(request.GET)
+    if filter_form.is_valid():
+        requests = filter_form.filter(requests)
+    page = keyset_paginate(requests.for_list(), request.GET.get('cursor'))
+    filter_query = request.GET.copy()
+    filter_query.pop('cursor', None)
+    return render(request, 'shopping_cart/marketplace.html', {
+        'requests': page.object_list, 'page': page,
+        'rows': render_fragments(ROW_TEMPLATE, page.object_list, prefetch=['items']),
+        'filter_form': filter_form, 'filter_query': filter_query.urlencode(),
+        'live_updates': app_settings.SHOPPING_CART_LIVE_UPDATES,
+    })
 
 @permission_required_or_superuser('shopping_cart.fulfill_requests')
 def my_claimed_orders(request):
-    requests = ItemRequest.objects.user_claims(request.user)
-    return render(request, 'shopping_cart/my_claimed_orders.html', {'requests': requests})
+    page = keyset_paginate(ItemRequest.objects.user_claims(request.user).for_list(), request.GET.get('cursor'))
+    return render(request, 'shopping_cart/my_claimed_orders.html', {
+        'requests': page.object_list, 'page': page,
+        'rows': render_fragments(ROW_TEMPLATE, page.object_list, prefetch=['items']),
+    })
+
+@permission_required_or_superuser('shopping_cart.fulfill_requests')
+def route_planner(request):
+    form = RoutePlannerForm(request.GET)
+    capacity = (form.is_valid() and form.cleaned_data['cargo']) or app_settings.SHOPPING_CART_PLANNER_CARGO_VOLUME
+    return render(request, 'shopping_cart/route_planner.html', {'form': form, 'plan': plan_trips(request.user, capacity)})
 
 @permission_required_or_superuser('shopping_cart.fulfill_requests')
 def claim_request(request, request_id):
     item_request = get_object_or_404(ItemRequest, id=request_id)
-    item_request.claim(request.user, request.user.profile.main_character)
+    try:
+        item_request.claim(request.user, get_access(request.user).main_character)
+    except ValueError:
+        if item_request.fulfiller_id and item_request.fulfiller_id != request.user.id:
+            messages.error(request, _('Request was already claimed by someone else'))
+        else:
+            messages.error(request, _('This request cannot be claimed'))
+        return redirect('shopping_cart:marketplace')
     messages.success(request, _('Request claimed!'))
     return redirect('shopping_cart:my_claimed_orders')
 
 @permission_required_or_superuser('shopping_cart.basic_access')
 def cancel_request(request, request_id):
     item_request = get_object_or_404(ItemRequest, id=request_id, user=request.user)
-    item_request.status = ItemRequest.STATUS_CANCELLED
-    item_request.save()
+    try:
+        item_request.cancel()
+    except ValueError:
+        messages.error(request, _('This request can no longer be cancelled'))
+        return redirect('shopping_cart:my_requests')
     messages.success(request, _('Request cancelled'))
     return redirect('shopping_cart:my_requests')
 
 @permission_required_or_superuser('shopping_cart.basic_access')
 def leaderboard(request):
-    top_fulfillers = FulfillmentTracking.objects.all().order_by('-total_fulfilled')[:25]
-    return render(request, 'shopping_cart/leaderboard.html', {'top_fulfillers': top_fulfillers})
+    window = request.GET.get('window', LeaderboardEntry.WINDOW_ALL_TIME)
+    if window not in dict(LeaderboardEntry.WINDOW_CHOICES):
+        window = LeaderboardEntry.WINDOW_ALL_TIME
+    metric = request.GET.get('metric', LeaderboardEntry.METRIC_COUNT)
+    if metric not in dict(LeaderboardEntry.METRIC_CHOICES):
+        metric = LeaderboardEntry.METRIC_COUNT
+    top_fulfillers = LeaderboardEntry.objects.filter(window=window, metric=metric).select_related('user')
+    return render(request, 'shopping_cart/leaderboard.html', {
+        'top_fulfillers': top_fulfillers,
+        'window': window,
+        'metric': metric,
+        'window_choices': LeaderboardEntry.WINDOW_CHOICES,
+        'metric_choices': LeaderboardEntry.METRIC_CHOICES,
+    })
 
 @permission_required_or_superuser('shopping_cart.manage_requests')
 def admin_dashboard(request):
+    counts = RequestCounter.objects.counts_for()
     context = {
-        'total_requests': ItemRequest.objects.count(),
-        'pending_requests': ItemRequest.objects.pending().count(),
-        'completed_requests': ItemRequest.objects.completed().count(),
+        'total_requests': sum(counts.values()),
+        'pending_requests': counts.get(ItemRequest.STATUS_PENDING, 0),
+        'completed_requests': counts.get(ItemRequest.STATUS_COMPLETED, 0),
+        'top_items': recent_top_items(DASHBOARD_DEMAND_DAYS),
+        'demand_days': DASHBOARD_DEMAND_DAYS,
+        'demand_form': DemandReportForm(initial={'bucket': 'month', 'hub': 'pickup', 'format': 'csv'}),
     }
     return render(request, 'shopping_cart/admin_dashboard.html', context)
+
+@permission_required_or_superuser('shopping_cart.manage_requests')
+def demand_export(request):
+    """Stream the demand report as CSV or JSON lines, without building it in memory"""
+    form = DemandReportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+    options = form.report_kwargs()
+    rows = demand_rows(**options)
+    if form.cleaned_data['format'] == 'jsonl':
+        response = StreamingHttpResponse(iter_jsonl(rows), content_type='application/x-ndjson')
+        filename = 'demand.jsonl'
+    else:
+        response = StreamingHttpResponse(iter_csv(rows, options['group_by']), content_type='text/csv')
+        filename = 'demand.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def metrics(request):
+    """Prometheus text export of the per-view counters, authenticated by SHOPPING_CART_METRICS_TOKEN"""
+    token = app_settings.SHOPPING_CART_METRICS_TOKEN
+    if not token:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render_prometheus(), content_type='text/plain; version=0.0.4')
+
+def _serialize_request(item_request):
+    return {
+        'id': item_request.id,
+        'url': reverse('shopping_cart:request_detail', args=[item_request.id]),
+        'status': item_request.status,
+        'request_type': item_request.request_type,
+        'character': item_request.character.character_name,
+        'fulfiller_character': item_request.fulfiller_character.character_name if item_request.fulfiller_character_id else None,
+        'pickup_location': item_request.pickup_location,
+        'delivery_location': item_request.delivery_location,
+        'pickup_hub': item_request.pickup_hub,
+        'delivery_hub': item_request.delivery_hub,
+        'requester_price': item_request.requester_price,
+        'max_budget': item_request.max_budget,
+        'appraised_value': item_request.appraised_value,
+        'isk_value': item_request.isk_value,
+        'items': item_request.items_list,
+        'total_quantity': item_request.total_quantity,
+        'created_at': item_request.created_at.isoformat(),
+        'updated_at': item_request.updated_at.isoformat(),
+    }
+
+def _conditional_list(request, queryset):
+    """JSON page of queryset with an ETag/Last-Modified from one aggregate query.
+    A matching If-None-Match or If-Modified-Since gets a 304 before anything is serialized.
+    With ?include=html every result also carries its cached table row, so pages
+    refreshing in the browser show exactly what the server renders"""
+    state = queryset.order_by().aggregate(latest=Max('updated_at'), total=Count('id'))
+    latest = state['latest']
+    fingerprint = f"{request.user.id}|{request.get_full_path()}|{latest.isoformat() if latest else ''}|{state['total']}"
+    etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+    last_modified = int(latest.timestamp()) if latest else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        page = keyset_paginate(queryset.for_list(), request.GET.get('cursor'))
+        prefetch_related_objects(page.object_list, 'items')
+        results = [_serialize_request(item_request) for item_request in page.object_list]
+        if request.GET.get('include') == 'html':
+            for result, row in zip(results, render_fragments(ROW_TEMPLATE, page.object_list)):
+                result['html'] = row
+        response = JsonResponse({
+            'results': results,
+            'next_cursor': page.next_cursor,
+            'total': state['total'],
+        })
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@require_GET
+@permission_required_or_superuser('shopping_cart.fulfill_requests')
+def api_marketplace(request):
+    requests = ItemRequest.objects.claimable_for_user(request.user)
+    filter_form = MarketplaceFilterForm(request.GET)
+    if filter_form.is_valid():
+        requests = filter_form.filter(requests)
+    return _conditional_list(request, requests)
+
+@require_GET
+@permission_required_or_superuser('shopping_cart.fulfill_requests')
+def api_my_claimed_orders(request):
+    return _conditional_list(request, ItemRequest.objects.user_claims(request.user))
+
+@require_GET
+@permission_required_or_superuser('shopping_cart.request_items')
+def api_my_requests(request):
+    return _conditional_list(request, ItemRequest.objects.filter(user=request.user))
+
+LONG_POLL_SECONDS = 25
+KEEPALIVE_SECONDS = 15
+
+def _visible_events(user, events):
+    """Drop the user's own new requests, which their marketplace never shows, and internal fields"""
+    return [
+        (number, {key: value for key, value in event.items() if key != 'user_id'})
+        for number, event in events
+        if not (event['type'] == EVENT_NEW and event['user_id'] == user.id)
+    ]
+
+@require_GET
+@permission_required_or_superuser('shopping_cart.fulfill_requests')
+def live_marketplace(request):
+    """Server-sent events for requests entering or leaving the marketplace"""
+    if not app_settings.SHOPPING_CART_LIVE_UPDATES:
+        raise Http404
+    feed = get_feed()
+    try:
+        after = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        after = feed.latest()
+    user = request.user
+    
+    def stream(after):
+        deadline = time.monotonic() + app_settings.SHOPPING_CART_LIVE_STREAM_SECONDS
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            events = feed.events_after(after, min(KEEPALIVE_SECONDS, max(deadline - time.monotonic(), 0)))
+            if not events:
+                yield ': keepalive\n\n'
+                continue
+            after = events[-1][0]
+            for number, event in _visible_events(user, events):
+                yield f"id: {number}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    response = StreamingHttpResponse(stream(after), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@require_GET
+@permission_required_or_superuser('shopping_cart.fulfill_requests')
+def live_marketplace_poll(request):
+    """Long-poll fallback: waits for events after ?after=N, or returns the current position without it"""
+    if not app_settings.SHOPPING_CART_LIVE_UPDATES:
+        raise Http404
+    feed = get_feed()
+    try:
+        after = int(request.GET['after'])
+    except (KeyError, ValueError):
+        return JsonResponse({'last': feed.latest(), 'events': []})
+    events = feed.events_after(after, LONG_POLL_SECONDS)
+    return JsonResponse({
+        'last': events[-1][0] if events else after,
+        'events': [dict(event, sequence=number) for number, event in _visible_events(request.user, events)],
+    })
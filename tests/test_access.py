@@ -0,0 +1,84 @@
+"""Test the cached per-request access context"""
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from shopping_cart.access import get_access
+from shopping_cart.auth_hooks import ShoppingCartMenuItem
+from shopping_cart.models import ItemRequest
+from .utils import create_character, create_user
+
+def permission(codename):
+    return Permission.objects.get(content_type__app_label='shopping_cart', codename=codename)
+
+class AccessContextTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user, self.character = create_user('fulfiller', 1001)
+        self.group = Group.objects.create(name='Haulers')
+        self.group.permissions.add(permission('basic_access'), permission('fulfill_requests'))
+        self.user.groups.add(self.group)
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_context_is_memoized_and_cached(self):
+        access = get_access(self.fresh_user())
+        self.assertTrue(access.has_perm('shopping_cart.fulfill_requests'))
+        self.assertFalse(access.has_perm('shopping_cart.manage_requests'))
+        self.assertEqual(access.main_character, self.character)
+
+        user = self.fresh_user()
+        with CaptureQueriesContext(connection) as queries:
+            access = get_access(user)
+            self.assertIs(get_access(user), access)
+            self.assertEqual(access.main_character.character_name, 'Character 1001')
+        self.assertEqual(len(queries), 0)
+
+    def test_group_membership_change_invalidates(self):
+        self.assertTrue(get_access(self.fresh_user()).has_perm('shopping_cart.fulfill_requests'))
+        self.user.groups.remove(self.group)
+        self.assertFalse(get_access(self.fresh_user()).has_perm('shopping_cart.fulfill_requests'))
+        self.group.user_set.add(self.user)
+        self.assertTrue(get_access(self.fresh_user()).has_perm('shopping_cart.fulfill_requests'))
+
+    def test_group_permission_change_invalidates_everyone(self):
+        self.assertTrue(get_access(self.fresh_user()).has_perm('shopping_cart.fulfill_requests'))
+        self.group.permissions.remove(permission('fulfill_requests'))
+        self.assertFalse(get_access(self.fresh_user()).has_perm('shopping_cart.fulfill_requests'))
+
+    def test_main_character_change_invalidates(self):
+        get_access(self.fresh_user())
+        other = create_character(1002)
+        self.user.profile.main_character = other
+        self.user.profile.save()
+        self.assertEqual(get_access(self.fresh_user()).main_character, other)
+
+    def test_shared_by_decorator_model_and_menu(self):
+        requester, requester_character = create_user('requester', 1003)
+        item_request = ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 1}], user=requester, character=requester_character,
+            pickup_location='Jita', delivery_location='Amarr',
+        )
+        request = RequestFactory().get('/')
+        request.user = self.fresh_user()
+        get_access(request.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(item_request.can_be_claimed_by(request.user))
+            self.assertNotEqual(ShoppingCartMenuItem().render(request), '')
+        self.assertEqual(len(queries), 0)
+        self.assertFalse(item_request.can_be_claimed_by(requester))
+
+        self.client.force_login(self.user)
+        self.client.post(reverse('shopping_cart:claim_request', args=[item_request.id]))
+        item_request.refresh_from_db()
+        self.assertEqual(item_request.fulfiller_character, self.character)
+
+    def test_view_denied_after_permission_removed(self):
+        self.client.force_login(self.user)
+        url = reverse('shopping_cart:marketplace')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.user.groups.clear()
+        self.assertEqual(self.client.get(url).status_code, 302)
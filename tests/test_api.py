@@ -0,0 +1,71 @@
+"""Test the read-only JSON request API"""
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from shopping_cart.models import ItemRequest
+from .utils import create_user
+
+class ReadApiTestCase(TestCase):
+    def setUp(self):
+        self.requester, self.character = create_user('requester', 1001)
+        self.fulfiller, self.fulfiller_character = create_user('fulfiller', 1002)
+        self.fulfiller.is_superuser = True
+        self.fulfiller.save()
+        self.client.force_login(self.fulfiller)
+        self.item_requests = [
+            ItemRequest.objects.create_with_items(
+                [{'name': 'Tritanium', 'quantity': i + 1}], user=self.requester, character=self.character,
+                pickup_location='Jita', delivery_location='Amarr', requester_price=1000,
+            )
+            for i in range(3)
+        ]
+
+    def test_marketplace_json(self):
+        response = self.client.get(reverse('shopping_cart:api_marketplace'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([row['id'] for row in data['results']], [r.id for r in reversed(self.item_requests)])
+        self.assertEqual(data['results'][0]['items'], [{'name': 'Tritanium', 'quantity': 3}])
+        self.assertEqual(data['results'][0]['character'], 'Character 1001')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_unchanged_list_returns_304_without_serializing(self):
+        url = reverse('shopping_cart:api_marketplace')
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertFalse(any('shopping_cart_requestitem' in query['sql'] for query in queries))
+
+    def test_claim_changes_etag(self):
+        url = reverse('shopping_cart:api_marketplace')
+        etag = self.client.get(url)['ETag']
+        self.item_requests[0].claim(self.fulfiller, self.fulfiller_character)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+        claimed = self.client.get(reverse('shopping_cart:api_my_claimed_orders')).json()
+        self.assertEqual([row['id'] for row in claimed['results']], [self.item_requests[0].id])
+        self.assertEqual(claimed['results'][0]['fulfiller_character'], 'Character 1002')
+
+    def test_filters_are_part_of_the_etag(self):
+        url = reverse('shopping_cart:api_marketplace')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, {'pickup_hub': 'Amarr'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_rows_match_the_server_rendered_page(self):
+        url = reverse('shopping_cart:api_marketplace')
+        self.assertNotIn('html', self.client.get(url).json()['results'][0])
+        results = self.client.get(url, {'include': 'html'}).json()['results']
+        page = self.client.get(reverse('shopping_cart:marketplace'))
+        self.assertEqual([result['html'] for result in results], [str(row) for row in page.context['rows']])
+        self.assertIn(str(self.item_requests[2]), results[0]['html'])
+
+    def test_read_only(self):
+        self.assertEqual(self.client.post(reverse('shopping_cart:api_marketplace')).status_code, 405)
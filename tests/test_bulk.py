@@ -0,0 +1,138 @@
+"""Test bulk request creation"""
+import json
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from shopping_cart import app_settings
+from shopping_cart.bulk import BulkRequestError, parse_bulk_paste, validate_entries
+from shopping_cart.forms import CreateRequestForm
+from shopping_cart.models import ItemRequest, NotificationOutbox, RequestCounter, RequestItem
+from .utils import create_user
+
+PASTE = """== Jita -> Amarr | 150,000,000 ==
+Tritanium x1000
+Pyerite x500
+
+== Dodixie ==
+Hobgoblin II\t10
+Hobgoblin II\t5
+"""
+
+class BulkParseTestCase(TestCase):
+    def test_paste_sections(self):
+        entries = parse_bulk_paste(PASTE, {'delivery_location': 'Home'})
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]['pickup_location'], 'Jita')
+        self.assertEqual(entries[0]['delivery_location'], 'Amarr')
+        self.assertEqual(entries[1]['delivery_location'], 'Home')
+        valid = validate_entries(entries)
+        self.assertEqual(valid[0][0]['requester_price'], 150_000_000)
+        self.assertEqual(valid[1][1], [{'name': 'Hobgoblin II', 'quantity': 15}])
+
+    def test_all_errors_reported_together(self):
+        entries = [
+            {'pickup_location': 'Jita', 'delivery_location': 'Amarr', 'items': [{'name': 'Tritanium', 'quantity': 'lots'}]},
+            {'pickup_location': '', 'delivery_location': 'Amarr', 'items_text': 'Tritanium x1'},
+            {'pickup_location': 'Jita', 'delivery_location': 'Amarr', 'items_text': 'Tritanium x1', 'max_budget': '-5'},
+        ]
+        with self.assertRaises(BulkRequestError) as cm:
+            validate_entries(entries)
+        self.assertEqual(len(cm.exception.errors), 3)
+        self.assertTrue(cm.exception.errors[1].startswith('Request 2: invalid pickup location'))
+
+    def test_overlong_item_names_are_rejected(self):
+        name = 'Tritanium' * 30
+        entries = [
+            {'pickup_location': 'Jita', 'delivery_location': 'Amarr', 'items': [{'name': name, 'quantity': 1}]},
+            {'pickup_location': 'Jita', 'delivery_location': 'Amarr', 'items_text': f'{name} x1'},
+        ]
+        with self.assertRaises(BulkRequestError) as cm:
+            validate_entries(entries)
+        self.assertEqual(len(cm.exception.errors), 2)
+        self.assertIn('item names longer than 255 characters', cm.exception.errors[1])
+        form = CreateRequestForm(data={
+            'request_type': 'requester_has_items', 'items_text': f'{name} x1',
+            'pickup_location': 'Jita', 'delivery_location': 'Amarr', 'requester_expiration_days': 7,
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('at most 255 characters', str(form.errors['items_text']))
+
+    @mock.patch.object(app_settings, 'SHOPPING_CART_BULK_MAX_REQUESTS', 1)
+    def test_batch_limit(self):
+        with self.assertRaises(BulkRequestError):
+            validate_entries(parse_bulk_paste(PASTE, {'delivery_location': 'Home'}))
+
+@mock.patch.object(app_settings, 'SHOPPING_CART_DISCORD_WEBHOOK_URL', 'https://discord.invalid/webhook')
+class BulkCreateViewTestCase(TestCase):
+    def setUp(self):
+        self.user, self.character = create_user('director', 1001)
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+    @mock.patch('shopping_cart.notifications._schedule_dispatch')
+    def test_api_creates_all_requests_in_one_batch(self, schedule):
+        payload = {'requests': [
+            {'pickup_location': 'Jita', 'delivery_location': 'Amarr', 'items': [{'name': 'Tritanium', 'quantity': i + 1}]}
+            for i in range(20)
+        ]}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('shopping_cart:api_bulk_create_requests'), json.dumps(payload), content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['created']), 20)
+        self.assertEqual(RequestItem.objects.count(), 20)
+        self.assertEqual(ItemRequest.objects.filter(pickup_hub='Jita', delivery_hub='Amarr').count(), 20)
+        self.assertEqual(RequestCounter.objects.counts_for(self.user), {ItemRequest.STATUS_PENDING: 20})
+        self.assertEqual(NotificationOutbox.objects.count(), 20)
+        schedule.assert_called_once()
+
+    def test_api_rejects_invalid_batch(self):
+        payload = [{'pickup_location': 'Jita', 'delivery_location': 'Amarr', 'items': []}]
+        response = self.client.post(
+            reverse('shopping_cart:api_bulk_create_requests'), json.dumps(payload), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], ['Request 1: no items'])
+        self.assertFalse(ItemRequest.objects.exists())
+
+    def test_api_rejects_malformed_input(self):
+        url = reverse('shopping_cart:api_bulk_create_requests')
+        response = self.client.post(url, b'\xff\xfe[', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], ['Invalid JSON'])
+        payload = [
+            {'pickup_location': 'Jita', 'delivery_location': 'Amarr', 'items_text': 5},
+            {'pickup_location': 'Jita', 'delivery_location': 'Amarr', 'items_text': 'Tritanium 1', 'request_type': ['x']},
+        ]
+        response = self.client.post(url, json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            'Request 1: items_text must be text', "Request 2: invalid request type ['x']",
+        ])
+        self.assertFalse(ItemRequest.objects.exists())
+
+    def test_form_csv_upload(self):
+        upload = SimpleUploadedFile('restock.csv', (
+            "request,pickup_location,name,quantity\n"
+            "a,Jita,Tritanium,100\n"
+            "a,Jita,Pyerite,50\n"
+            "b,Amarr,Mexallon,10\n"
+        ).encode())
+        response = self.client.post(reverse('shopping_cart:bulk_create_request'), {
+            'request_type': ItemRequest.REQUEST_TYPE_FULFILLER_BUYS, 'delivery_location': 'Home', 'upload': upload,
+        })
+        self.assertRedirects(response, reverse('shopping_cart:my_requests'), fetch_redirect_response=False)
+        item_requests = list(ItemRequest.objects.order_by('id'))
+        self.assertEqual([item_request.pickup_location for item_request in item_requests], ['Jita', 'Amarr'])
+        self.assertEqual(item_requests[0].total_quantity, 150)
+        self.assertEqual(item_requests[1].request_type, ItemRequest.REQUEST_TYPE_FULFILLER_BUYS)
+
+    def test_form_paste(self):
+        response = self.client.post(reverse('shopping_cart:bulk_create_request'), {
+            'request_type': ItemRequest.REQUEST_TYPE_REQUESTER_HAS_ITEMS, 'delivery_location': 'Home', 'requests_text': PASTE,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(ItemRequest.objects.count(), 2)
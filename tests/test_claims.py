@@ -0,0 +1,170 @@
+"""Test that claims and status changes cannot overwrite each other"""
+import threading
+import time
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from shopping_cart.models import ItemRequest, RequestCounter, StatusTransition
+from shopping_cart.signals import request_status_changed
+from .utils import create_user
+
+class ClaimTestCase(TestCase):
+    def setUp(self):
+        self.requester, self.character = create_user('requester', 1001)
+        self.fulfillers = []
+        for i in range(2):
+            user, character = create_user(f'fulfiller{i}', 1100 + i)
+            user.is_superuser = True
+            user.save()
+            self.fulfillers.append((user, character))
+        self.item_request = ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 1}], user=self.requester, character=self.character,
+            pickup_location='Jita', delivery_location='Amarr',
+        )
+
+    def test_stale_copy_cannot_overwrite_claim(self):
+        first = ItemRequest.objects.get(id=self.item_request.id)
+        second = ItemRequest.objects.get(id=self.item_request.id)
+        first.claim(*self.fulfillers[0])
+        with self.assertRaises(ValueError):
+            second.claim(*self.fulfillers[1])
+        self.assertEqual(second.fulfiller_id, self.fulfillers[0][0].id)
+        self.item_request.refresh_from_db()
+        self.assertEqual(self.item_request.fulfiller_id, self.fulfillers[0][0].id)
+        self.assertEqual(RequestCounter.objects.counts_for(self.requester), {'pending': 0, 'claimed': 1})
+
+    def test_claim_writes_only_changed_fields(self):
+        stale = ItemRequest.objects.get(id=self.item_request.id)
+        ItemRequest.objects.filter(id=self.item_request.id).update(description='edited meanwhile')
+        stale.claim(*self.fulfillers[0])
+        self.item_request.refresh_from_db()
+        self.assertEqual(self.item_request.description, 'edited meanwhile')
+        self.assertEqual(self.item_request.esi_monitor_character_id, self.character.id)
+
+    def test_contract_and_cancel_guards(self):
+        with self.assertRaises(ValueError):
+            self.item_request.set_contract_created(1, ItemRequest.CONTRACT_ISSUER_REQUESTER)
+        self.item_request.claim(*self.fulfillers[0])
+        self.item_request.set_contract_created(1, ItemRequest.CONTRACT_ISSUER_REQUESTER)
+        with self.assertRaises(ValueError):
+            self.item_request.cancel()
+        self.item_request.refresh_from_db()
+        self.assertEqual(self.item_request.status, ItemRequest.STATUS_CONTRACT_CREATED)
+
+class TransitionTestCase(TestCase):
+    def setUp(self):
+        self.requester, self.character = create_user('requester', 1001)
+        self.fulfiller, self.fulfiller_character = create_user('fulfiller', 1101)
+        self.fulfiller.is_superuser = True
+        self.fulfiller.save()
+        self.item_request = ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 1}], user=self.requester, character=self.character,
+            pickup_location='Jita', delivery_location='Amarr',
+        )
+
+    def test_table_rejects_illegal_moves(self):
+        for status, targets in ItemRequest.TRANSITIONS.items():
+            self.assertNotIn(status, targets)
+        self.assertFalse(self.item_request.transition(ItemRequest.STATUS_COMPLETED))
+        for status in (ItemRequest.STATUS_CLAIMED, ItemRequest.STATUS_CONTRACT_CREATED, ItemRequest.STATUS_COMPLETED):
+            self.assertTrue(self.item_request.transition(status))
+        with self.assertRaises(ValueError):
+            self.item_request.cancel()
+        self.item_request.refresh_from_db()
+        self.assertEqual((self.item_request.status, self.item_request.version), (ItemRequest.STATUS_COMPLETED, 3))
+        self.assertEqual(RequestCounter.objects.counts_for(self.requester)[ItemRequest.STATUS_COMPLETED], 1)
+
+    def test_stale_copy_retries_against_new_version(self):
+        stale = ItemRequest.objects.get(id=self.item_request.id)
+        self.item_request.claim(self.fulfiller, self.fulfiller_character)
+        with CaptureQueriesContext(connection) as queries:
+            stale.cancel()
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "shopping_cart_itemrequest"')]
+        # The first UPDATE loses against the claim, the retry wins; neither writes untouched columns
+        self.assertEqual(len(updates), 2)
+        self.assertNotIn('"description"', updates[1])
+        self.assertEqual((stale.status, stale.version), (ItemRequest.STATUS_CANCELLED, 2))
+        self.assertEqual(
+            list(StatusTransition.objects.filter(request_id=stale.id).values_list('version', 'old_status', 'new_status')),
+            [(1, ItemRequest.STATUS_PENDING, ItemRequest.STATUS_CLAIMED), (2, ItemRequest.STATUS_CLAIMED, ItemRequest.STATUS_CANCELLED)],
+        )
+
+    def test_one_signal_carries_the_instance(self):
+        received = []
+        def receiver(sender, **kwargs):
+            received.append(kwargs)
+        request_status_changed.connect(receiver)
+        self.addCleanup(request_status_changed.disconnect, receiver)
+        self.item_request.claim(self.fulfiller, self.fulfiller_character)
+        self.assertEqual(len(received), 1)
+        self.assertIs(received[0]['item_request'], self.item_request)
+        self.assertEqual(
+            (received[0]['old_status'], received[0]['new_status'], received[0]['version']),
+            (ItemRequest.STATUS_PENDING, ItemRequest.STATUS_CLAIMED, 1),
+        )
+
+    def test_creation_signal_sees_the_items(self):
+        summaries = []
+        def receiver(sender, item_request, **kwargs):
+            summaries.append(str(item_request))
+        request_status_changed.connect(receiver)
+        self.addCleanup(request_status_changed.disconnect, receiver)
+        fields = {'user': self.requester, 'character': self.character, 'pickup_location': 'Jita', 'delivery_location': 'Amarr'}
+        single = ItemRequest.objects.create_with_items([{'name': 'Pyerite', 'quantity': 2}], **fields)
+        bulk = ItemRequest.objects.bulk_create_with_items([({}, [{'name': 'Mexallon', 'quantity': 3}])], **fields)
+        self.assertEqual(summaries, [f"#{single.id} - Pyerite x2", f"#{bulk[0].id} - Mexallon x3"])
+
+def retry_while_locked(func, *args, **kwargs):
+    """SQLite's shared in-memory test database fails with "table is locked" where
+    PostgreSQL and MySQL would block, so wait and retry the whole atomic call"""
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as ex:
+            if 'locked' not in str(ex):
+                raise
+            time.sleep(0.01)
+
+class ConcurrentClaimTestCase(TransactionTestCase):
+    def test_parallel_claims_have_one_winner(self):
+        requester, character = create_user('requester', 1001)
+        fulfillers = []
+        for i in range(8):
+            user, fulfiller_character = create_user(f'fulfiller{i}', 1100 + i)
+            user.is_superuser = True
+            user.save()
+            fulfillers.append((user, fulfiller_character))
+        item_request = ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 1}], user=requester, character=character,
+            pickup_location='Jita', delivery_location='Amarr',
+        )
+        barrier = threading.Barrier(len(fulfillers))
+        results = []
+        lock = threading.Lock()
+
+        def attempt(user, fulfiller_character):
+            try:
+                copy = retry_while_locked(ItemRequest.objects.get, id=item_request.id)
+                barrier.wait()
+                try:
+                    retry_while_locked(copy.claim, user, fulfiller_character)
+                    outcome = user.id
+                except ValueError:
+                    outcome = None
+                with lock:
+                    results.append(outcome)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=fulfiller) for fulfiller in fulfillers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        winners = [result for result in results if result is not None]
+        self.assertEqual(len(results), len(fulfillers))
+        self.assertEqual(len(winners), 1)
+        item_request.refresh_from_db()
+        self.assertEqual(item_request.fulfiller_id, winners[0])
+        self.assertEqual(RequestCounter.objects.counts_for(requester), {'pending': 0, 'claimed': 1})
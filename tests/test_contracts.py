@@ -0,0 +1,94 @@
+"""Test the ESI contract sweep"""
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from allianceauth.eveonline.models import EveCharacter
+from shopping_cart.contracts import sweep_active_contracts
+from shopping_cart.models import ItemRequest, StatusTransition
+from shopping_cart.providers import ContractsResponse
+
+class FakeEsiContractClient:
+    def __init__(self, contracts_by_character, expires_in=0):
+        self.contracts_by_character = contracts_by_character
+        self.expires_in = expires_in
+        self.calls = []
+
+    def get_character_contracts(self, character_id, etag=None):
+        self.calls.append((character_id, etag))
+        expires = timezone.now() + timedelta(seconds=self.expires_in)
+        new_etag = f'"{character_id}-v1"'
+        if etag == new_etag:
+            return ContractsResponse(None, etag, expires, True)
+        return ContractsResponse(self.contracts_by_character.get(character_id, []), new_etag, expires, False)
+
+class ContractSweepTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='requester', password='testpass')
+        self.character = EveCharacter.objects.create(
+            character_id=1001, character_name='Requester', corporation_id=2001,
+            corporation_name='Corp', corporation_ticker='CORP',
+        )
+        self.other_character = EveCharacter.objects.create(
+            character_id=1002, character_name='Other', corporation_id=2001,
+            corporation_name='Corp', corporation_ticker='CORP',
+        )
+
+    def _make_request(self, contract_id, character, status=ItemRequest.STATUS_CONTRACT_CREATED):
+        return ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 1}], user=self.user, character=self.character,
+            pickup_location='Jita', delivery_location='Amarr', status=status,
+            contract_id=contract_id, esi_monitor_character=character,
+        )
+
+    def test_sweep_fetches_once_per_character(self):
+        accepted_at = timezone.now() - timedelta(hours=1)
+        completed_at = timezone.now()
+        first = self._make_request(1, self.character)
+        second = self._make_request(2, self.character)
+        third = self._make_request(3, self.other_character)
+        client = FakeEsiContractClient({
+            1001: [
+                {'contract_id': 1, 'status': 'in_progress', 'date_accepted': accepted_at},
+                {'contract_id': 2, 'status': 'finished', 'date_accepted': accepted_at, 'date_completed': completed_at},
+            ],
+            1002: [{'contract_id': 3, 'status': 'outstanding'}],
+        })
+
+        self.assertEqual(sweep_active_contracts(client), 2)
+        self.assertEqual(sorted(c[0] for c in client.calls), [1001, 1002])
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        third.refresh_from_db()
+        self.assertEqual(first.status, ItemRequest.STATUS_CONTRACT_ACCEPTED)
+        self.assertEqual(first.contract_accepted_at, accepted_at)
+        self.assertEqual(second.status, ItemRequest.STATUS_COMPLETED)
+        self.assertEqual(second.contract_completed_at, completed_at)
+        self.assertEqual(third.status, ItemRequest.STATUS_CONTRACT_CREATED)
+        self.assertEqual(
+            list(StatusTransition.objects.values_list('request_id', 'version', 'new_status')),
+            [(first.id, 1, ItemRequest.STATUS_CONTRACT_ACCEPTED), (second.id, 1, ItemRequest.STATUS_COMPLETED)],
+        )
+
+    def test_sweep_never_moves_status_backwards(self):
+        item_request = self._make_request(1, self.character, status=ItemRequest.STATUS_CONTRACT_ACCEPTED)
+        client = FakeEsiContractClient({1001: [{'contract_id': 1, 'status': 'outstanding'}]})
+        self.assertEqual(sweep_active_contracts(client), 0)
+        item_request.refresh_from_db()
+        self.assertEqual(item_request.status, ItemRequest.STATUS_CONTRACT_ACCEPTED)
+
+    def test_sweep_honors_expires_and_etag(self):
+        self._make_request(1, self.character)
+        client = FakeEsiContractClient({1001: [{'contract_id': 1, 'status': 'outstanding'}]}, expires_in=300)
+        sweep_active_contracts(client)
+        sweep_active_contracts(client)
+        self.assertEqual(client.calls, [(1001, None)])
+
+        client.expires_in = 0
+        cache.clear()
+        sweep_active_contracts(client)
+        sweep_active_contracts(client)
+        self.assertEqual(client.calls, [(1001, None), (1001, None), (1001, '"1001-v1"')])
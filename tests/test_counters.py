@@ -0,0 +1,58 @@
+"""Test the denormalized request counters"""
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from shopping_cart.models import ItemRequest, RequestCounter
+from .utils import create_user
+
+class RequestCounterTestCase(TestCase):
+    def setUp(self):
+        self.requester, self.character = create_user('requester', 1001)
+        self.fulfiller, self.fulfiller_character = create_user('fulfiller', 1002)
+        self.fulfiller.is_superuser = True
+        self.fulfiller.save()
+
+    def _make_request(self):
+        return ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 1}], user=self.requester, character=self.character,
+            pickup_location='Jita', delivery_location='Amarr',
+        )
+
+    def test_counters_follow_status_changes(self):
+        first = self._make_request()
+        second = self._make_request()
+        third = self._make_request()
+        first.claim(self.fulfiller, self.fulfiller_character)
+        first.set_contract_created(123, ItemRequest.CONTRACT_ISSUER_REQUESTER)
+        second.cancel()
+
+        expected = {'pending': 1, 'contract_created': 1, 'cancelled': 1, 'claimed': 0}
+        self.assertEqual(RequestCounter.objects.counts_for(self.requester), expected)
+        self.assertEqual(RequestCounter.objects.counts_for(), expected)
+        self.assertEqual(RequestCounter.objects.counts_for(self.fulfiller), {})
+        self.assertEqual(third.status, ItemRequest.STATUS_PENDING)
+
+    def test_rebuild_matches_incremental_counters(self):
+        self._make_request().cancel()
+        self._make_request()
+        incremental = RequestCounter.objects.counts_for(self.requester)
+        RequestCounter.objects.all().delete()
+        call_command('shopping_cart_rebuild_counters', stdout=StringIO())
+        rebuilt = RequestCounter.objects.counts_for(self.requester)
+        self.assertEqual({k: v for k, v in incremental.items() if v}, rebuilt)
+        self.assertEqual(RequestCounter.objects.counts_for(), rebuilt)
+
+    def test_index_and_dashboard_read_counters(self):
+        self._make_request().cancel()
+        self._make_request()
+        self.client.force_login(self.requester)
+        self.requester.is_superuser = True
+        self.requester.save()
+        response = self.client.get(reverse('shopping_cart:index'))
+        self.assertEqual(response.context['total_requests'], 2)
+        self.assertEqual(response.context['active_requests'], 1)
+        self.assertEqual(response.context['completed_requests'], 0)
+        response = self.client.get(reverse('shopping_cart:admin_dashboard'))
+        self.assertEqual(response.context['total_requests'], 2)
+        self.assertEqual(response.context['pending_requests'], 1)
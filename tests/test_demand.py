@@ -0,0 +1,132 @@
+"""Test demand aggregation and its streaming exports"""
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from shopping_cart.demand import demand_rows, iter_csv, truncate_date
+from shopping_cart.models import ItemRequest
+from shopping_cart.retention import archive_closed_requests
+from .utils import create_user
+
+def at(year, month, day):
+    return timezone.make_aware(datetime(year, month, day, 12))
+
+class DemandTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user, self.character = create_user('requester', 1001)
+        self.user.is_superuser = True
+        self.user.save()
+
+    def _request(self, items, created_at, pickup='Jita', cancel=False):
+        item_request = ItemRequest.objects.create_with_items(
+            items, user=self.user, character=self.character, pickup_location=pickup, delivery_location='Amarr',
+        )
+        if cancel:
+            item_request.cancel()
+        ItemRequest.objects.filter(id=item_request.id).update(created_at=created_at)
+        return item_request
+
+    def _seed(self):
+        self._request([{'name': 'Tritanium', 'type_id': 34, 'quantity': 100}, {'name': 'Pyerite', 'type_id': 35, 'quantity': 5}], at(2026, 1, 5))
+        self._request([{'name': 'Tritanium', 'type_id': 34, 'quantity': 50}], at(2026, 1, 20))
+        self._request([{'name': 'Tritanium', 'type_id': 34, 'quantity': 7}], at(2026, 2, 2), pickup='Amarr')
+        self._request([{'name': 'Tritanium', 'type_id': 34, 'quantity': 1}], at(2025, 12, 31), cancel=True)
+
+    def test_groups_by_month_hub_and_item(self):
+        self._seed()
+        rows = list(demand_rows(bucket='month', group_by=['bucket', 'hub', 'item']))
+        self.assertEqual(
+            [(str(row['bucket']), row['hub'], row['item'], row['quantity'], row['requests']) for row in rows],
+            [
+                ('2025-12-01', 'Jita', 'Tritanium', 1, 1),
+                ('2026-01-01', 'Jita', 'Tritanium', 150, 2),
+                ('2026-01-01', 'Jita', 'Pyerite', 5, 1),
+                ('2026-02-01', 'Amarr', 'Tritanium', 7, 1),
+            ],
+        )
+
+    def test_filters_and_status_dimension(self):
+        self._seed()
+        rows = list(demand_rows(since=at(2025, 12, 1), until=at(2026, 1, 31), group_by=['status', 'item']))
+        self.assertEqual(
+            {(row['status'], row['item']): row['quantity'] for row in rows},
+            {
+                (ItemRequest.STATUS_CANCELLED, 'Tritanium'): 1,
+                (ItemRequest.STATUS_PENDING, 'Pyerite'): 5,
+                (ItemRequest.STATUS_PENDING, 'Tritanium'): 150,
+            },
+        )
+
+    def test_archived_requests_are_merged(self):
+        self._request([{'name': 'Tritanium', 'type_id': 34, 'quantity': 40}], at(2020, 3, 3), cancel=True)
+        self._request([{'name': 'Mexallon', 'type_id': 36, 'quantity': 2}], at(2020, 3, 4), cancel=True)
+        archive_closed_requests(days=60, batch_size=10)
+        self._request([{'name': 'Tritanium', 'type_id': 34, 'quantity': 2}], at(2020, 3, 9))
+
+        live_only = list(demand_rows(group_by=['bucket', 'item'], include_archived=False))
+        self.assertEqual([(row['item'], row['quantity']) for row in live_only], [('Tritanium', 2)])
+        rows = list(demand_rows(group_by=['bucket', 'item']))
+        self.assertEqual(
+            [(str(row['bucket']), row['item'], row['quantity'], row['requests']) for row in rows],
+            [('2020-03-01', 'Tritanium', 42, 2), ('2020-03-01', 'Mexallon', 2, 1)],
+        )
+
+    def test_truncate_date_matches_week_start(self):
+        self.assertEqual(str(truncate_date(at(2026, 10, 18), 'week')), '2026-10-12')
+        self.assertEqual(str(truncate_date(at(2026, 10, 18), 'month')), '2026-10-01')
+
+    def test_csv_export_view_streams(self):
+        self._seed()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('shopping_cart:demand_export'), {
+            'since': '2026-01-01', 'until': '2026-01-31', 'group_by': ['item'], 'format': 'csv',
+        })
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows, [
+            {'type_id': '34', 'item': 'Tritanium', 'quantity': '150', 'requests': '2'},
+            {'type_id': '35', 'item': 'Pyerite', 'quantity': '5', 'requests': '1'},
+        ])
+        bad = self.client.get(reverse('shopping_cart:demand_export'), {'since': '2026-02-01', 'until': '2026-01-01'})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_dashboard_shows_top_items(self):
+        self._request([{'name': 'Tritanium', 'type_id': 34, 'quantity': 3}], timezone.now())
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('shopping_cart:admin_dashboard'))
+        self.assertEqual([item['name'] for item in response.context['top_items']], ['Tritanium'])
+        self.assertContains(response, reverse('shopping_cart:demand_export'))
+        # Later loads reuse the cached aggregation
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('shopping_cart:admin_dashboard'))
+        self.assertEqual([item['name'] for item in response.context['top_items']], ['Tritanium'])
+        self.assertFalse(any('shopping_cart_requestitem' in query['sql'] for query in queries))
+
+    def test_management_command_writes_jsonl(self):
+        self._seed()
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        call_command('shopping_cart_demand_report', '--format', 'jsonl', '--bucket', 'week', '--group-by', 'bucket,hub',
+                     '--since', '2026-01-01', '--output', path, stdout=io.StringIO())
+        with open(path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(rows, [
+            {'bucket': '2026-01-05', 'hub': 'Jita', 'quantity': 105, 'requests': 1},
+            {'bucket': '2026-01-19', 'hub': 'Jita', 'quantity': 50, 'requests': 1},
+            {'bucket': '2026-02-02', 'hub': 'Amarr', 'quantity': 7, 'requests': 1},
+        ])
+
+    def test_csv_header_follows_dimensions(self):
+        self.assertEqual(next(iter_csv([], ['hub', 'bucket'])), 'bucket,hub,quantity,requests\r\n')
@@ -0,0 +1,70 @@
+"""Test per-object fragment caching"""
+from unittest import mock
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import TestCase
+from django.urls import reverse
+from shopping_cart import app_settings, fragments
+from shopping_cart.models import ItemRequest
+from .utils import create_user
+
+class FragmentCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.requester, self.character = create_user('requester', 1001)
+        self.fulfiller, _ = create_user('fulfiller', 1002)
+        self.fulfiller.is_superuser = True
+        self.fulfiller.save()
+        self.client.force_login(self.fulfiller)
+        self.item_requests = [
+            ItemRequest.objects.create_with_items(
+                [{'name': 'Tritanium', 'quantity': i + 1}], user=self.requester, character=self.character,
+                pickup_location='Jita', delivery_location='Amarr', requester_price=1_000_000,
+            )
+            for i in range(5)
+        ]
+
+    def _rendered_ids(self, url):
+        with mock.patch.object(fragments, 'render_to_string', wraps=render_to_string) as render:
+            response = self.client.get(url)
+        return response, sorted(call.args[1]['item_request'].id for call in render.call_args_list)
+
+    def test_only_changed_rows_are_rendered(self):
+        url = reverse('shopping_cart:marketplace')
+        response, rendered = self._rendered_ids(url)
+        self.assertEqual(rendered, sorted(item_request.id for item_request in self.item_requests))
+
+        changed = self.item_requests[2]
+        changed.requester_price = 9_000_000
+        changed.save()
+        response, rendered = self._rendered_ids(url)
+        self.assertEqual(rendered, [changed.id])
+        self.assertContains(response, '9,000,000 ISK')
+        self.assertContains(response, 'data-request-id', count=5)
+
+    def test_detail_body_is_cached_until_saved(self):
+        item_request = self.item_requests[0]
+        url = reverse('shopping_cart:request_detail', args=[item_request.id])
+        cold = self.client.get(url).shopping_cart_metrics.queries
+        warm = self.client.get(url)
+        self.assertLess(warm.shopping_cart_metrics.queries, cold)
+        self.assertContains(warm, 'Tritanium')
+
+        item_request.description = 'Deliver before downtime'
+        item_request.save()
+        self.assertContains(self.client.get(url), 'Deliver before downtime')
+
+    def test_disabled_cache_always_renders(self):
+        with mock.patch.object(app_settings, 'SHOPPING_CART_FRAGMENT_CACHE_SECONDS', 0):
+            self._rendered_ids(reverse('shopping_cart:marketplace'))
+            _, rendered = self._rendered_ids(reverse('shopping_cart:marketplace'))
+        self.assertEqual(len(rendered), 5)
+
+    def test_key_depends_on_language_and_version(self):
+        item_request = self.item_requests[0]
+        key = fragments.fragment_key('row.html', item_request)
+        with mock.patch.object(fragments.translation, 'get_language', return_value='de'):
+            self.assertNotEqual(fragments.fragment_key('row.html', item_request), key)
+        item_request.save()
+        self.assertNotEqual(fragments.fragment_key('row.html', item_request), key)
+        self.assertIsNone(fragments.fragment_key('row.html', ItemRequest()))
@@ -0,0 +1,112 @@
+"""Test Shopping Cart helpers"""
+from unittest import mock
+from django.test import SimpleTestCase
+from shopping_cart import helpers
+from shopping_cart.helpers import (
+    PASTE_FORMAT_CONTRACT, PASTE_FORMAT_EFT, PASTE_FORMAT_INVENTORY, PASTE_FORMAT_MULTIBUY,
+    detect_paste_format, format_isk, items_hash, parse_eve_items,
+)
+
+INVENTORY_PASTE = (
+    "Tritanium\t1,000\tMineral\t\t\t10 m3\t5,000.00 ISK\n"
+    "Rifter\t\tFrigate\t\t\t2,500 m3\t500,000.00 ISK\n"
+    "Tritanium\t500\tMineral\t\t\t5 m3\t2,500.00 ISK\n"
+)
+
+CONTRACT_PASTE = "Pyerite\t250\tMineral\tMaterial\t\nMexallon\t10\tMineral\tMaterial\t\n"
+
+MULTIBUY_PASTE = "Tritanium x1,000\nPyerite 500\n\nTritanium x200\n"
+
+EFT_PASTE = """[Rifter, Tackle]
+Damage Control I
+[Empty Low slot]
+
+200mm AutoCannon I, EMP S
+200mm AutoCannon I, EMP S
+
+Hobgoblin I x2
+"""
+
+class ParseEveItemsTestCase(SimpleTestCase):
+    def test_detects_formats(self):
+        self.assertEqual(detect_paste_format(INVENTORY_PASTE), PASTE_FORMAT_INVENTORY)
+        self.assertEqual(detect_paste_format(CONTRACT_PASTE), PASTE_FORMAT_CONTRACT)
+        self.assertEqual(detect_paste_format(MULTIBUY_PASTE), PASTE_FORMAT_MULTIBUY)
+        self.assertEqual(detect_paste_format(EFT_PASTE), PASTE_FORMAT_EFT)
+        self.assertIsNone(detect_paste_format("\n  \n"))
+
+    def test_inventory_paste_merges_duplicates(self):
+        self.assertEqual(parse_eve_items(INVENTORY_PASTE), [
+            {"name": "Tritanium", "quantity": 1500},
+            {"name": "Rifter", "quantity": 1},
+        ])
+
+    def test_contract_paste(self):
+        self.assertEqual(parse_eve_items(CONTRACT_PASTE), [
+            {"name": "Pyerite", "quantity": 250},
+            {"name": "Mexallon", "quantity": 10},
+        ])
+
+    def test_multibuy_paste(self):
+        self.assertEqual(parse_eve_items(MULTIBUY_PASTE), [
+            {"name": "Tritanium", "quantity": 1200},
+            {"name": "Pyerite", "quantity": 500},
+        ])
+
+    def test_eft_paste(self):
+        self.assertEqual(parse_eve_items(EFT_PASTE), [
+            {"name": "Rifter", "quantity": 1},
+            {"name": "Damage Control I", "quantity": 1},
+            {"name": "200mm AutoCannon I", "quantity": 2},
+            {"name": "Hobgoblin I", "quantity": 2},
+        ])
+
+    def test_mixed_lines_fall_back(self):
+        self.assertEqual(parse_eve_items("Tritanium x1,000\nPyerite\t500\nMexallon 250"), [
+            {"name": "Tritanium", "quantity": 1000},
+            {"name": "Pyerite", "quantity": 500},
+            {"name": "Mexallon", "quantity": 250},
+        ])
+
+    def test_unparsable_lines_are_skipped(self):
+        self.assertEqual(parse_eve_items("just some text\nTritanium 5"), [{"name": "Tritanium", "quantity": 5}])
+
+    def test_format_isk(self):
+        self.assertEqual(format_isk(1000000), "1,000,000 ISK")
+        self.assertEqual(format_isk(None), "0 ISK")
+
+class ParseCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        helpers._parse_cache.clear()
+
+    def test_repeat_paste_skips_parsing(self):
+        first = parse_eve_items(EFT_PASTE)
+        with mock.patch.object(helpers, 'iter_eve_items') as iter_eve_items:
+            second = parse_eve_items(EFT_PASTE)
+        iter_eve_items.assert_not_called()
+        self.assertEqual(second, first)
+        # Callers get their own dicts, so changing one cannot poison the cache
+        second[0]['quantity'] = 0
+        self.assertEqual(parse_eve_items(EFT_PASTE), first)
+
+    def test_least_recently_used_paste_is_evicted(self):
+        with mock.patch.object(helpers, 'PARSE_CACHE_SIZE', 2):
+            parse_eve_items('Tritanium 1')
+            parse_eve_items('Tritanium 2')
+            parse_eve_items('Tritanium 1')
+            parse_eve_items('Tritanium 3')
+        self.assertEqual(
+            [parsed for parsed in helpers._parse_cache.values()], [(('Tritanium', 1),), (('Tritanium', 3),)],
+        )
+
+class ItemsHashTestCase(SimpleTestCase):
+    def test_hash_ignores_order_and_stack_splits(self):
+        self.assertEqual(
+            items_hash([{'name': 'Tritanium', 'type_id': 34, 'quantity': 10}, {'name': 'Widget', 'quantity': 2}]),
+            items_hash([{'name': ' widget', 'quantity': 2}, {'name': 'Tritanium', 'type_id': 34, 'quantity': 4},
+                        {'name': 'Tritanium', 'type_id': 34, 'quantity': 6}]),
+        )
+        self.assertNotEqual(
+            items_hash([{'name': 'Tritanium', 'type_id': 34, 'quantity': 10}]),
+            items_hash([{'name': 'Tritanium', 'type_id': 34, 'quantity': 11}]),
+        )
@@ -0,0 +1,64 @@
+"""Test per-view query and timing instrumentation"""
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from shopping_cart import app_settings
+from shopping_cart.instrumentation import registry
+from shopping_cart.models import ItemRequest
+from .utils import assert_query_budget, create_user
+
+class InstrumentationTestCase(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.user, self.character = create_user('fulfiller', 1001)
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        requester, character = create_user('requester', 1002)
+        for i in range(5):
+            ItemRequest.objects.create_with_items(
+                [{'name': 'Tritanium', 'quantity': i + 1}], user=requester, character=character,
+                pickup_location='Jita', delivery_location='Amarr',
+            )
+
+    def test_views_stay_within_query_budget(self):
+        budgets = {
+            'shopping_cart:index': 12,
+            'shopping_cart:marketplace': 12,
+            'shopping_cart:my_requests': 12,
+            'shopping_cart:leaderboard': 12,
+        }
+        for name, budget in budgets.items():
+            assert_query_budget(self, reverse(name), budget)
+
+    def test_budget_helper_fails_over_budget(self):
+        with self.assertRaises(AssertionError):
+            assert_query_budget(self, reverse('shopping_cart:marketplace'), 1)
+
+    @mock.patch.object(app_settings, 'SHOPPING_CART_SERVER_TIMING', True)
+    @mock.patch.object(app_settings, 'SHOPPING_CART_METRICS_LOG', True)
+    def test_metrics_are_recorded_and_logged(self):
+        with self.assertLogs('shopping_cart.instrumentation', 'INFO') as logs:
+            response = self.client.get(reverse('shopping_cart:marketplace'))
+        metrics = response.shopping_cart_metrics
+        self.assertGreater(metrics.queries, 0)
+        self.assertGreater(metrics.total_time, 0)
+        self.assertGreater(metrics.render_time, 0)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('view=marketplace queries=', logs.output[0])
+        self.assertEqual(registry.snapshot()['marketplace']['requests'], 1)
+
+    @mock.patch.object(app_settings, 'SHOPPING_CART_METRICS_TOKEN', 'secret')
+    def test_prometheus_export(self):
+        self.client.get(reverse('shopping_cart:marketplace'))
+        self.client.logout()
+        url = reverse('shopping_cart:metrics')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE shopping_cart_view_queries_total counter', body)
+        self.assertIn('shopping_cart_view_requests_total{view="marketplace"} 1', body)
+
+    def test_metrics_endpoint_hidden_without_token(self):
+        self.assertEqual(self.client.get(reverse('shopping_cart:metrics')).status_code, 404)
@@ -0,0 +1,76 @@
+"""Test fulfiller stats and leaderboards"""
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from shopping_cart.contracts import sweep_active_contracts
+from shopping_cart.leaderboard import refresh_leaderboards
+from shopping_cart.models import FulfillmentTracking, ItemRequest, LeaderboardEntry
+from .test_contracts import FakeEsiContractClient
+from .utils import create_user
+
+class LeaderboardTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.requester, self.character = create_user('requester', 1001)
+        self.alice, self.alice_character = create_user('alice', 1002)
+        self.bob, self.bob_character = create_user('bob', 1003)
+        for user in (self.requester, self.alice, self.bob):
+            user.is_superuser = True
+            user.save()
+
+    def _completed_request(self, fulfiller, value, completed_days_ago):
+        item_request = ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 1}], user=self.requester, character=self.character,
+            pickup_location='Jita', delivery_location='Amarr', requester_price=value,
+        )
+        ItemRequest.objects.filter(id=item_request.id).update(
+            status=ItemRequest.STATUS_COMPLETED, fulfiller=fulfiller,
+            contract_completed_at=timezone.now() - timedelta(days=completed_days_ago),
+        )
+        FulfillmentTracking.objects.record_completions([(fulfiller.id, value, timezone.now())])
+
+    def test_sweep_updates_fulfiller_stats(self):
+        item_request = ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 1}], user=self.requester, character=self.character,
+            pickup_location='Jita', delivery_location='Amarr', requester_price=1000,
+        )
+        item_request.claim(self.alice, self.alice_character)
+        item_request.set_contract_created(55, ItemRequest.CONTRACT_ISSUER_REQUESTER)
+        completed_at = timezone.now()
+        sweep_active_contracts(FakeEsiContractClient({1001: [
+            {'contract_id': 55, 'status': 'finished', 'date_completed': completed_at},
+        ]}))
+        stats = FulfillmentTracking.objects.get(user=self.alice)
+        self.assertEqual(stats.total_fulfilled, 1)
+        self.assertEqual(stats.total_volume, 1000)
+        self.assertEqual(stats.last_fulfilled, completed_at)
+
+    def test_rankings_per_window_and_metric(self):
+        self._completed_request(self.alice, 100, 1)
+        self._completed_request(self.alice, 100, 20)
+        self._completed_request(self.alice, 100, 60)
+        self._completed_request(self.bob, 5000, 2)
+
+        refresh_leaderboards()
+
+        def ranking(window, metric):
+            return list(LeaderboardEntry.objects.filter(window=window, metric=metric).values_list('user__username', 'total_fulfilled', 'total_volume'))
+
+        self.assertEqual(ranking('all', 'count'), [('alice', 3, 300), ('bob', 1, 5000)])
+        self.assertEqual(ranking('all', 'isk'), [('bob', 1, 5000), ('alice', 3, 300)])
+        self.assertEqual(ranking('30d', 'count'), [('alice', 2, 200), ('bob', 1, 5000)])
+        self.assertEqual(ranking('7d', 'count'), [('bob', 1, 5000), ('alice', 1, 100)])
+
+    def test_view_reads_materialized_rankings(self):
+        self._completed_request(self.bob, 5000, 2)
+        refresh_leaderboards()
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('shopping_cart:leaderboard'), {'window': '7d', 'metric': 'isk'})
+        self.assertEqual([entry.user.username for entry in response.context['top_fulfillers']], ['bob'])
+        self.assertContains(response, '<td>bob</td>', html=False)
+        self.assertContains(response, '5,000 ISK')
+        self.assertContains(response, 'href="?window=30d&amp;metric=isk"')
+        response = self.client.get(reverse('shopping_cart:leaderboard'), {'window': 'bogus'})
+        self.assertEqual(response.context['window'], 'all')
@@ -0,0 +1,102 @@
+"""Test the live marketplace change feed"""
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from shopping_cart import app_settings, live
+from shopping_cart.live import ChangeFeed, publish
+from shopping_cart.models import ItemRequest
+from .utils import create_user
+
+class ChangeFeedTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_events_reach_other_processes(self):
+        publisher, listener = ChangeFeed(poll_interval=0), ChangeFeed(poll_interval=0)
+        start = listener.latest()
+        self.assertEqual(listener.events_after(start, timeout=0.05), [])
+        publisher_sequence = publish({'type': 'new', 'id': 1, 'user_id': 1})
+        events = listener.events_after(start, timeout=1)
+        self.assertEqual(events, [(publisher_sequence, {'type': 'new', 'id': 1, 'user_id': 1})])
+        # Already delivered events are served from the shared buffer
+        self.assertEqual(listener.events_after(start, timeout=0), events)
+
+    def test_sequence_without_event_is_not_skipped(self):
+        listener = ChangeFeed(poll_interval=0)
+        start = listener.latest()
+        # A publisher between its incr and its set
+        cache.add(live.SEQUENCE_KEY, 0, None)
+        sequence = cache.incr(live.SEQUENCE_KEY)
+        self.assertEqual(listener.events_after(start, timeout=0.05), [])
+        self.assertEqual(listener.latest(), start)
+        cache.set(live.EVENT_KEY.format(sequence), {'type': 'new', 'id': 1, 'user_id': 1}, live.EVENT_TIMEOUT)
+        self.assertEqual(listener.events_after(start, timeout=1), [(sequence, {'type': 'new', 'id': 1, 'user_id': 1})])
+
+    def test_lost_event_is_skipped_after_timeout(self):
+        listener = ChangeFeed(poll_interval=0)
+        start = listener.latest()
+        cache.add(live.SEQUENCE_KEY, 0, None)
+        cache.incr(live.SEQUENCE_KEY)
+        following = publish({'type': 'new', 'id': 2, 'user_id': 1})
+        self.assertEqual(listener.events_after(start, timeout=0.05), [])
+        with mock.patch.object(live, 'GAP_TIMEOUT', 0):
+            self.assertEqual(listener.events_after(start, timeout=1), [(following, {'type': 'new', 'id': 2, 'user_id': 1})])
+
+@mock.patch.object(app_settings, 'SHOPPING_CART_LIVE_POLL_INTERVAL', 0)
+class LiveMarketplaceTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        live._feed = None
+        self.requester, self.character = create_user('requester', 1001)
+        self.fulfiller, self.fulfiller_character = create_user('fulfiller', 1002)
+        self.fulfiller.is_superuser = True
+        self.fulfiller.save()
+        self.client.force_login(self.fulfiller)
+
+    def tearDown(self):
+        live._feed = None
+
+    def _create(self, user, character):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ItemRequest.objects.create_with_items(
+                [{'name': 'Tritanium', 'quantity': 1}], user=user, character=character,
+                pickup_location='Jita', delivery_location='Amarr',
+            )
+
+    def test_long_poll_reports_new_and_claimed_requests(self):
+        url = reverse('shopping_cart:live_marketplace_poll')
+        position = self.client.get(url).json()['last']
+        item_request = self._create(self.requester, self.character)
+        data = self.client.get(url, {'after': position}).json()
+        self.assertEqual(data['events'], [{'type': 'new', 'id': item_request.id, 'sequence': data['last']}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item_request.claim(self.fulfiller, self.fulfiller_character)
+        data = self.client.get(url, {'after': data['last']}).json()
+        self.assertEqual(data['events'][0]['type'], 'removed')
+        self.assertEqual(data['events'][0]['status'], ItemRequest.STATUS_CLAIMED)
+
+    @mock.patch.object(app_settings, 'SHOPPING_CART_LIVE_UPDATES', False)
+    def test_disabled_setting_turns_the_feed_off(self):
+        self.assertNotContains(self.client.get(reverse('shopping_cart:marketplace')), 'data-shopping-cart-live')
+        self.assertEqual(self.client.get(reverse('shopping_cart:live_marketplace')).status_code, 404)
+        self.assertEqual(self.client.get(reverse('shopping_cart:live_marketplace_poll')).status_code, 404)
+
+    def test_own_new_requests_are_hidden(self):
+        url = reverse('shopping_cart:live_marketplace_poll')
+        position = self.client.get(url).json()['last']
+        self._create(self.fulfiller, self.fulfiller_character)
+        data = self.client.get(url, {'after': position}).json()
+        self.assertEqual(data['events'], [])
+        self.assertGreater(data['last'], position)
+
+    @mock.patch.object(app_settings, 'SHOPPING_CART_LIVE_STREAM_SECONDS', 0.3)
+    def test_server_sent_events(self):
+        position = live.get_feed().latest()
+        item_request = self._create(self.requester, self.character)
+        response = self.client.get(reverse('shopping_cart:live_marketplace'), HTTP_LAST_EVENT_ID=str(position))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('retry: 3000'))
+        self.assertIn(f'id: {position + 1}\nevent: new\ndata: {{"type": "new", "id": {item_request.id}}}', body)
@@ -0,0 +1,85 @@
+"""Test Shopping Cart data migrations"""
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+from shopping_cart.helpers import items_hash, trade_hub_for
+
+class MigrationTestCase(TransactionTestCase):
+    """Runs each test with the database at migrate_from, with a user and a
+    character to own requests, and migrates back to the latest state afterwards"""
+    migrate_from = None
+    migrate_to = None
+
+    def migrate(self, targets):
+        """Migrate to targets and return the apps of that project state"""
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        self.apps = self.migrate(self.migrate_from)
+        self.user = self.apps.get_model('auth', 'User').objects.create(username='requester')
+        self.character = self.apps.get_model('eveonline', 'EveCharacter').objects.create(
+            character_id=1001, character_name='Requester', corporation_id=2001,
+            corporation_name='Corp', corporation_ticker='CORP',
+        )
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+class BackfillRequestItemsTestCase(MigrationTestCase):
+    migrate_from = [('shopping_cart', '0002_requestitem')]
+    migrate_to = [('shopping_cart', '0003_backfill_request_items')]
+
+    def test_items_list_is_copied_into_request_items(self):
+        item_request = self.apps.get_model('shopping_cart', 'ItemRequest').objects.create(
+            user=self.user, character=self.character, pickup_location='Jita', delivery_location='Amarr',
+            items_list=[{'name': 'Tritanium', 'quantity': 10}, {'name': 'Pyerite', 'quantity': 5}, {'name': ''}],
+        )
+
+        RequestItem = self.migrate(self.migrate_to).get_model('shopping_cart', 'RequestItem')
+        self.assertEqual(
+            list(RequestItem.objects.filter(request_id=item_request.id).order_by('id').values_list('name', 'quantity')),
+            [('Tritanium', 10), ('Pyerite', 5)],
+        )
+
+class PopulateHubsTestCase(MigrationTestCase):
+    migrate_from = [('shopping_cart', '0010_archived_request')]
+    migrate_to = [('shopping_cart', '0011_request_hubs')]
+
+    def test_hubs_match_helper(self):
+        ItemRequest = self.apps.get_model('shopping_cart', 'ItemRequest')
+        locations = [('  jita IV - Moon 4', 'Amarr VIII'), ('Dodixie', 'Some Citadel'), ('Home', 'Away')]
+        ids = [
+            ItemRequest.objects.create(
+                user=self.user, character=self.character, pickup_location=pickup, delivery_location=delivery,
+            ).id
+            for pickup, delivery in locations
+        ]
+
+        ItemRequest = self.migrate(self.migrate_to).get_model('shopping_cart', 'ItemRequest')
+        self.assertEqual(
+            [tuple(ItemRequest.objects.filter(id=request_id).values_list('pickup_hub', 'delivery_hub').get()) for request_id in ids],
+            [(trade_hub_for(pickup), trade_hub_for(delivery)) for pickup, delivery in locations],
+        )
+
+class PopulateItemsHashTestCase(MigrationTestCase):
+    migrate_from = [('shopping_cart', '0011_request_hubs')]
+    migrate_to = [('shopping_cart', '0012_request_items_hash')]
+
+    def test_items_hash_matches_helper(self):
+        RequestItem = self.apps.get_model('shopping_cart', 'RequestItem')
+        item_request = self.apps.get_model('shopping_cart', 'ItemRequest').objects.create(
+            user=self.user, character=self.character, pickup_location='Jita', delivery_location='Amarr',
+        )
+        RequestItem.objects.create(request=item_request, type_id=34, name='Tritanium', quantity=10)
+        RequestItem.objects.create(request=item_request, name='Widget', quantity=2)
+
+        ItemRequest = self.migrate(self.migrate_to).get_model('shopping_cart', 'ItemRequest')
+        self.assertEqual(
+            ItemRequest.objects.get(id=item_request.id).items_hash,
+            items_hash([{'name': 'Tritanium', 'type_id': 34, 'quantity': 10}, {'name': 'Widget', 'quantity': 2}]),
+        )
@@ -2,6 +2,7 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
 from shopping_cart.models import ItemRequest
+from .utils import create_user
 
 class ItemRequestTestCase(TestCase):
     def setUp(self):
@@ -10,3 +11,49 @@ class ItemRequestTestCase(TestCase):
     def test_item_request_creation(self):
         # Add actual tests here
         self.assertTrue(True)  # Placeholder
+
+class RequestItemTestCase(TestCase):
+    def setUp(self):
+        self.user, self.character = create_user('requester', 1001)
+        self.items = [
+            {'name': 'Tritanium', 'quantity': 1000},
+            {'name': 'Pyerite', 'quantity': 500},
+            {'name': 'Mexallon', 'quantity': 250},
+            {'name': 'Isogen', 'quantity': 100, 'type_id': 37},
+        ]
+        self.item_request = ItemRequest.objects.create_with_items(
+            self.items, user=self.user, character=self.character,
+            pickup_location='Jita', delivery_location='Amarr',
+        )
+    
+    def test_create_with_items_keeps_order(self):
+        self.assertEqual(self.item_request.items_list, self.items)
+        self.assertEqual(str(self.item_request), f"#{self.item_request.id} - Tritanium x1000, Pyerite x500, Mexallon x250...")
+    
+    def test_totals_run_in_sql(self):
+        self.assertEqual(self.item_request.total_quantity, 1850)
+        self.assertEqual(self.item_request.total_items_count, 4)
+        annotated = ItemRequest.objects.with_item_totals().get(id=self.item_request.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(annotated.total_quantity, 1850)
+            self.assertEqual(annotated.total_items_count, 4)
+    
+    def test_wanting_item(self):
+        ItemRequest.objects.create_with_items(
+            [{'name': 'Pyerite', 'quantity': 1}], user=self.user, character=self.character,
+            pickup_location='Jita', delivery_location='Amarr',
+        )
+        self.assertEqual(list(ItemRequest.objects.wanting_item('Tritanium')), [self.item_request])
+        self.assertEqual(ItemRequest.objects.wanting_item('Pyerite').count(), 2)
+        self.assertEqual(list(ItemRequest.objects.wanting_item(type_id=37)), [self.item_request])
+    
+    def test_same_items_share_a_hash(self):
+        reordered = ItemRequest.objects.bulk_create_with_items(
+            [({'pickup_location': 'Amarr', 'delivery_location': 'Jita'}, list(reversed(self.items)))],
+            user=self.user, character=self.character,
+        )[0]
+        ItemRequest.objects.create_with_items(
+            self.items[:3], user=self.user, character=self.character, pickup_location='Jita', delivery_location='Amarr',
+        )
+        self.assertEqual(reordered.items_hash, self.item_request.items_hash)
+        self.assertEqual(list(ItemRequest.objects.with_same_items(self.item_request)), [reordered])
@@ -0,0 +1,154 @@
+"""Test the batched Discord notification outbox against a local webhook server"""
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from shopping_cart import app_settings, notifications
+from shopping_cart.models import ItemRequest, NotificationOutbox
+from shopping_cart.notifications import queue_notifications, send_pending_notifications
+from .utils import create_user
+
+class WebhookStub:
+    """Local stand-in for a Discord webhook. Records posted JSON and the client
+    connection it came in on, and answers with queued (status, headers, body)"""
+    def __init__(self):
+        self.posts = []
+        self.connections = []
+        self.responses = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                stub.posts.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                stub.connections.append(self.client_address)
+                status, headers, body = stub.responses.pop(0) if stub.responses else (204, {}, b'')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/webhook'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class NotificationOutboxTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.webhook = WebhookStub()
+        self.addCleanup(self.webhook.close)
+        patcher = mock.patch.object(app_settings, 'SHOPPING_CART_DISCORD_WEBHOOK_URL', self.webhook.url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._drop_session)
+        self.user, self.character = create_user('requester', 1001)
+        self.requests = [
+            ItemRequest.objects.create_with_items(
+                [{'name': 'Tritanium', 'quantity': i + 1}], user=self.user, character=self.character,
+                pickup_location='Jita', delivery_location='Amarr',
+            )
+            for i in range(3)
+        ]
+
+    def _drop_session(self):
+        if notifications._session is not None:
+            notifications._session.close()
+        notifications._session = None
+
+    @mock.patch('shopping_cart.notifications._schedule_dispatch')
+    def test_events_are_batched_into_one_post(self, schedule):
+        with self.captureOnCommitCallbacks(execute=True):
+            queue_notifications(NotificationOutbox.EVENT_NEW_REQUEST, self.requests)
+            queue_notifications(NotificationOutbox.EVENT_CLAIMED, self.requests[:1])
+        self.assertEqual(schedule.call_count, 2)
+
+        self.assertIsNone(send_pending_notifications())
+        self.assertEqual(len(self.webhook.posts), 1)
+        self.assertEqual(len(self.webhook.posts[0]['embeds']), 2)
+        self.assertFalse(NotificationOutbox.objects.filter(sent_at__isnull=True).exists())
+
+    @mock.patch('shopping_cart.notifications._schedule_dispatch')
+    def test_pooled_session_reuses_its_connection(self, schedule):
+        for item_request in self.requests[:2]:
+            queue_notifications(NotificationOutbox.EVENT_NEW_REQUEST, [item_request])
+            send_pending_notifications()
+        self.assertIs(notifications.get_session(), notifications.get_session())
+        self.assertEqual(len(self.webhook.posts), 2)
+        self.assertEqual(len(set(self.webhook.connections)), 1)
+
+    @mock.patch('shopping_cart.notifications._schedule_dispatch')
+    def test_overlapping_runs_post_each_row_once(self, schedule):
+        queue_notifications(NotificationOutbox.EVENT_NEW_REQUEST, self.requests)
+        session = notifications.get_session()
+        post = session.post
+        overlapping = []
+
+        def post_while_another_run_starts(*args, **kwargs):
+            if not overlapping:
+                # A second dispatch starts while the first is still posting
+                overlapping.append(send_pending_notifications())
+            return post(*args, **kwargs)
+
+        with mock.patch.object(session, 'post', side_effect=post_while_another_run_starts):
+            self.assertIsNone(send_pending_notifications())
+        self.assertEqual(len(self.webhook.posts), 1)
+        self.assertEqual(self.webhook.posts[0]['embeds'][0]['description'].count('Tritanium'), 3)
+        self.assertEqual(NotificationOutbox.objects.filter(sent_at__isnull=False).count(), 3)
+
+    @mock.patch('shopping_cart.notifications._schedule_dispatch')
+    def test_claim_is_queued_from_the_status_signal(self, schedule):
+        fulfiller, character = create_user('fulfiller', 1002)
+        fulfiller.is_superuser = True
+        fulfiller.save()
+        self.requests[0].claim(fulfiller, character)
+        self.assertEqual(
+            list(NotificationOutbox.objects.filter(event=NotificationOutbox.EVENT_CLAIMED).values_list('request_id', flat=True)),
+            [self.requests[0].id],
+        )
+
+    @mock.patch.object(app_settings, 'SHOPPING_CART_NOTIFY_ON_CLAIM', False)
+    def test_disabled_event_is_not_queued(self):
+        self.assertEqual(queue_notifications(NotificationOutbox.EVENT_CLAIMED, self.requests), 0)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    @mock.patch('shopping_cart.notifications._schedule_dispatch')
+    def test_rate_limit_defers_remaining_rows(self, schedule):
+        queue_notifications(NotificationOutbox.EVENT_NEW_REQUEST, self.requests)
+        self.webhook.responses.append((429, {'Retry-After': '12'}, b''))
+        self.assertEqual(send_pending_notifications(), 12.0)
+        pending = NotificationOutbox.objects.filter(sent_at__isnull=True)
+        self.assertEqual(pending.count(), 3)
+        self.assertTrue(all(row.next_attempt_at > timezone.now() + timedelta(seconds=10) for row in pending))
+        self.assertEqual(set(pending.values_list('attempts', flat=True)), {0})
+
+    @mock.patch('shopping_cart.notifications._schedule_dispatch')
+    def test_rate_limit_from_json_body(self, schedule):
+        queue_notifications(NotificationOutbox.EVENT_NEW_REQUEST, self.requests)
+        self.webhook.responses.append((429, {'Content-Type': 'application/json'}, b'{"retry_after": 3.5}'))
+        self.assertEqual(send_pending_notifications(), 3.5)
+
+    @mock.patch('shopping_cart.notifications._schedule_dispatch')
+    def test_failure_backs_off(self, schedule):
+        queue_notifications(NotificationOutbox.EVENT_NEW_REQUEST, self.requests)
+        self.webhook.responses.append((500, {}, b''))
+        self.assertGreater(send_pending_notifications(), 0)
+        self.assertEqual(set(NotificationOutbox.objects.values_list('attempts', flat=True)), {1})
+        # Nothing is due yet, so a second run posts nothing
+        send_pending_notifications()
+        self.assertEqual(len(self.webhook.posts), 1)
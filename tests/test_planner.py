@@ -0,0 +1,112 @@
+"""Test the fulfiller trip planner"""
+import itertools
+import random
+from types import SimpleNamespace
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from shopping_cart.models import ItemRequest
+from shopping_cart.planner import knapsack, pack_trips, plan_trips
+from .utils import assert_query_budget, create_user
+
+class KnapsackTestCase(TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        for _ in range(100):
+            count = rng.randint(1, 8)
+            volumes = [rng.randint(0, 100) for _ in range(count)]
+            values = [rng.randint(1, 50) for _ in range(count)]
+            capacity = rng.randint(1, 200)
+            best = max(
+                sum(values[i] for i in subset)
+                for size in range(count + 1) for subset in itertools.combinations(range(count), size)
+                if sum(volumes[i] for i in subset) <= capacity
+            )
+            chosen = knapsack(volumes, values, capacity, resolution=capacity)
+            self.assertLessEqual(sum(volumes[i] for i in chosen), capacity)
+            self.assertEqual(sum(values[i] for i in chosen), best)
+
+    def test_rounding_never_overfills(self):
+        volumes = [33.4, 33.3, 33.3, 0.1]
+        chosen = knapsack(volumes, [1, 1, 1, 1], 100.0, resolution=10)
+        self.assertLessEqual(sum(volumes[i] for i in chosen), 100.0)
+
+    def test_claims_filling_the_whole_hold_get_their_own_trips(self):
+        # 7300 / 7300 * 500 rounds above 500 in floating point
+        claims = [SimpleNamespace(id=1, isk_value=5), SimpleNamespace(id=2, isk_value=3)]
+        for capacity in (7300, 9, 11, 13):
+            trips, oversized = pack_trips(claims, {1: capacity, 2: capacity}, capacity)
+            self.assertEqual([[claim.id for claim in trip.requests] for trip in trips], [[1], [2]])
+            self.assertEqual(oversized, [])
+
+class PlannerTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.requester, self.character = create_user('requester', 1001)
+        self.fulfiller, self.fulfiller_character = create_user('fulfiller', 1002)
+        self.fulfiller.is_superuser = True
+        self.fulfiller.save()
+
+    def _request(self, volume, price, pickup='Jita', delivery='Amarr', items=None, claim=True,
+                 request_type=ItemRequest.REQUEST_TYPE_REQUESTER_HAS_ITEMS):
+        item_request = ItemRequest.objects.create_with_items(
+            items or [{'name': 'Tritanium', 'quantity': 1}], user=self.requester, character=self.character,
+            pickup_location=pickup, delivery_location=delivery, requester_price=price,
+            appraised_volume=volume, request_type=request_type,
+        )
+        if claim:
+            item_request.claim(self.fulfiller, self.fulfiller_character)
+        return item_request
+
+    def test_plan_groups_routes_and_packs_trips(self):
+        jita_amarr = [self._request(volume, price) for volume, price in [(600, 50), (500, 40), (400, 30), (300, 10)]]
+        dodixie = self._request(100, 5, pickup='Dodixie', delivery='Jita')
+        freighter_load = self._request(5000, 1)
+        open_small = self._request(150, 99, claim=False)
+        self._request(150, 99, pickup='Rens', delivery='Hek', claim=False)
+
+        plan = plan_trips(self.fulfiller, 1000)
+
+        self.assertEqual([(route.pickup, route.delivery) for route in plan.routes], [('Jita', 'Amarr'), ('Dodixie', 'Jita')])
+        jita_route = plan.routes[0]
+        self.assertEqual(jita_route.oversized, [freighter_load])
+        self.assertEqual(
+            [{item_request.id for item_request in trip.requests} for trip in jita_route.trips],
+            [{jita_amarr[0].id, jita_amarr[2].id}, {jita_amarr[1].id, jita_amarr[3].id}],
+        )
+        for trip in jita_route.trips:
+            self.assertLessEqual(trip.volume, 1000)
+        # Only the marketplace request on the same route is offered, and only once
+        suggested = [item_request.id for trip in jita_route.trips for item_request in trip.suggestions]
+        self.assertEqual(suggested, [open_small.id])
+        self.assertEqual([item_request.id for item_request in plan.routes[1].trips[0].requests], [dodixie.id])
+
+    def test_shopping_list_per_hub(self):
+        buy = ItemRequest.REQUEST_TYPE_FULFILLER_BUYS
+        self._request(10, 1, request_type=buy, items=[{'name': 'Tritanium', 'type_id': 34, 'quantity': 100}, {'name': 'Widget', 'quantity': 2}])
+        self._request(10, 1, request_type=buy, items=[{'name': 'Tritanium', 'type_id': 34, 'quantity': 50}, {'name': 'widget', 'quantity': 1}])
+        self._request(10, 1, pickup='Amarr', request_type=buy, items=[{'name': 'Pyerite', 'type_id': 35, 'quantity': 7}])
+        self._request(10, 1, items=[{'name': 'Mexallon', 'type_id': 36, 'quantity': 7}])
+
+        lists = plan_trips(self.fulfiller, 1000).shopping_lists
+
+        self.assertEqual(sorted(lists), ['Amarr', 'Jita'])
+        self.assertEqual([(item.name, item.quantity) for item in lists['Jita']], [('Tritanium', 150), ('Widget', 3)])
+        self.assertEqual([(item.name, item.quantity) for item in lists['Amarr']], [('Pyerite', 7)])
+
+    def test_unknown_volume_is_reported(self):
+        item_request = self._request(None, 1)
+        plan = plan_trips(self.fulfiller, 1000)
+        self.assertEqual(plan.unknown_volume, [item_request])
+        self.assertEqual(plan.routes[0].trips[0].requests, [item_request])
+
+    def test_view_query_budget(self):
+        for i in range(30):
+            self._request(100 + i, i, pickup=['Jita', 'Amarr', 'Dodixie', 'Rens', 'Hek'][i % 5],
+                          request_type=ItemRequest.REQUEST_TYPE_FULFILLER_BUYS)
+        self.client.force_login(self.fulfiller)
+        url = reverse('shopping_cart:route_planner') + '?cargo=500'
+        response = assert_query_budget(self, url, 12)
+        self.assertEqual(len(response.context['plan'].routes), 5)
+        self.assertEqual(response.context['plan'].capacity, 500)
+        self.assertContains(response, 'Tritanium')
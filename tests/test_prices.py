@@ -0,0 +1,88 @@
+"""Test market prices and appraisals"""
+import json
+import os
+import tempfile
+from django.core.cache import cache
+from django.test import TestCase
+from shopping_cart.models import ItemRequest, MarketPrice
+from shopping_cart.prices import FixturePriceProvider, appraise_requests, get_prices, pricing_hub_for, refresh_prices
+from .utils import create_user
+
+PRICES = {
+    'Jita': {'34': {'buy': 4.5, 'sell': 5.0}, '35': {'buy': 9.0, 'sell': 10.0}},
+    'Amarr': {'34': {'buy': 5.5, 'sell': 6.0}},
+}
+
+class MarketPriceTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fixture_path = os.path.join(self.tmpdir.name, 'prices.json')
+        with open(self.fixture_path, 'w') as f:
+            json.dump(PRICES, f)
+        self.provider = FixturePriceProvider(self.fixture_path)
+        self.user, self.character = create_user('requester', 1001)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_refresh_upserts_prices(self):
+        self.assertEqual(refresh_prices(self.provider, type_ids=[34, 35]), 3)
+        self.provider.prices['Jita']['34']['sell'] = 5.5
+        refresh_prices(self.provider, type_ids=[34, 35])
+        self.assertEqual(MarketPrice.objects.count(), 3)
+        self.assertEqual(MarketPrice.objects.get(hub='Jita', type_id=34).sell, 5.5)
+
+    def test_get_prices_reads_through_cache(self):
+        refresh_prices(self.provider, type_ids=[34, 35])
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_prices('Jita', [34, 35, 36]), {34: (4.5, 5.0), 35: (9.0, 10.0)})
+        with self.assertNumQueries(1):
+            get_prices('Jita', [34, 35, 36])
+        with self.assertNumQueries(0):
+            get_prices('Jita', [34, 35])
+
+    def test_pricing_hub_for(self):
+        self.assertEqual(pricing_hub_for('Amarr VIII (Oris) - Emperor Family Academy'), 'Amarr')
+        self.assertEqual(pricing_hub_for('hek'), 'Hek')
+        self.assertEqual(pricing_hub_for('Some Nullsec Keepstar'), 'Jita')
+
+    def test_appraise_requests_in_one_batch(self):
+        refresh_prices(self.provider, type_ids=[34, 35])
+        jita = ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 100, 'type_id': 34}, {'name': 'Pyerite', 'quantity': 10, 'type_id': 35}],
+            user=self.user, character=self.character, pickup_location='Jita', delivery_location='Amarr',
+        )
+        amarr = ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 100, 'type_id': 34}],
+            user=self.user, character=self.character, pickup_location='Amarr', delivery_location='Jita',
+        )
+        unknown = ItemRequest.objects.create_with_items(
+            [{'name': 'Mystery', 'quantity': 1}],
+            user=self.user, character=self.character, pickup_location='Jita', delivery_location='Amarr',
+        )
+        with self.assertNumQueries(2):
+            appraise_requests([jita, amarr, unknown])
+        jita.refresh_from_db()
+        amarr.refresh_from_db()
+        unknown.refresh_from_db()
+        self.assertEqual(jita.appraised_value, 600)
+        self.assertEqual(amarr.appraised_value, 600)
+        self.assertIsNone(unknown.appraised_value)
+        self.assertIsNotNone(unknown.appraised_at)
+
+        # Unchanged appraisals are not written, so cached fragments keep their updated_at
+        updated_at = jita.updated_at
+        with self.assertNumQueries(1):
+            appraise_requests([jita, amarr, unknown])
+        jita.refresh_from_db()
+        self.assertEqual(jita.updated_at, updated_at)
+        MarketPrice.objects.filter(hub='Jita', type_id=34).update(sell=10)
+        cache.clear()
+        appraise_requests([jita, amarr])
+        jita.refresh_from_db()
+        amarr.refresh_from_db()
+        self.assertEqual(jita.appraised_value, 1100)
+        self.assertGreater(jita.updated_at, updated_at)
+        self.assertEqual(amarr.appraised_value, 600)
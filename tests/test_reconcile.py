@@ -0,0 +1,120 @@
+"""Test contract-to-request reconciliation against recorded ESI contracts"""
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from shopping_cart.models import ItemRequest
+from shopping_cart.reconcile import match_contracts, reconcile_claimed_requests
+from .test_contracts import FakeEsiContractClient
+from .utils import create_user
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'esi_contracts.json')
+
+class RecordedEsiContractClient(FakeEsiContractClient):
+    def __init__(self, path=FIXTURE):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        super().__init__({int(character_id): contracts for character_id, contracts in data['contracts'].items()})
+        self.items = {int(contract_id): items for contract_id, items in data['items'].items()}
+        self.item_calls = []
+
+    def get_contract_items(self, character_id, contract_id):
+        self.item_calls.append(contract_id)
+        return self.items.get(contract_id)
+
+class ReconcileTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.requester, self.requester_character = create_user('requester', 1001)
+        self.fulfiller, self.fulfiller_character = create_user('fulfiller', 1002)
+        self.fulfiller.is_superuser = True
+        self.fulfiller.save()
+
+    def _claimed(self, items, request_type=ItemRequest.REQUEST_TYPE_FULFILLER_BUYS, **fields):
+        item_request = ItemRequest.objects.create_with_items(
+            items, user=self.requester, character=self.requester_character, request_type=request_type, **fields,
+        )
+        item_request.claim(self.fulfiller, self.fulfiller_character)
+        ItemRequest.objects.filter(pk=item_request.pk).update(claimed_at=datetime(2025, 12, 31, tzinfo=dt_timezone.utc))
+        return item_request
+
+    def test_reconcile_recorded_contracts(self):
+        bought = self._claimed(
+            [{'name': 'Tritanium', 'type_id': 34, 'quantity': 1000}, {'name': 'Pyerite', 'type_id': 35, 'quantity': 500}],
+            pickup_location='Jita', delivery_location='Amarr VIII', fulfiller_price=150_000_000,
+        )
+        handed_over = self._claimed(
+            [{'name': 'Mexallon', 'type_id': 36, 'quantity': 100}], request_type=ItemRequest.REQUEST_TYPE_REQUESTER_HAS_ITEMS,
+            pickup_location='Jita IV - Moon 4', delivery_location='1DQ1-A', requester_price=20_000_000,
+        )
+        twins = [
+            self._claimed(
+                [{'name': 'Nocxium', 'type_id': 38, 'quantity': 10}],
+                pickup_location='Amarr', delivery_location='Jita', fulfiller_price=5_000_000,
+            )
+            for _ in range(2)
+        ]
+        client = RecordedEsiContractClient()
+
+        self.assertEqual(reconcile_claimed_requests(client), 2)
+
+        bought.refresh_from_db()
+        self.assertEqual(bought.status, ItemRequest.STATUS_CONTRACT_CREATED)
+        self.assertEqual(bought.contract_id, 7001)
+        self.assertEqual(bought.contract_issuer, ItemRequest.CONTRACT_ISSUER_FULFILLER)
+        self.assertEqual(bought.esi_monitor_character, self.fulfiller_character)
+        handed_over.refresh_from_db()
+        # 7002 has the wrong quantity and 7003 was deleted
+        self.assertEqual(handed_over.contract_id, 7004)
+        self.assertEqual(handed_over.contract_issuer, ItemRequest.CONTRACT_ISSUER_REQUESTER)
+        for twin in twins:
+            twin.refresh_from_db()
+            self.assertIsNone(twin.contract_id)
+        # Only contracts that matched a request on everything else had their items fetched
+        self.assertEqual(sorted(client.item_calls), [7001, 7002, 7004, 7005])
+
+        # Linked contracts are not considered again and their items stay cached
+        client.item_calls = []
+        self.assertEqual(reconcile_claimed_requests(client), 0)
+        self.assertEqual(client.item_calls, [])
+
+    def test_contract_issued_before_claim_is_ignored(self):
+        item_request = self._claimed(
+            [{'name': 'Tritanium', 'type_id': 34, 'quantity': 1000}, {'name': 'Pyerite', 'type_id': 35, 'quantity': 500}],
+            pickup_location='Jita', delivery_location='Amarr', fulfiller_price=150_000_000,
+        )
+        ItemRequest.objects.filter(pk=item_request.pk).update(claimed_at=datetime(2026, 2, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(reconcile_claimed_requests(RecordedEsiContractClient()), 0)
+
+    def test_match_uses_index_lookups(self):
+        for i in range(50):
+            self._claimed(
+                [{'name': 'Tritanium', 'type_id': 34, 'quantity': i + 1}],
+                pickup_location='Jita', delivery_location='Amarr', fulfiller_price=1_000_000 + i,
+            )
+        item_requests = list(ItemRequest.objects.select_related('character', 'fulfiller_character').order_by('id'))
+        contracts = [
+            {
+                'contract_id': 9000 + i, 'issuer_id': 1002, 'assignee_id': 1001, 'start_location_id': 60008494,
+                'type': 'item_exchange', 'status': 'outstanding', 'price': float(1_000_000 + i), 'date_issued': '2026-01-01T00:00:00Z',
+            }
+            for i in range(50)
+        ]
+        request_items = {item_request.id: [(34, i + 1)] for i, item_request in enumerate(item_requests)}
+        lookups = []
+
+        def contract_items(contract):
+            lookups.append(contract['contract_id'])
+            return [{'type_id': 34, 'quantity': contract['contract_id'] - 9000 + 1}]
+
+        with CaptureQueriesContext(connection) as queries:
+            matches = match_contracts(item_requests, contracts, request_items, contract_items)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(len(lookups), 50)
+        self.assertEqual(
+            {(match.item_request.id, match.contract['contract_id']) for match in matches},
+            {(item_request.id, 9000 + i) for i, item_request in enumerate(item_requests)},
+        )
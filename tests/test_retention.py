@@ -0,0 +1,128 @@
+"""Test batched retention cleanup, archiving and expiry"""
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from shopping_cart.models import ArchivedRequest, ItemRequest, RequestCounter, RequestItem, StatusTransition
+from shopping_cart.retention import archive_closed_requests, cleanup_old_requests, export_archive, expire_abandoned_requests
+from .utils import create_user
+
+STEPS = {
+    ItemRequest.STATUS_PENDING: [],
+    ItemRequest.STATUS_CLAIMED: [ItemRequest.STATUS_CLAIMED],
+    ItemRequest.STATUS_CANCELLED: [ItemRequest.STATUS_CANCELLED],
+    ItemRequest.STATUS_COMPLETED: [ItemRequest.STATUS_CLAIMED, ItemRequest.STATUS_CONTRACT_CREATED, ItemRequest.STATUS_COMPLETED],
+}
+
+class RetentionTestCase(TestCase):
+    def setUp(self):
+        self.user, self.character = create_user('requester', 1001)
+
+    def _request(self, status, days_old):
+        item_request = ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 1}], user=self.user, character=self.character,
+            pickup_location='Jita', delivery_location='Amarr',
+        )
+        for step in STEPS[status]:
+            item_request.transition(step)
+        ItemRequest.objects.filter(id=item_request.id).update(created_at=timezone.now() - timedelta(days=days_old))
+        return item_request
+
+    def test_cleanup_deletes_old_closed_requests_in_batches(self):
+        old = [self._request(ItemRequest.STATUS_COMPLETED, 100) for _ in range(5)]
+        old.append(self._request(ItemRequest.STATUS_CANCELLED, 100))
+        recent = self._request(ItemRequest.STATUS_COMPLETED, 10)
+        pending = self._request(ItemRequest.STATUS_PENDING, 100)
+
+        with self.assertLogs('shopping_cart.retention', 'INFO') as logs:
+            self.assertEqual(cleanup_old_requests(days=90, batch_size=2), 6)
+        self.assertEqual(sum('Deleted 2 closed item requests' in line for line in logs.output), 3)
+        self.assertEqual(set(ItemRequest.objects.values_list('id', flat=True)), {recent.id, pending.id})
+        self.assertFalse(RequestItem.objects.filter(request_id__in=[r.id for r in old]).exists())
+        counts = {status: count for status, count in RequestCounter.objects.counts_for(self.user).items() if count}
+        self.assertEqual(counts, {ItemRequest.STATUS_COMPLETED: 1, ItemRequest.STATUS_PENDING: 1})
+        self.assertEqual(cleanup_old_requests(days=90, batch_size=2), 0)
+
+    def test_expire_marks_old_pending_requests(self):
+        old = [self._request(ItemRequest.STATUS_PENDING, 40) for _ in range(3)]
+        recent = self._request(ItemRequest.STATUS_PENDING, 5)
+        claimed = self._request(ItemRequest.STATUS_CLAIMED, 40)
+
+        self.assertEqual(expire_abandoned_requests(days=30, batch_size=2), 3)
+        self.assertEqual(
+            set(ItemRequest.objects.filter(status=ItemRequest.STATUS_EXPIRED).values_list('id', flat=True)),
+            {item_request.id for item_request in old},
+        )
+        recent.refresh_from_db()
+        claimed.refresh_from_db()
+        self.assertEqual(recent.status, ItemRequest.STATUS_PENDING)
+        self.assertEqual(claimed.status, ItemRequest.STATUS_CLAIMED)
+        self.assertEqual(RequestCounter.objects.counts_for(), {
+            ItemRequest.STATUS_EXPIRED: 3, ItemRequest.STATUS_PENDING: 1, ItemRequest.STATUS_CLAIMED: 1,
+        })
+        self.assertEqual(
+            set(StatusTransition.objects.filter(new_status=ItemRequest.STATUS_EXPIRED).values_list('request_id', 'version')),
+            {(item_request.id, 1) for item_request in old},
+        )
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        self.user, self.character = create_user('requester', 1001)
+        self.user.is_superuser = True
+        self.user.save()
+
+    def _closed_request(self, days_old):
+        item_request = ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 5, 'type_id': 34}, {'name': 'Pyerite', 'quantity': 2}],
+            user=self.user, character=self.character, pickup_location='Jita', delivery_location='Amarr',
+        )
+        item_request.cancel()
+        ItemRequest.objects.filter(id=item_request.id).update(created_at=timezone.now() - timedelta(days=days_old))
+        return item_request
+
+    def test_archive_moves_rows_and_detail_falls_back(self):
+        old = self._closed_request(70)
+        recent = self._closed_request(5)
+
+        self.assertEqual(archive_closed_requests(days=60, batch_size=1), 1)
+        self.assertEqual(list(ItemRequest.objects.values_list('id', flat=True)), [recent.id])
+        archived = ArchivedRequest.objects.get(id=old.id).to_request()
+        self.assertEqual(archived.status, ItemRequest.STATUS_CANCELLED)
+        self.assertEqual(archived.created_at, ArchivedRequest.objects.get(id=old.id).created_at)
+        self.assertEqual([item.as_dict() for item in ArchivedRequest.objects.get(id=old.id).to_items()], [
+            {'name': 'Tritanium', 'quantity': 5, 'type_id': 34}, {'name': 'Pyerite', 'quantity': 2},
+        ])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('shopping_cart:request_detail', args=[old.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['item_request'].id, old.id)
+        self.assertContains(response, f"#{old.id} - Tritanium x5, Pyerite x2")
+        self.assertContains(response, '<th class="text-end">7</th>', html=True)
+        self.assertEqual(self.client.get(reverse('shopping_cart:request_detail', args=[old.id + 100])).status_code, 404)
+
+        # Counters still include archived rows, and rebuilding agrees with them
+        self.assertEqual(RequestCounter.objects.counts_for()[ItemRequest.STATUS_CANCELLED], 2)
+        RequestCounter.objects.rebuild()
+        self.assertEqual(RequestCounter.objects.counts_for(), {ItemRequest.STATUS_CANCELLED: 2})
+
+    def test_export_streams_gzip_jsonl(self):
+        old = self._closed_request(70)
+        archive_closed_requests(days=60)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'archive.jsonl.gz')
+            self.assertEqual(export_archive(path), 1)
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                rows = [json.loads(line) for line in f]
+        self.assertEqual(rows[0]['request']['id'], old.id)
+        self.assertEqual(len(rows[0]['items']), 2)
+
+    def test_cleanup_purges_archive(self):
+        self._closed_request(120)
+        archive_closed_requests(days=60)
+        self.assertEqual(cleanup_old_requests(days=90), 1)
+        self.assertFalse(ArchivedRequest.objects.exists())
@@ -0,0 +1,72 @@
+"""Test the SDE type index"""
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from shopping_cart import app_settings
+from shopping_cart.forms import CreateRequestForm
+from shopping_cart.sde import TypeIndex, get_type_index, read_sde_types, reset_type_index
+
+INV_TYPES_CSV = """typeID,groupID,typeName,volume,published,marketGroupID
+34,18,Tritanium,0.01,1,1857
+35,18,Pyerite,0.01,1,1857
+587,25,Rifter,27289,1,64
+9999,18,Unpublished Thing,1,0,
+"""
+
+INV_VOLUMES_CSV = """typeID,volume
+587,2500
+"""
+
+class TypeIndexTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.types_path = os.path.join(self.tmpdir.name, 'invTypes.csv')
+        self.volumes_path = os.path.join(self.tmpdir.name, 'invVolumes.csv')
+        self.index_path = os.path.join(self.tmpdir.name, 'types.idx')
+        with open(self.types_path, 'w') as f:
+            f.write(INV_TYPES_CSV)
+        with open(self.volumes_path, 'w') as f:
+            f.write(INV_VOLUMES_CSV)
+        reset_type_index()
+
+    def tearDown(self):
+        reset_type_index()
+        self.tmpdir.cleanup()
+
+    def test_round_trip_and_lookups(self):
+        TypeIndex.from_rows(read_sde_types(self.types_path)).write(self.index_path)
+        type_index = TypeIndex.load(self.index_path)
+        self.assertEqual(len(type_index), 3)
+        self.assertEqual(type_index.get('tritanium').type_id, 34)
+        self.assertIsNone(type_index.get('tritanium', case_sensitive=True))
+        self.assertEqual(type_index.get('Tritanium', case_sensitive=True).market_group_id, 1857)
+        self.assertEqual(type_index.get_by_type_id(587).name, 'Rifter')
+        self.assertIsNone(type_index.get('Unpublished Thing'))
+
+    def test_import_command_uses_packaged_volumes(self):
+        call_command('shopping_cart_import_sde', self.types_path, volumes=self.volumes_path,
+                     output=self.index_path, stdout=StringIO())
+        self.assertEqual(TypeIndex.load(self.index_path).get('Rifter').volume, 2500)
+
+    def test_index_is_loaded_once_and_used_by_form(self):
+        call_command('shopping_cart_import_sde', self.types_path, output=self.index_path, stdout=StringIO())
+        with mock.patch.object(app_settings, 'SHOPPING_CART_SDE_INDEX_PATH', self.index_path):
+            self.assertIs(get_type_index(), get_type_index())
+            form = CreateRequestForm(data={
+                'request_type': 'requester_has_items', 'items_text': 'tritanium x10\nTritanium 5\nPyerite 1',
+                'pickup_location': 'Jita', 'delivery_location': 'Amarr', 'requester_expiration_days': 7,
+            })
+            self.assertTrue(form.is_valid(), form.errors)
+            self.assertEqual(form.parsed_items, [
+                {'name': 'Tritanium', 'quantity': 15, 'type_id': 34},
+                {'name': 'Pyerite', 'quantity': 1, 'type_id': 35},
+            ])
+            form = CreateRequestForm(data={
+                'request_type': 'requester_has_items', 'items_text': 'Tritanium 5\nNot An Item 3',
+                'pickup_location': 'Jita', 'delivery_location': 'Amarr', 'requester_expiration_days': 7,
+            })
+            self.assertFalse(form.is_valid())
+            self.assertIn('Not An Item', str(form.errors['items_text']))
@@ -18,6 +18,10 @@ PASSWORD_HASHERS = [
 # Test-specific settings
 SECRET_KEY = 'test-secret-key'
 DEBUG = True
+SITE_URL = 'http://localhost:8000'
+STORAGES['staticfiles'] = {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}
+
+APPS_WITH_PUBLIC_VIEWS = ['shopping_cart']
 
 INSTALLED_APPS += [
     'shopping_cart',
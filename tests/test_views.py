@@ -0,0 +1,120 @@
+"""Test Shopping Cart list views"""
+from unittest import mock
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from shopping_cart import app_settings
+from shopping_cart.models import ItemRequest
+from shopping_cart.pagination import decode_cursor, encode_cursor, keyset_paginate
+from .utils import create_user
+
+class ListViewTestCase(TestCase):
+    def setUp(self):
+        self.requester, self.character = create_user('requester', 1001)
+        self.fulfiller, self.fulfiller_character = create_user('fulfiller', 1002)
+        self.fulfiller.is_superuser = True
+        self.fulfiller.save()
+        self.client.force_login(self.fulfiller)
+
+    def _make_requests(self, count):
+        return [
+            ItemRequest.objects.create_with_items(
+                [{'name': 'Tritanium', 'quantity': i + 1}, {'name': 'Pyerite', 'quantity': 1}],
+                user=self.requester, character=self.character, pickup_location='Jita', delivery_location='Amarr',
+            )
+            for i in range(count)
+        ]
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_keyset_pages_cover_every_row_once(self):
+        created = self._make_requests(7)
+        seen = []
+        cursor = None
+        while True:
+            page = keyset_paginate(ItemRequest.objects.all(), cursor, page_size=3)
+            seen.extend(item_request.id for item_request in page.object_list)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, [item_request.id for item_request in reversed(created)])
+
+    def test_cursor_round_trip(self):
+        item_request = self._make_requests(1)[0]
+        self.assertEqual(decode_cursor(encode_cursor(item_request)), (item_request.created_at, item_request.id))
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        url = reverse('shopping_cart:marketplace')
+        self._make_requests(2)
+        # The first request also fills the access cache
+        self.client.get(url)
+        # Rendering one new row or ten costs the same single items query
+        self._make_requests(1)
+        small = self._count_queries(url)
+        self._make_requests(10)
+        self.assertEqual(self._count_queries(url), small)
+        # Every row fragment is cached by now, so the items are not loaded at all
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse(any('shopping_cart_requestitem' in query['sql'] for query in queries))
+
+        item_requests = list(ItemRequest.objects.all())
+        for item_request in item_requests:
+            item_request.claim(self.fulfiller, self.fulfiller_character)
+        url = reverse('shopping_cart:my_claimed_orders')
+        response = self.client.get(url)
+        self.assertEqual(len(response.context['requests']), 13)
+        self.assertEqual(response.context['requests'][0].fulfiller_character.character_name, 'Character 1002')
+
+    @mock.patch.object(app_settings, 'SHOPPING_CART_PAGINATION_SIZE', 2)
+    def test_my_requests_lists_own_requests_with_older_link(self):
+        self.requester.is_superuser = True
+        self.requester.save()
+        self.client.force_login(self.requester)
+        url = reverse('shopping_cart:my_requests')
+        self.assertContains(self.client.get(url), 'You have no requests yet.')
+        created = self._make_requests(3)
+        response = self.client.get(url)
+        self.assertContains(response, reverse('shopping_cart:request_detail', args=[created[2].id]))
+        self.assertContains(response, str(created[1]))
+        self.assertNotContains(response, reverse('shopping_cart:request_detail', args=[created[0].id]))
+        self.assertContains(response, f'?cursor={response.context["page"].next_cursor}')
+        older = self.client.get(url, {'cursor': response.context['page'].next_cursor})
+        self.assertEqual([item_request.id for item_request in older.context['requests']], [created[0].id])
+        self.assertNotContains(older, 'Older requests')
+
+    def test_marketplace_filters(self):
+        jita = ItemRequest.objects.create_with_items(
+            [{'name': 'Tritanium', 'quantity': 10}], user=self.requester, character=self.character,
+            pickup_location='Jita IV - Moon 4', delivery_location='Amarr VIII', requester_price=5_000_000,
+        )
+        dodixie = ItemRequest.objects.create_with_items(
+            [{'name': 'Pyerite', 'quantity': 10}], user=self.requester, character=self.character,
+            pickup_location='dodixie', delivery_location='Some Citadel', max_budget=50_000_000,
+            request_type=ItemRequest.REQUEST_TYPE_FULFILLER_BUYS,
+        )
+        self.assertEqual((jita.pickup_hub, jita.delivery_hub), ('Jita', 'Amarr'))
+        self.assertEqual((dodixie.pickup_hub, dodixie.delivery_hub), ('Dodixie', ''))
+
+        def ids(**params):
+            response = self.client.get(reverse('shopping_cart:marketplace'), params)
+            return [item_request.id for item_request in response.context['requests']]
+
+        self.assertEqual(ids(), [dodixie.id, jita.id])
+        self.assertEqual(ids(pickup_hub='Jita'), [jita.id])
+        self.assertEqual(ids(delivery_hub='Amarr'), [jita.id])
+        self.assertEqual(ids(request_type=ItemRequest.REQUEST_TYPE_FULFILLER_BUYS), [dodixie.id])
+        self.assertEqual(ids(min_budget=10_000_000), [dodixie.id])
+        self.assertEqual(ids(max_budget=10_000_000), [jita.id])
+        self.assertEqual(ids(item='Pyerite'), [dodixie.id])
+        self.assertEqual(ids(item='Pyerite', pickup_hub='Jita'), [])
+        response = self.client.get(reverse('shopping_cart:marketplace'), {'pickup_hub': 'Jita'})
+        self.assertContains(response, '<option value="Jita" selected>', html=False)
+        self.assertContains(response, 'name="item"')
+        # Invalid filters are ignored rather than hiding everything
+        self.assertEqual(ids(pickup_hub='Nowhere'), [dodixie.id, jita.id])
@@ -0,0 +1,27 @@
+"""Shared fixtures for Shopping Cart tests"""
+from django.contrib.auth.models import User
+from allianceauth.eveonline.models import EveCharacter
+
+def create_character(character_id, name=None):
+    return EveCharacter.objects.create(
+        character_id=character_id, character_name=name or f'Character {character_id}',
+        corporation_id=2001, corporation_name='Corp', corporation_ticker='CORP',
+    )
+
+def create_user(username, character_id=None):
+    user = User.objects.create_user(username=username, password='testpass')
+    character = create_character(character_id) if character_id else None
+    if character:
+        user.profile.main_character = character
+        user.profile.save()
+    return user, character
+
+def assert_query_budget(testcase, url, max_queries, **extra):
+    """GET url and fail if the view ran more than max_queries SQL queries"""
+    response = testcase.client.get(url, **extra)
+    metrics = getattr(response, 'shopping_cart_metrics', None)
+    testcase.assertIsNotNone(metrics, f"{url} is not an instrumented shopping cart view")
+    testcase.assertLessEqual(
+        metrics.queries, max_queries, f"{metrics.view} ran {metrics.queries} queries, budget is {max_queries}",
+    )
+    return response